@@ -6,15 +6,18 @@ ETL complet : Extraction → Transformation → Export S3
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.operators.bash import BashOperator
-from airflow.utils.dates import days_ago
+from airflow.exceptions import AirflowSkipException
 from datetime import datetime, timedelta
+import pendulum
 import sys
 import os
 
 # Ajouter les scripts au path
 sys.path.insert(0, '/opt/airflow/scripts')
 
-from s3_uploader import S3Uploader
+# Imports légers uniquement : ce fichier est re-parsé en continu par le scheduler
+# (boto3 & co. sont chargés dans les tâches, à l'exécution)
+from fingerprints import UNCHANGED_EXIT_CODE, is_upload_current, record_upload
 
 # Configuration du DAG
 default_args = {
@@ -32,20 +35,31 @@ dag = DAG(
     default_args=default_args,
     description='Pipeline ETL complet pour analyse des coûts cloud',
     schedule_interval='0 8 * * *',  # Tous les jours à 8h
-    start_date=days_ago(1),
+    # Date fixe : chaque run est identifié par son intervalle de données,
+    # ce qui permet les backfills (`airflow dags backfill -s ... -e ...`)
+    start_date=pendulum.datetime(2025, 10, 1, tz='UTC'),
     catchup=False,
+    # Les partitions étant indépendantes, plusieurs intervalles peuvent
+    # être rejoués en parallèle sans se marcher dessus
+    max_active_runs=8,
     tags=['finops', 'aws', 'costs', 'etl'],
 )
 
 
+def _partition_ds(context):
+    """Date logique de la partition : début de l'intervalle de données Airflow"""
+    return context['data_interval_start'].strftime('%Y-%m-%d')
+
+
 def extract_costs(**context):
     """Tâche d'extraction multi-cloud"""
     import subprocess
     
-    print("🌐 Extraction multi-cloud...")
+    ds = _partition_ds(context)
+    print(f"🌐 Extraction multi-cloud (partition {ds})...")
     
     result = subprocess.run(
-        ['python', '/opt/airflow/scripts/extract_multicloud_costs.py'],
+        ['python', '/opt/airflow/scripts/extract_multicloud_costs.py', '--ds', ds],
         capture_output=True,
         text=True
     )
@@ -61,14 +75,19 @@ def transform_costs(**context):
     """Tâche de transformation des données"""
     import subprocess
     
-    print("🔄 Transformation des données...")
+    ds = _partition_ds(context)
+    print(f"🔄 Transformation des données (partition {ds})...")
     
     result = subprocess.run(
-        ['python', '/opt/airflow/scripts/transform_costs.py'],
+        ['python', '/opt/airflow/scripts/transform_costs.py', '--ds', ds],
         capture_output=True,
         text=True
     )
     
+    if result.returncode == UNCHANGED_EXIT_CODE:
+        # Même empreinte (données brutes + configuration) que la dernière exécution
+        raise AirflowSkipException(f"Entrées inchangées pour la partition {ds}")
+    
     if result.returncode != 0:
         raise Exception(f"Erreur transformation : {result.stderr}")
     
@@ -78,14 +97,22 @@ def transform_costs(**context):
 
 def upload_to_s3(**context):
     """Tâche d'upload vers S3"""
-    print("📤 Upload vers S3...")
+    ds = _partition_ds(context)
+    print(f"📤 Upload vers S3 (partition {ds})...")
+    
+    if is_upload_current(ds):
+        raise AirflowSkipException(f"Partition {ds} déjà uploadée dans cette version")
+    
+    from s3_uploader import S3Uploader
     
     uploader = S3Uploader()
-    count = uploader.upload_latest_data()
+    count = uploader.upload_partition(ds)
     
     if count == 0:
         raise Exception("Aucun fichier uploadé vers S3")
     
+    record_upload(ds)
+    
     print(f"✅ {count} fichiers uploadés vers S3")
     return f"uploaded_{count}_files"
 
@@ -101,13 +128,49 @@ def send_notification(**context):
     transformation_result = ti.xcom_pull(task_ids='transform_costs_task')
     upload_result = ti.xcom_pull(task_ids='upload_to_s3_task')
     
+    if transformation_result is None and upload_result is None:
+        # Transformation et upload court-circuités : rien de nouveau à notifier
+        print(f"⏭️  Partition {_partition_ds(context)} inchangée : aucune notification")
+        return "pipeline_unchanged"
+    
     print("="*60)
     print("📊 PIPELINE FINOPS - RÉSUMÉ D'EXÉCUTION")
     print("="*60)
     print(f"📅 Date : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🗂️  Partition : {_partition_ds(context)}")
     print(f"✅ Extraction : {extraction_result}")
     print(f"✅ Transformation : {transformation_result}")
     print(f"✅ Upload S3 : {upload_result}")
+    
+    # Tendance : exécution de la partition vs la précédente (un seul parcours de l'historique)
+    import pandas as pd
+    from kpi_history import read_history
+    history = read_history(['total_cost', 'anomaly_count', 'forecast_month_end'])
+    current = history[history['RunId'] == _partition_ds(context)]
+    if len(current):
+        row = current.iloc[-1]
+        earlier = history[(history['RunId'] != row['RunId']) & (history['DateMax'] < row['DateMax'])]
+        print("-"*60)
+        print(f"💰 Coût total : ${row['total_cost']:,.2f}")
+        print(f"⚠️  Anomalies : {row['anomaly_count']:.0f}")
+        if pd.notna(row['forecast_month_end']):
+            print(f"🔮 Prévision fin de mois : ${row['forecast_month_end']:,.2f}")
+        if len(earlier):
+            previous = earlier.iloc[-1]
+            print(f"📈 vs {previous['RunId']} : {row['total_cost'] - previous['total_cost']:+,.2f} $, "
+                  f"{row['anomaly_count'] - previous['anomaly_count']:+.0f} anomalies")
+    
+    # Budgets en alerte (table évaluée par la transformation)
+    from partitions import PROCESSED_DIR, partition_dir
+    breaches_file = os.path.join(partition_dir(PROCESSED_DIR, _partition_ds(context)), 'budget_breaches.csv')
+    if os.path.exists(breaches_file):
+        breaches = pd.read_csv(breaches_file)
+        print("-"*60)
+        print(f"🎯 Budgets en alerte : {len(breaches)}")
+        for _, budget in breaches.head(20).iterrows():
+            print(f"   🚨 {budget['BudgetId']} ({budget['Period']}, {budget['Scope']}) : {budget['Status']} — "
+                  f"${budget['Actual']:,.2f} / ${budget['Amount']:,.2f}, "
+                  f"prévu ${budget['Projected']:,.2f} ({budget['ProjectedPct']:.0f}%)")
     print("="*60)
     
     return "pipeline_complete"
@@ -126,15 +189,19 @@ task_transform = PythonOperator(
     dag=dag,
 )
 
+# none_failed : l'upload vérifie sa propre empreinte même si la transformation
+# a été ignorée (ex. upload précédent en échec)
 task_upload_s3 = PythonOperator(
     task_id='upload_to_s3_task',
     python_callable=upload_to_s3,
+    trigger_rule='none_failed',
     dag=dag,
 )
 
 task_notify = PythonOperator(
     task_id='send_notification_task',
     python_callable=send_notification,
+    trigger_rule='none_failed',
     dag=dag,
 )
 
@@ -5,12 +5,21 @@ Dashboard interactif Streamlit pour visualiser et analyser les coûts cloud
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import glob
 import os
+import sys
 import json
+import functools
+
+# Modules partagés avec le pipeline ETL
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+from cost_queries import open_queries
+from cost_cube import CostCube, CubeCostQueries
+from run_watcher import RunWatcher, version_label
+from kpi_history import read_history
+from budgets import EXCEEDED, FORECAST_OVERRUN, INCOMPLETE, OK, UNMEASURED
+from render_profiler import RenderProfiler, active as active_profiler, current as current_profiler, profiling_requested, timed, SEND
 
 # Configuration de la page
 st.set_page_config(
@@ -50,44 +59,81 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-@st.cache_data
-def load_latest_data():
-    """Charge les dernières données transformées"""
-    
-    # Chercher le fichier le plus récent
-    enriched_files = glob.glob('data/processed/costs_enriched_*.csv')
-    if not enriched_files:
-        return None, None, None
-    
-    latest_file = max(enriched_files, key=os.path.getctime)
-    df = pd.read_csv(latest_file)
-    df['Date'] = pd.to_datetime(df['Date'])
+# Moteur de requêtes : 'snapshot' (instantané Arrow projeté), 'duckdb' (SQL sur le Parquet),
+# 'arrow', 'pandas' ou 'auto'
+QUERY_BACKEND = os.environ.get('FINOPS_QUERY_BACKEND', 'auto')
+
+
+def open_run(paths):
+    """
+    Ouvre une exécution : moteur de requêtes, KPIs, historique des KPIs et état des
+    budgets (appelé par le watcher, hors des requêtes)
+    
+    Les rollups pré-agrégés servent les requêtes courantes et sont lus dès
+    maintenant ; le moteur détaillé n'est ouvert que pour les autres (export des
+    lignes, dimensions non agrégées). Les instantanés Arrow publiés par la
+    transformation sont projetés en mémoire plutôt qu'analysés.
+    """
+    def open_detail():
+        return open_queries(paths['enriched'], paths['parquet'], QUERY_BACKEND, paths['snapshot'])
+    
+    if paths['rollups'] is None:
+        queries = open_detail()
+    else:
+        queries = CubeCostQueries(CostCube.open(paths['rollups']).load(), open_detail)
     
-    # Charger les KPIs
-    kpi_files = glob.glob('data/processed/kpis_*.json')
     kpis = None
-    if kpi_files:
-        latest_kpi = max(kpi_files, key=os.path.getctime)
-        with open(latest_kpi, 'r') as f:
+    if paths['kpis'] is not None:
+        with open(paths['kpis'], 'r') as f:
             kpis = json.load(f)
     
-    # Charger l'évolution mensuelle
-    monthly_files = glob.glob('data/processed/monthly_evolution_*.csv')
-    monthly_df = None
-    if monthly_files:
-        latest_monthly = max(monthly_files, key=os.path.getctime)
-        monthly_df = pd.read_csv(latest_monthly)
+    # Historique relu une fois par exécution publiée (un seul parcours, quelques lignes par exécution)
+    history = read_history([
+        'total_cost', 'avg_daily_cost', 'anomaly_count', 'series_anomaly_count',
+        'forecast_month', 'forecast_month_end', 'forecast_lower', 'forecast_upper', 'TopServices'
+    ])
+    
+    budgets = None
+    if paths['budgets'] is not None:
+        budgets = pd.read_csv(paths['budgets'], parse_dates=['PeriodStart', 'PeriodEnd'])
     
-    return df, kpis, monthly_df
+    return queries, kpis, history, budgets
 
 
-def create_kpi_cards(df, kpis):
-    """Affiche les cartes KPI en haut du dashboard"""
+@st.cache_resource
+def get_watcher():
+    """Surveillance des exécutions (une par processus, partagée entre les sessions)"""
+    return RunWatcher(open_run).start()
+
+
+def load_latest_data():
+    """
+    Dernières données transformées (moteur de requêtes, KPIs, historique, budgets, exécution affichée)
+    
+    Renvoie la version publiée par le watcher sans jamais attendre un rechargement.
+    """
+    
+    run = get_watcher().current()
+    if run is None:
+        return None, None, None, None, None
+    queries, kpis, history, budgets = run.data
+    return queries, kpis, history, budgets, run
+
+
+def previous_kpis(history, run):
+    """KPIs de l'exécution précédente dans l'historique (None si aucune)"""
+    run_id = run.paths['ds'] or os.path.basename(run.paths['enriched'])[len('costs_enriched_'):-len('.csv')]
+    earlier = history[history['RunId'] != run_id]
+    return earlier.iloc[-1] if len(earlier) else None
+
+
+@timed(SEND)
+def create_kpi_cards(total_cost, kpis, previous=None):
+    """Affiche les cartes KPI en haut du dashboard (écart à l'exécution précédente si connue)"""
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_cost = df['Cost'].sum()
         st.metric(
             label="💰 Coût Total",
             value=f"${total_cost:,.2f}",
@@ -97,10 +143,13 @@ def create_kpi_cards(df, kpis):
     with col2:
         if kpis:
             avg_daily = kpis.get('avg_daily_cost', 0)
+            previous_avg = previous['avg_daily_cost'] if previous is not None else None
             st.metric(
                 label="📊 Coût Moyen/Jour",
                 value=f"${avg_daily:,.2f}",
-                delta=None
+                delta=f"{avg_daily - previous_avg:+,.2f} $ vs exécution précédente"
+                    if pd.notna(previous_avg) else None,
+                delta_color="inverse"
             )
     
     with col3:
@@ -123,10 +172,10 @@ def create_kpi_cards(df, kpis):
             )
 
 
-def plot_daily_costs(df):
-    """Graphique de l'évolution journalière des coûts"""
-    
-    daily_costs = df.groupby('Date')['Cost'].sum().reset_index()
+@timed()
+def plot_daily_costs(daily_costs):
+    """Graphique de l'évolution journalière des coûts (Date, Cost)"""
+    import plotly.express as px
     
     fig = px.line(
         daily_costs,
@@ -153,15 +202,17 @@ def plot_daily_costs(df):
     return fig
 
 
-def plot_service_breakdown(df):
-    """Graphique camembert de la répartition par service"""
+@timed()
+def plot_service_breakdown(service_costs, top_n=10):
+    """Graphique camembert de la répartition par service (Service, Cost)"""
+    import plotly.express as px
     
-    service_costs = df.groupby('Service')['Cost'].sum().sort_values(ascending=False).head(10)
+    service_costs = service_costs.sort_values('Cost', ascending=False, kind='mergesort').head(top_n)
     
     fig = px.pie(
-        values=service_costs.values,
-        names=service_costs.index,
-        title='🔧 Top 10 Services par Coût',
+        values=service_costs['Cost'],
+        names=service_costs['Service'],
+        title=f'🔧 Top {top_n} Services par Coût',
         hole=0.4  # Donut chart
     )
     
@@ -176,18 +227,20 @@ def plot_service_breakdown(df):
     return fig
 
 
-def plot_category_costs(df):
-    """Graphique en barres des coûts par catégorie"""
+@timed()
+def plot_category_costs(category_costs):
+    """Graphique en barres des coûts par catégorie (ServiceCategory, Cost)"""
+    import plotly.express as px
     
-    category_costs = df.groupby('ServiceCategory')['Cost'].sum().sort_values(ascending=True)
+    category_costs = category_costs.sort_values('Cost', ascending=True, kind='mergesort')
     
     fig = px.bar(
-        x=category_costs.values,
-        y=category_costs.index,
+        x=category_costs['Cost'],
+        y=category_costs['ServiceCategory'],
         orientation='h',
         title='📦 Coûts par Catégorie de Service',
         labels={'x': 'Coût (USD)', 'y': 'Catégorie'},
-        color=category_costs.values,
+        color=category_costs['Cost'],
         color_continuous_scale='Blues'
     )
     
@@ -201,14 +254,14 @@ def plot_category_costs(df):
     return fig
 
 
-def plot_account_comparison(df):
-    """Comparaison des coûts entre comptes"""
+@timed()
+def plot_account_comparison(account_costs):
+    """Comparaison des coûts entre comptes (Date, AccountName, Cost)"""
+    import plotly.express as px
     
-    if 'AccountName' not in df.columns:
+    if account_costs is None:
         return None
     
-    account_costs = df.groupby(['Date', 'AccountName'])['Cost'].sum().reset_index()
-    
     fig = px.area(
         account_costs,
         x='Date',
@@ -229,10 +282,12 @@ def plot_account_comparison(df):
     return fig
 
 
-def plot_weekday_analysis(df):
-    """Analyse des coûts par jour de la semaine"""
+@timed()
+def plot_weekday_analysis(weekday_costs):
+    """Analyse des coûts par jour de la semaine (DayName, Mean)"""
+    import plotly.graph_objects as go
     
-    weekday_costs = df.groupby('DayName')['Cost'].mean().reindex([
+    weekday_costs = weekday_costs.set_index('DayName')['Mean'].reindex([
         'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
     ])
     
@@ -257,10 +312,10 @@ def plot_weekday_analysis(df):
     
     return fig
 
-def plot_cloud_comparison(df):
-    """Comparaison des coûts entre clouds"""
-    
-    cloud_costs = df.groupby('Cloud')['Cost'].sum().reset_index()
+@timed()
+def plot_cloud_comparison(cloud_costs):
+    """Comparaison des coûts entre clouds (Cloud, Cost)"""
+    import plotly.express as px
     
     fig = px.pie(
         cloud_costs,
@@ -282,18 +337,20 @@ def plot_cloud_comparison(df):
     
     return fig
 
-def plot_monthly_trend(monthly_df):
-    """Graphique de tendance mensuelle"""
+@timed()
+def plot_monthly_trend(monthly_costs):
+    """Graphique de tendance mensuelle (YearMonth, Cost)"""
+    import plotly.graph_objects as go
     
-    if monthly_df is None:
+    if monthly_costs is None or len(monthly_costs) == 0:
         return None
     
     fig = go.Figure()
     
     # Ligne de tendance
     fig.add_trace(go.Scatter(
-        x=monthly_df['Month'],
-        y=monthly_df['TotalCost'],
+        x=monthly_costs['YearMonth'],
+        y=monthly_costs['Cost'],
         mode='lines+markers',
         name='Coût Mensuel',
         line=dict(color='#1f77b4', width=3),
@@ -312,16 +369,63 @@ def plot_monthly_trend(monthly_df):
     return fig
 
 
-def show_top_services_table(df):
-    """Tableau des top services avec détails"""
+@timed()
+def plot_kpi_history(history):
+    """Coût total et prévision de fin de mois par exécution (historique des KPIs)"""
+    import plotly.graph_objects as go
+    
+    if history is None or len(history) < 2:
+        return None
+    
+    fig = go.Figure()
     
-    top_services = df.groupby('Service').agg({
-        'Cost': ['sum', 'mean', 'count']
-    }).round(2)
+    fig.add_trace(go.Scatter(
+        x=history['DateMax'],
+        y=history['total_cost'],
+        mode='lines+markers',
+        name='Coût total (période de l\'exécution)',
+        text=history['RunId'],
+        line=dict(color='#1f77b4', width=2)
+    ))
+    
+    # Prévision de fin de mois et son intervalle
+    forecast = history.dropna(subset=['forecast_month_end'])
+    if len(forecast):
+        fig.add_trace(go.Scatter(
+            x=forecast['DateMax'],
+            y=forecast['forecast_month_end'],
+            mode='lines+markers',
+            name='Prévision fin de mois',
+            text=forecast['forecast_month'],
+            line=dict(color='#ff7f0e', width=2, dash='dash'),
+            error_y=dict(
+                type='data', symmetric=False,
+                array=forecast['forecast_upper'] - forecast['forecast_month_end'],
+                arrayminus=forecast['forecast_month_end'] - forecast['forecast_lower']
+            )
+        ))
+    
+    fig.update_layout(
+        title='🕒 KPIs par Exécution',
+        xaxis_title='Dernier jour couvert',
+        yaxis_title='Coût (USD)',
+        plot_bgcolor='white',
+        height=400,
+        hovermode='x unified'
+    )
+    
+    return fig
+
+
+def show_top_services_table(service_stats, total_cost, top_n=10):
+    """Tableau des top services avec détails (Service, Cost, Mean, Count)"""
+    
+    top_services = service_stats.set_index('Service')[['Cost', 'Mean', 'Count']].round(2)
     
     top_services.columns = ['Coût Total', 'Coût Moyen/Jour', 'Nb Jours']
-    top_services = top_services.sort_values('Coût Total', ascending=False).head(10)
-    top_services['Part (%)'] = (top_services['Coût Total'] / df['Cost'].sum() * 100).round(1)
+    top_services = top_services.sort_values('Coût Total', ascending=False, kind='mergesort').head(top_n)
+    top_services['Part (%)'] = (top_services['Coût Total'] / total_cost * 100).round(1) \
+        if total_cost else 0.0
     
     # Reformater pour l'affichage
     top_services['Coût Total'] = top_services['Coût Total'].apply(lambda x: f'${x:,.2f}')
@@ -331,199 +435,394 @@ def show_top_services_table(df):
     return top_services
 
 
-def main():
-    """Fonction principale du dashboard"""
+def show_chart(fig, key):
+    """Affiche un graphique plotly (envoi mesuré en mode profilage)"""
+    with current_profiler().send(key, fig):
+        st.plotly_chart(fig, width='stretch', key=key)
+
+
+def show_render_profile(profiler, title="🩺 Profilage du rendu", expanded=True):
+    """Panneau de profilage : détail de la réexécution et historique de la session"""
+    
+    history = st.session_state.setdefault('profile_history', [])
+    history.append(profiler.summary())
+    del history[:-20]
+    profiler.save(version_label(st.session_state['run_version']))
+    
+    with st.expander(f"{title} : {profiler.total_ms():,.0f} ms", expanded=expanded):
+        st.caption(
+            "Durées côté serveur ; « envoi » couvre la sérialisation par Streamlit, "
+            "les octets la taille de la charge utile transmise au navigateur"
+        )
+        st.dataframe(profiler.table(), width='stretch', hide_index=True)
+        st.markdown("**Réexécutions précédentes**")
+        st.dataframe(pd.DataFrame(history[::-1]), width='stretch', hide_index=True)
+        if profiler.log_path:
+            st.caption(f"📝 Mesures ajoutées à {profiler.log_path}")
+
+
+def section_fragment(name):
+    """
+    Section du dashboard rendue dans un fragment Streamlit : ses contrôles locaux
+    ne réexécutent qu'elle, pas le reste de la page
+    """
+    def decorator(render):
+        @st.fragment
+        @functools.wraps(render)
+        def fragment(*args):
+            profiler = active_profiler()
+            standalone = profiler is None
+            if standalone:
+                # Réexécution du seul fragment : main() n'a pas ouvert de profileur
+                profiler = RenderProfiler(st.session_state.get('profile_render', profiling_requested())).activate()
+            try:
+                with profiler.section(name):
+                    render(*args)
+            finally:
+                if standalone:
+                    profiler.deactivate()
+            if standalone and profiler.enabled:
+                show_render_profile(profiler, f"🩺 Section « {name} » réexécutée seule", expanded=False)
+        return fragment
+    return decorator
+
+
+@section_fragment("Multi-cloud")
+def show_multicloud(queries, filters):
+    """Onglet Multi-Cloud : coûts par cloud provider"""
     
-    # Header
-    st.title("💰 FinOps Dashboard")
-    st.markdown("### Analyse des Coûts Cloud Multi-Compte")
+    cloud_stats = queries.aggregate(['Cloud'], filters)
+    if len(cloud_stats) < 2:
+        st.info("ℹ️ Un seul cloud provider dans la période sélectionnée.")
+        return
     
-    # Charger les données
-    with st.spinner('🔄 Chargement des données...'):
-        df, kpis, monthly_df = load_latest_data()
+    col_cloud1, col_cloud2 = st.columns(2)
     
-    if df is None:
-        st.error("❌ Aucune donnée trouvée. Veuillez d'abord exécuter les scripts d'extraction et de transformation.")
-        st.info("💡 Exécutez : `python scripts/extract_costs.py` puis `python scripts/transform_costs.py`")
-        return
+    with col_cloud1:
+        fig_cloud = plot_cloud_comparison(cloud_stats)
+        show_chart(fig_cloud, "cloud_comparison_chart")
     
-    # Informations sur les données
-    st.sidebar.header("📊 Informations")
-    st.sidebar.info(f"""
-    **Période analysée**  
-    Du {df['Date'].min().strftime('%d/%m/%Y')}  
-    Au {df['Date'].max().strftime('%d/%m/%Y')}
-    
-    **Total d'enregistrements**  
-    {len(df):,} lignes
-    """)
-    
-    # Filtres
-    st.sidebar.header("🔍 Filtres")
-    
-    # Filtre par date
-    date_range = st.sidebar.date_input(
-        "Période",
-        value=(df['Date'].min(), df['Date'].max()),
-        min_value=df['Date'].min().date(),
-        max_value=df['Date'].max().date()
-    )
+    with col_cloud2:
+        # Tableau de comparaison
+        cloud_table = cloud_stats.set_index('Cloud')[['Cost', 'Mean', 'Count']].round(2)
+        cloud_table.columns = ['Coût Total ($)', 'Coût Moyen ($)', 'Nb Enregistrements']
+        with current_profiler().send("cloud_table", cloud_table):
+            st.dataframe(cloud_table, width='stretch')
+
+
+@section_fragment("Évolution")
+def show_evolution(queries, filters):
+    """Onglet Évolution : série temporelle (granularité au choix) et jours de la semaine"""
     
-    # Filtre par compte
-    if 'AccountName' in df.columns:
-        accounts = ['Tous'] + sorted(df['AccountName'].unique().tolist())
-        selected_account = st.sidebar.selectbox("Compte", accounts)
-    else:
-        selected_account = 'Tous'
+    granularity = st.radio("Granularité", ['Jour', 'Mois'], horizontal=True, key='evolution_granularity')
     
-    # Filtre par catégorie
-    categories = ['Toutes'] + sorted(df['ServiceCategory'].unique().tolist())
-    selected_category = st.sidebar.selectbox("Catégorie", categories)
+    col1, col2 = st.columns(2)
     
-    # Appliquer les filtres
-    filtered_df = df.copy()
+    with col1:
+        if granularity == 'Jour':
+            fig_daily = plot_daily_costs(queries.aggregate(['Date'], filters))
+            show_chart(fig_daily, "daily_costs_chart")
+        else:
+            fig_monthly = plot_monthly_trend(queries.aggregate(['YearMonth'], filters))
+            if fig_monthly:
+                show_chart(fig_monthly, "monthly_trend_chart")
     
-    if len(date_range) == 2:
-        filtered_df = filtered_df[
-            (filtered_df['Date'] >= pd.to_datetime(date_range[0])) &
-            (filtered_df['Date'] <= pd.to_datetime(date_range[1]))
-        ]
+    with col2:
+        fig_weekday = plot_weekday_analysis(queries.aggregate(['DayName'], filters))
+        show_chart(fig_weekday, "weekday_analysis_chart")
+
+
+@section_fragment("Services")
+def show_services(queries, filters, total_cost):
+    """Onglet Services : répartition, catégories et détail des principaux services"""
     
-    if selected_account != 'Tous':
-        filtered_df = filtered_df[filtered_df['AccountName'] == selected_account]
+    top_n = st.slider("Nombre de services", min_value=5, max_value=25, value=10, step=5, key='services_top_n')
+    service_stats = queries.aggregate(['Service'], filters)
     
-    if selected_category != 'Toutes':
-        filtered_df = filtered_df[filtered_df['ServiceCategory'] == selected_category]
-    # Dans la fonction main(), après les autres filtres (ligne ~350)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig_services = plot_service_breakdown(service_stats, top_n)
+        show_chart(fig_services, "services_pie_chart")
+    
+    with col2:
+        fig_categories = plot_category_costs(queries.aggregate(['ServiceCategory'], filters))
+        show_chart(fig_categories, "categories_bar_chart")
+    
+    st.subheader(f"📋 Top {top_n} Services - Détails")
+    
+    top_services_table = show_top_services_table(service_stats, total_cost, top_n)
+    with current_profiler().send("top_services_table", top_services_table):
+        st.dataframe(top_services_table, width='stretch')
+    
+    top_csv = top_services_table.to_csv().encode('utf-8')
+    with current_profiler().send("top_services_csv", top_csv):
+        st.download_button(
+            label=f"📥 Télécharger le top {top_n} services (CSV)",
+            data=top_csv,
+            file_name=f"top_services_{datetime.now().strftime('%Y%m%d')}.csv",
+            mime="text/csv"
+        )
 
-# Filtre par cloud
-    clouds = ['Tous'] + sorted(df['Cloud'].unique().tolist())
-    selected_cloud = st.sidebar.selectbox("☁️ Cloud Provider", clouds)
 
-    # Appliquer le filtre
-    if selected_cloud != 'Tous':
-        filtered_df = filtered_df[filtered_df['Cloud'] == selected_cloud]
-        
-    # Vérifier si des données restent après filtrage
-    if len(filtered_df) == 0:
-        st.warning("⚠️ Aucune donnée ne correspond aux filtres sélectionnés.")
-        return
+@section_fragment("Comptes")
+def show_accounts(queries, filters):
+    """Onglet Comptes : évolution des coûts par compte"""
     
-    # Afficher les KPIs
-    st.markdown("---")
-    st.subheader("📊 Indicateurs Clés")
-    create_kpi_cards(filtered_df, kpis)
+    fig_accounts = plot_account_comparison(queries.aggregate(['Date', 'AccountName'], filters))
+    if fig_accounts:
+        show_chart(fig_accounts, "accounts_area_chart")
+
+
+@timed()
+def plot_budget_consumption(budgets, top_n=20):
+    """Consommation réelle et prévue des budgets les plus consommés (% du montant)"""
+    import plotly.graph_objects as go
     
-    # Section graphiques principaux
-    st.markdown("---")
-    st.subheader("📈 Visualisations")
+    top = budgets.head(top_n).iloc[::-1]
+    labels = top['BudgetId'] + ' (' + top['Period'] + ')'
     
-    # Ligne 1 : Évolution + Répartition services
-    col1, col2 = st.columns(2)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=labels, x=top['ActualPct'], orientation='h',
+        name='Dépensé', marker_color='#1f77b4'
+    ))
+    fig.add_trace(go.Bar(
+        y=labels, x=(top['ProjectedPct'] - top['ActualPct']).clip(lower=0), orientation='h',
+        name='Prévu d\'ici la fin de période', marker_color='#aec7e8'
+    ))
+    fig.add_vline(x=100, line_dash='dash', line_color='red')
     
-    def main():
-        
-    # ... code existant jusqu'aux graphiques ...
+    fig.update_layout(
+        title=f'🎯 Consommation des Budgets (Top {len(top)})',
+        xaxis_title='% du budget',
+        barmode='stack',
+        plot_bgcolor='white',
+        height=max(300, 28 * len(top) + 120)
+    )
     
-    # Ligne 1 : Évolution + Répartition services
-        col1, col2 = st.columns(2)
-    # Après les KPIs, avant les graphiques existants
+    return fig
 
-# Section Multi-Cloud
-    if 'Cloud' in filtered_df.columns and len(filtered_df['Cloud'].unique()) > 1:
-        st.markdown("---")
-        st.subheader("☁️ Comparaison Multi-Cloud")
+
+@section_fragment("Budgets")
+def show_budgets(budgets):
+    """Onglet Budgets : alertes et consommation de chaque budget sur sa période en cours"""
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("🎯 Budgets", len(budgets))
+    col2.metric("🚨 Dépassés", int((budgets['Status'] == EXCEEDED).sum()))
+    col3.metric("🔮 Dépassements prévus", int((budgets['Status'] == FORECAST_OVERRUN).sum()))
+    
+    if len(budgets) == 0:
+        return
+    n_incomplete = int((budgets['Status'] == INCOMPLETE).sum())
+    if n_incomplete:
+        st.warning(f"🧩 {n_incomplete} budget(s) dont la période commence avant les données chargées : "
+                   "dépense sous-estimée (transformation complète : --from-store)")
+    n_unmeasured = int((budgets['Status'] == UNMEASURED).sum())
+    if n_unmeasured:
+        st.warning(f"⚠️ {n_unmeasured} budget(s) non mesurable(s) : colonnes de filtre absentes des données "
+                   "(tag non extrait, par exemple)")
+    show_chart(plot_budget_consumption(budgets[budgets['Status'] != UNMEASURED]), "budget_chart")
+    
+    show_all = st.checkbox("Afficher aussi les budgets sans alerte", key='budgets_show_all')
+    table = budgets if show_all else budgets[budgets['Status'] != OK]
+    table = pd.DataFrame({
+        'Budget': table['BudgetId'],
+        'Périmètre': table['Scope'],
+        'Période': table['Period'],
+        'Montant ($)': table['Amount'].round(2),
+        'Dépensé ($)': table['Actual'].round(2),
+        'Dépensé (%)': table['ActualPct'],
+        'Prévu fin de période ($)': table['Projected'].round(2),
+        'Prévu (%)': table['ProjectedPct'],
+        'Statut': table['Status'],
+    })
+    if 'DaysElapsed' in budgets.columns:
+        table['Jours observés'] = budgets['DaysObserved'].astype(str) + ' / ' + budgets['DaysElapsed'].astype(str)
+    with current_profiler().send("budget_table", table):
+        st.dataframe(table, width='stretch', hide_index=True)
+
+
+@section_fragment("Historique")
+def show_history(history):
+    """Onglet Historique : tendance des KPIs d'une exécution à l'autre"""
+    
+    fig_history = plot_kpi_history(history)
+    if fig_history is None:
+        st.info("ℹ️ L'historique des KPIs compte moins de deux exécutions.")
+        return
+    show_chart(fig_history, "kpi_history_chart")
+    
+    table = history.iloc[::-1].head(30)
+    table = pd.DataFrame({
+        'Exécution': table['RunId'],
+        'Période': table['DateMin'].dt.strftime('%d/%m/%Y') + ' → ' + table['DateMax'].dt.strftime('%d/%m/%Y'),
+        'Coût Total ($)': table['total_cost'].round(2),
+        'Anomalies (jours)': table['anomaly_count'],
+        'Anomalies (séries)': table['series_anomaly_count'],
+        'Prévision Fin de Mois ($)': table['forecast_month_end'].round(2),
+        'Top Services': table['TopServices'].apply(
+            lambda services: ', '.join(s['Service'] for s in services) if services is not None else ''
+        ),
+    })
+    with current_profiler().send("kpi_history_table", table):
+        st.dataframe(table, width='stretch', hide_index=True)
+
+
+@section_fragment("Export")
+def show_export(queries, filters):
+    """Onglet Export : lignes détaillées filtrées, extraites seulement à la demande"""
+    
+    # Volume potentiellement important : rien n'est lu avant le clic
+    if st.button("📦 Préparer l'export des données filtrées"):
+        csv = queries.rows(filters).to_csv(index=False).encode('utf-8')
+        with current_profiler().send("export_csv", csv):
+            st.download_button(
+                label="📥 Télécharger les données filtrées (CSV)",
+                data=csv,
+                file_name=f"finops_data_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv"
+            )
+
+
+def main():
+    """Fonction principale du dashboard"""
+    
+    # Mode profilage (case de la barre latérale, ou FINOPS_PROFILE=1 par défaut)
+    profiler = RenderProfiler(st.session_state.get('profile_render', profiling_requested())).activate()
+    
+    # Header
+    st.title("💰 FinOps Dashboard")
+    st.markdown("### Analyse des Coûts Cloud Multi-Compte")
+    
+    # Charger les données
+    with profiler.section("Chargement"), st.spinner('🔄 Chargement des données...'):
+        queries, kpis, history, budgets, run = load_latest_data()
+    
+    if queries is None:
+        st.error("❌ Aucune donnée trouvée. Veuillez d'abord exécuter les scripts d'extraction et de transformation.")
+        st.info("💡 Exécutez : `python scripts/extract_costs.py` puis `python scripts/transform_costs.py`")
+        return
+    
+    # Nouvelle exécution publiée depuis le dernier affichage de cette session
+    if st.session_state.get('run_version') not in (None, run.version):
+        st.toast(f"🔄 Nouvelle exécution chargée : {run.label}")
+    st.session_state['run_version'] = run.version
+    queries = profiler.queries(queries)
+    
+    with profiler.section("Barre latérale et filtres"):
+        date_min, date_max = queries.date_range()
         
-        col_cloud1, col_cloud2 = st.columns(2)
+        # Informations sur les données
+        st.sidebar.header("📊 Informations")
+        st.sidebar.info(f"""
+        **Période analysée**  
+        Du {date_min.strftime('%d/%m/%Y')}  
+        Au {date_max.strftime('%d/%m/%Y')}
         
-        with col_cloud1:
-            fig_cloud = plot_cloud_comparison(filtered_df)
-            st.plotly_chart(fig_cloud, width='stretch', key="cloud_comparison_chart")
+        **Total d'enregistrements**  
+        {queries.row_count():,} lignes
+        """)
+        engine_labels = {
+            'snapshot': "instantané Arrow (projeté en mémoire)",
+            'duckdb': "DuckDB (Parquet)",
+            'arrow': "Arrow (en mémoire, partagé)",
+            'pandas': "pandas (en mémoire)",
+            'cube': "rollups pré-agrégés",
+        }
+        st.sidebar.caption("⚙️ Moteur de requêtes : " + engine_labels.get(queries.name, queries.name))
+        st.sidebar.caption(f"🏷️ Version affichée : {run.label}")
+        st.sidebar.checkbox("🩺 Profilage du rendu", value=profiling_requested(), key='profile_render')
         
-        with col_cloud2:
-            # Tableau de comparaison
-            cloud_stats = filtered_df.groupby('Cloud').agg({
-                'Cost': ['sum', 'mean', 'count']
-            }).round(2)
-            cloud_stats.columns = ['Coût Total ($)', 'Coût Moyen ($)', 'Nb Enregistrements']
-            st.dataframe(cloud_stats, use_container_width=True)
-        with col1:
-            fig_daily = plot_daily_costs(filtered_df)
-            st.plotly_chart(fig_daily, use_container_width=True, key="daily_costs_chart")
-    
-        with col2:
-            fig_services = plot_service_breakdown(filtered_df)
-            st.plotly_chart(fig_services, use_container_width=True, key="services_pie_chart")
+        # Filtres
+        st.sidebar.header("🔍 Filtres")
+        filters = {}
+        
+        # Filtre par date
+        date_range = st.sidebar.date_input(
+            "Période",
+            value=(date_min, date_max),
+            min_value=date_min.date(),
+            max_value=date_max.date()
+        )
+        if len(date_range) == 2:
+            filters['Date'] = (pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))
         
-        # Ligne 2 : Catégories + Comptes
-        col3, col4 = st.columns(2)
+        # Filtre par compte
+        if 'AccountName' in queries.columns:
+            accounts = ['Tous'] + queries.distinct('AccountName')
+            selected_account = st.sidebar.selectbox("Compte", accounts)
+            if selected_account != 'Tous':
+                filters['AccountName'] = selected_account
         
-        with col3:
-            fig_categories = plot_category_costs(filtered_df)
-            st.plotly_chart(fig_categories, use_container_width=True, key="categories_bar_chart")
+        # Filtre par catégorie
+        categories = ['Toutes'] + queries.distinct('ServiceCategory')
+        selected_category = st.sidebar.selectbox("Catégorie", categories)
+        if selected_category != 'Toutes':
+            filters['ServiceCategory'] = selected_category
         
-        with col4:
-            if 'AccountName' in filtered_df.columns:
-                fig_accounts = plot_account_comparison(filtered_df)
-                if fig_accounts:
-                    st.plotly_chart(fig_accounts, use_container_width=True, key="accounts_area_chart")
-            else:
-                fig_weekday = plot_weekday_analysis(filtered_df)
-                st.plotly_chart(fig_weekday, use_container_width=True, key="weekday_default_chart")
+        # Filtre par cloud
+        if 'Cloud' in queries.columns:
+            clouds = ['Tous'] + queries.distinct('Cloud')
+            selected_cloud = st.sidebar.selectbox("☁️ Cloud Provider", clouds)
+            if selected_cloud != 'Tous':
+                filters['Cloud'] = selected_cloud
         
-        # Ligne 3 : Analyse hebdomadaire + Tendance mensuelle
-        col5, col6 = st.columns(2)
+    # Vérifier si des données restent après filtrage
+    if queries.row_count(filters) == 0:
+        st.warning("⚠️ Aucune donnée ne correspond aux filtres sélectionnés.")
+        return
+    
+    with profiler.section("KPIs"):
+        total_cost = queries.total_cost(filters)
         
-        with col5:
-            fig_weekday = plot_weekday_analysis(filtered_df)
-            st.plotly_chart(fig_weekday, use_container_width=True, key="weekday_analysis_chart")
+        # Afficher les KPIs
+        st.markdown("---")
+        st.subheader("📊 Indicateurs Clés")
+        create_kpi_cards(total_cost, kpis, previous_kpis(history, run))
         
-        with col6:
-            if monthly_df is not None:
-                fig_monthly = plot_monthly_trend(monthly_df)
-                if fig_monthly:
-                    st.plotly_chart(fig_monthly, use_container_width=True, key="monthly_trend_chart")
+        # Budgets en alerte (évalués par la transformation, tous filtres confondus)
+        if budgets is not None:
+            exceeded = budgets['Status'].isin([EXCEEDED, FORECAST_OVERRUN]).sum()
+            if exceeded:
+                st.error(f"🚨 {exceeded} budget(s) dépassé(s) ou en dépassement prévu : voir l'onglet Budgets")
         
-    
-    # Section tableau détaillé
-    st.markdown("---")
-    st.subheader("📋 Top 10 Services - Détails")
-    
-    top_services_table = show_top_services_table(filtered_df)
-    st.dataframe(top_services_table, use_container_width=True)
-    
-    # Section téléchargement
+    # Sections en onglets : seul l'onglet ouvert est calculé et envoyé au navigateur,
+    # et les contrôles propres à une section ne réexécutent que son fragment
     st.markdown("---")
-    st.subheader("💾 Exporter les Données")
-    
-    col_export1, col_export2 = st.columns(2)
-    
-    with col_export1:
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Télécharger les données filtrées (CSV)",
-            data=csv,
-            file_name=f"finops_data_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+    st.subheader("📈 Visualisations")
     
-    with col_export2:
-        top_csv = top_services_table.to_csv().encode('utf-8')
-        st.download_button(
-            label="📥 Télécharger le top 10 services (CSV)",
-            data=top_csv,
-            file_name=f"top_services_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
-        
+    sections = []
+    if 'Cloud' in queries.columns and 'Cloud' not in filters and len(queries.distinct('Cloud')) > 1:
+        sections.append(("☁️ Multi-Cloud", show_multicloud, (queries, filters)))
+    sections.append(("📈 Évolution", show_evolution, (queries, filters)))
+    sections.append(("🔧 Services", show_services, (queries, filters, total_cost)))
+    if 'AccountName' in queries.columns:
+        sections.append(("💼 Comptes", show_accounts, (queries, filters)))
+    if budgets is not None:
+        sections.append(("🎯 Budgets", show_budgets, (budgets,)))
+    sections.append(("🕒 Historique", show_history, (history,)))
+    sections.append(("💾 Export", show_export, (queries, filters)))
+    
+    tabs = st.tabs([label for label, _, _ in sections], key='dashboard_section', on_change='rerun')
+    for tab, (label, render, args) in zip(tabs, sections):
+        if tab.open:
+            with tab:
+                render(*args)
     
     # Footer
     st.markdown("---")
     st.markdown("""
         <div style='text-align: center; color: gray;'>
-            <p>FinOps Dashboard v1.0 | Données mises à jour le {}</p>
+            <p>FinOps Dashboard v1.0 | Données : {} (chargées le {})</p>
         </div>
-    """.format(datetime.now().strftime('%d/%m/%Y à %H:%M')), unsafe_allow_html=True)
+    """.format(run.label, run.loaded_at.strftime('%d/%m/%Y à %H:%M')), unsafe_allow_html=True)
+    
+    if profiler.enabled:
+        st.markdown("---")
+        show_render_profile(profiler)
+    profiler.deactivate()
 
 
 if __name__ == "__main__":
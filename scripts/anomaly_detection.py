@@ -0,0 +1,257 @@
+"""
+Détection d'anomalies par série de coûts (compte × service × région)
+Toutes les séries sont traitées en une fois sous forme de matrice séries × jours (NumPy),
+sans boucle Python par série
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Clés identifiant une série de coûts
+SERIES_KEYS = ['Cloud', 'AccountName', 'Service', 'Region']
+
+
+def factorize_keys(df, keys):
+    """
+    Attribue un identifiant entier (0..n-1) à chaque combinaison de clés
+
+    Chaque colonne est factorisée séparément puis les codes sont combinés
+    en un entier unique (base mixte), bien plus rapide qu'un groupby multi-colonnes.
+    Les identifiants suivent l'ordre trié des clés (ordre des catégories
+    pour les colonnes catégorielles, dont les codes sont réutilisés tels quels).
+    """
+    combined = np.zeros(len(df), dtype=np.int64)
+    for key in keys:
+        column = df[key]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Codes déjà calculés : aucun hachage de chaînes (-1 = manquant)
+            codes = column.cat.codes.to_numpy(dtype=np.int64) + 1
+            cardinality = len(column.cat.categories) + 1
+        else:
+            codes, uniques = pd.factorize(column, sort=True, use_na_sentinel=False)
+            cardinality = len(uniques)
+        combined = combined * (cardinality + 1) + codes
+    _, series_idx = np.unique(combined, return_inverse=True)
+    return series_idx.astype(np.int64)
+
+
+def build_series_matrix(df, keys, date_col='Date', value_col='Cost', with_observed=False):
+    """
+    Construit la matrice dense des coûts journaliers par série
+
+    Les lignes ayant les mêmes clés et la même date sont additionnées ;
+    les jours sans donnée valent 0.
+
+    Args:
+        df: DataFrame contenant keys, date_col et value_col
+        keys: Colonnes identifiant une série
+        with_observed: Si True, renvoie aussi le masque des jours où la série
+                       a au moins une ligne (jours réellement observés)
+
+    Returns:
+        (matrix, series_keys, dates) : matrice (séries × jours), DataFrame
+        des clés de chaque série (une ligne par série), DatetimeIndex des jours ;
+        (matrix, observed, series_keys, dates) si with_observed
+    """
+    dates = pd.to_datetime(df[date_col])
+    day0 = dates.min().normalize()
+    day_idx = ((dates - day0) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+    n_days = int(day_idx.max()) + 1
+
+    # Identifiant entier de série (factorisation vectorisée des clés)
+    series_idx = factorize_keys(df, keys)
+    n_series = int(series_idx.max()) + 1
+
+    # Première ligne de chaque série pour récupérer les valeurs des clés
+    first_row = np.empty(n_series, dtype=np.int64)
+    first_row[series_idx[::-1]] = np.arange(len(series_idx) - 1, -1, -1)
+    series_keys = df[keys].iloc[first_row].reset_index(drop=True)
+
+    # Somme par (série, jour) via bincount sur un index aplati
+    flat = series_idx * n_days + day_idx
+    values = df[value_col].to_numpy(dtype=np.float64)
+    matrix = np.bincount(flat, weights=values, minlength=n_series * n_days)
+    matrix = matrix.reshape(n_series, n_days)
+
+    all_dates = pd.date_range(day0, periods=n_days, freq='D')
+    if with_observed:
+        observed = np.bincount(flat, minlength=n_series * n_days).reshape(n_series, n_days) > 0
+        return matrix, observed, series_keys, all_dates
+    return matrix, series_keys, all_dates
+
+
+def zero_fill_mask(series_keys, zero_fill):
+    """
+    Séries dont les jours sans donnée comptent comme un coût nul
+
+    Args:
+        series_keys: Clés de chaque série (voir build_series_matrix)
+        zero_fill: True (toutes les séries), False/None (aucune) ou
+                   {colonne: [valeurs]} (séries ayant l'une des valeurs)
+
+    Returns:
+        Tableau booléen (une valeur par série)
+    """
+    if zero_fill is True:
+        return np.ones(len(series_keys), dtype=bool)
+    mask = np.zeros(len(series_keys), dtype=bool)
+    for column, values in (zero_fill or {}).items():
+        if column in series_keys.columns:
+            mask |= series_keys[column].isin(values).to_numpy()
+    return mask
+
+
+def rolling_baseline(matrix, window, observed=None):
+    """
+    Moyenne et écart-type glissants sur les `window` jours précédents (jour courant exclu)
+
+    Calculés pour toutes les séries à la fois à partir de sommes cumulées.
+    Seuls les jours observés entrent dans la ligne de base : count est le
+    nombre de jours observés de la fenêtre.
+
+    Args:
+        observed: Masque des jours observés (défaut : tous les jours)
+
+    Returns:
+        (mean, std, count) : matrices de même forme que matrix
+    """
+    n_series, n_days = matrix.shape
+    if observed is None:
+        observed = np.ones(matrix.shape, dtype=bool)
+    values = np.where(observed, matrix, 0.0)
+    zeros = np.zeros((n_series, 1))
+    csum = np.concatenate([zeros, np.cumsum(values, axis=1)], axis=1)
+    csq = np.concatenate([zeros, np.cumsum(values * values, axis=1)], axis=1)
+    cobs = np.concatenate([zeros, np.cumsum(observed, axis=1, dtype=np.float64)], axis=1)
+
+    t = np.arange(n_days)
+    lo = np.maximum(t - window, 0)
+
+    window_sum = csum[:, t] - csum[:, lo]
+    window_sq = csq[:, t] - csq[:, lo]
+    count = cobs[:, t] - cobs[:, lo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = window_sum / count
+        var = (window_sq - count * mean * mean) / (count - 1)
+    std = np.sqrt(np.clip(var, 0.0, None))
+    return mean, std, count
+
+
+def ewma_baseline(matrix, alpha, observed=None):
+    """
+    Moyenne et écart-type exponentiels (EWMA) du passé, jour courant exclu
+
+    La récurrence est itérée sur les jours, chaque pas étant vectorisé sur toutes les séries.
+    Les jours non observés ne mettent pas à jour la moyenne ; count est le
+    nombre de jours observés avant le jour courant.
+
+    Args:
+        observed: Masque des jours observés (défaut : tous les jours)
+
+    Returns:
+        (mean, std, count) : matrices de même forme que matrix
+    """
+    n_series, n_days = matrix.shape
+    if observed is None:
+        observed = np.ones(matrix.shape, dtype=bool)
+    mean = np.full(matrix.shape, np.nan)
+    var = np.full(matrix.shape, np.nan)
+    count = np.zeros(matrix.shape)
+
+    m = np.full(n_series, np.nan)
+    v = np.zeros(n_series)
+    n = np.zeros(n_series)
+    for t in range(n_days):
+        mean[:, t] = m
+        var[:, t] = v
+        count[:, t] = n
+        seen = observed[:, t]
+        # Premier jour observé : initialise la moyenne
+        first = seen & (n == 0)
+        m[first] = matrix[first, t]
+        update = seen & ~first
+        delta = matrix[update, t] - m[update]
+        m[update] += alpha * delta
+        v[update] = (1 - alpha) * (v[update] + alpha * delta * delta)
+        n += seen
+
+    mean[count == 0] = np.nan
+    var[count == 0] = np.nan
+    return mean, np.sqrt(var), count
+
+
+def detect_anomalies(df, keys=None, method='rolling', window=14, alpha=0.3,
+                     z_threshold=3.0, min_history=7, min_excess=1.0, rel_std_floor=0.05,
+                     zero_fill=None):
+    """
+    Détecte les pics de coûts sur chaque série (compte × service × région)
+
+    Un jour est anormal si son coût dépasse la ligne de base de la série
+    de plus de z_threshold écarts-types ET de plus de min_excess USD.
+    L'écart-type est borné inférieurement par rel_std_floor × ligne de base
+    pour éviter les faux positifs sur les séries quasi constantes.
+    Les jours où une série n'a aucune ligne ne font pas partie de sa ligne
+    de base (ni de min_history), sauf pour les séries choisies par zero_fill.
+
+    Args:
+        df: Données de coûts (une ligne par coût, non agrégées ou agrégées)
+        keys: Colonnes identifiant une série (défaut : SERIES_KEYS présentes)
+        method: 'rolling' (fenêtre glissante) ou 'ewma'
+        window: Taille de la fenêtre glissante (jours)
+        alpha: Facteur de lissage EWMA
+        z_threshold: Seuil de z-score
+        min_history: Nombre minimal de jours d'historique pour évaluer un jour
+        min_excess: Surcoût minimal (USD) pour signaler une anomalie
+        zero_fill: Séries dont les jours sans donnée valent un coût nul
+                   (True, ou {colonne: [valeurs]} ; voir zero_fill_mask)
+
+    Returns:
+        DataFrame des anomalies classé par surcoût décroissant
+        (clés, Date, Cost, Baseline, StdDev, ZScore, ExcessCost, Rank)
+    """
+    if keys is None:
+        keys = [k for k in SERIES_KEYS if k in df.columns]
+
+    columns = keys + ['Date', 'Cost', 'Baseline', 'StdDev', 'ZScore', 'ExcessCost', 'Rank']
+    if len(df) == 0:
+        return pd.DataFrame(columns=columns)
+
+    matrix, observed, series_keys, dates = build_series_matrix(df, keys, with_observed=True)
+    observed |= zero_fill_mask(series_keys, zero_fill)[:, None]
+
+    if method == 'ewma':
+        mean, std, count = ewma_baseline(matrix, alpha, observed)
+    elif method == 'rolling':
+        mean, std, count = rolling_baseline(matrix, window, observed)
+    else:
+        raise ValueError(f"Méthode de détection inconnue : {method}")
+
+    scale = np.maximum(std, rel_std_floor * np.abs(mean))
+    excess = matrix - mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zscore = excess / scale
+
+    flagged = (
+        observed
+        & (count >= min_history)
+        & (excess > min_excess)
+        & (zscore > z_threshold)
+    )
+    flagged &= np.isfinite(zscore)
+
+    s_idx, t_idx = np.nonzero(flagged)
+    anomalies = series_keys.iloc[s_idx].reset_index(drop=True)
+    anomalies['Date'] = dates[t_idx]
+    anomalies['Cost'] = matrix[s_idx, t_idx].round(2)
+    anomalies['Baseline'] = mean[s_idx, t_idx].round(2)
+    anomalies['StdDev'] = std[s_idx, t_idx].round(2)
+    anomalies['ZScore'] = zscore[s_idx, t_idx].round(2)
+    anomalies['ExcessCost'] = excess[s_idx, t_idx].round(2)
+
+    anomalies = anomalies.sort_values(
+        ['ExcessCost', 'ZScore'], ascending=False, kind='mergesort'
+    ).reset_index(drop=True)
+    anomalies['Rank'] = np.arange(1, len(anomalies) + 1)
+    return anomalies[columns]
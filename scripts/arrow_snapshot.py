@@ -0,0 +1,237 @@
+"""
+Instantanés Arrow IPC des sorties de la transformation
+Fichiers Arrow non compressés que le dashboard projette en mémoire (memory map) au
+démarrage : aucune analyse de CSV ni conversion de dates, seules les pages des
+colonnes réellement lues sont chargées, et partagées entre processus par le cache système
+"""
+
+import glob
+import os
+
+from partitions import atomic_path
+
+
+# Extension des instantanés (à côté des CSV / du jeu Parquet de même nom)
+SNAPSHOT_EXT = 'arrow'
+
+# Colonne texte encodée en dictionnaire si ses valeurs distinctes ne dépassent pas
+# cette part des lignes (identifiants quasi uniques : gardés en texte simple)
+DICTIONARY_MAX_RATIO = 0.5
+
+# Lignes par lot écrit : les lots sources (fichiers, groupes de lignes) sont redécoupés,
+# le fichier ne dépend que des lignes, pas du découpage du jeu Parquet lu
+SNAPSHOT_BATCH_ROWS = 131_072
+
+
+def snapshot_available():
+    """Vrai si pyarrow est installé (écriture et lecture des instantanés)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_text(data_type):
+    """Type texte (éventuellement déjà encodé en dictionnaire)"""
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+
+def _dictionaries(columns, rows):
+    """
+    Dictionnaires communs des colonnes texte qui s'y prêtent
+
+    Args:
+        columns: {colonne texte: valeurs (pa.Array / ChunkedArray, doublons permis)}
+        rows: Nombre de lignes de l'instantané
+
+    Returns:
+        {colonne: valeurs distinctes non nulles triées (fichier reproductible)}
+    """
+    import pyarrow.compute as pc
+
+    dictionaries = {}
+    for name, values in columns.items():
+        distinct = pc.unique(values).drop_null()
+        if len(distinct) <= max(rows * DICTIONARY_MAX_RATIO, 1):
+            dictionaries[name] = distinct.take(pc.array_sort_indices(distinct))
+    return dictionaries
+
+
+def _snapshot_schema(schema, dictionaries):
+    """Schéma de l'instantané : texte en dictionnaire (indices int32) ou simple, Date en timestamp[ns]"""
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if field.name in dictionaries:
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif _is_text(field.type):
+            field = field.with_type(pa.string())
+        elif field.name == 'Date':
+            field = field.with_type(pa.timestamp('ns'))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _encode(column, dictionary):
+    """Réencode une colonne texte sur le dictionnaire commun de l'instantané"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_dictionary(column.type):
+        # Seules les valeurs du dictionnaire local sont recherchées, pas chaque ligne
+        mapping = pc.index_in(column.dictionary.cast(pa.string()), value_set=dictionary)
+        indices = pc.take(mapping, column.indices)
+    else:
+        indices = pc.index_in(column.cast(pa.string()), value_set=dictionary)
+    return pa.DictionaryArray.from_arrays(indices.cast(pa.int32()), dictionary)
+
+
+def _rebatch(batches, schema, size=SNAPSHOT_BATCH_ROWS):
+    """Lots de size lignes exactement (sauf le dernier), dans l'ordre des lignes"""
+    import pyarrow as pa
+
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= size:
+            table = pa.Table.from_batches(pending, schema=schema)
+            yield table.slice(0, size).combine_chunks().to_batches()[0]
+            rest = table.slice(size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending, schema=schema).combine_chunks().to_batches()[0]
+
+
+def write_snapshot(batches, schema, dictionaries, path):
+    """
+    Écrit des lots Arrow dans un fichier IPC non compressé (atomique)
+
+    Les lots sont réencodés puis redécoupés en lots de SNAPSHOT_BATCH_ROWS lignes :
+    mêmes lignes, même fichier, quel que soit le découpage des lots sources.
+
+    Args:
+        batches: Itérable de RecordBatch (schéma source)
+        schema: Schéma source des lots
+        dictionaries: {colonne texte: valeurs distinctes (pa.Array)}, un dictionnaire
+                      unique par colonne pour tout le fichier (format IPC « file ») ;
+                      les autres colonnes texte sont écrites en texte simple
+        path: Fichier de sortie
+
+    Returns:
+        Nombre de lignes écrites
+    """
+    import pyarrow as pa
+
+    target = _snapshot_schema(schema, dictionaries)
+
+    def encoded():
+        for batch in batches:
+            columns = []
+            for field, column in zip(target, batch.columns):
+                if field.name in dictionaries:
+                    column = _encode(column, dictionaries[field.name])
+                elif column.type != field.type:
+                    column = column.cast(field.type)
+                columns.append(column)
+            yield pa.record_batch(columns, schema=target)
+
+    rows = 0
+    with atomic_path(path) as tmp_path:
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, target) as writer:
+            for batch in _rebatch(encoded(), target):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    return rows
+
+
+def write_dataset_snapshot(parquet_dir, path):
+    """
+    Instantané des données enrichies à partir de leur jeu de données Parquet
+
+    Deux passes en flux (mémoire bornée, comme le mode par morceaux) : valeurs
+    distinctes des colonnes texte d'abord, puis réencodage et écriture lot par lot.
+
+    Returns:
+        Nombre de lignes écrites, None si le jeu de données n'a aucune partie
+        (toutes les lignes en quarantaine) : aucun instantané n'est écrit
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    parts = sorted(glob.glob(os.path.join(parquet_dir, '*.parquet')))
+    if not parts:
+        return None
+    schema = pq.read_schema(parts[0])
+    strings = [f.name for f in schema if _is_text(f.type)]
+    file_format = ds.ParquetFileFormat(
+        read_options=ds.ParquetReadOptions(dictionary_columns=strings)
+    )
+    dataset = ds.dataset(parts, format=file_format)
+
+    # 1. Dictionnaire commun par colonne texte (valeurs des dictionnaires locaux)
+    values = {name: [] for name in strings}
+    for batch in dataset.to_batches(columns=strings):
+        for name, column in zip(strings, batch.columns):
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary
+            values[name].append(column.cast(pa.string()))
+    dictionaries = _dictionaries(
+        {name: pa.chunked_array(chunks, type=pa.string()) for name, chunks in values.items()},
+        dataset.count_rows()
+    )
+
+    # 2. Lots réencodés sur ces dictionnaires
+    return write_snapshot(dataset.to_batches(), dataset.schema, dictionaries, path)
+
+
+def write_frame_snapshot(df, path):
+    """
+    Instantané d'un DataFrame (rollups, agrégats) : texte encodé en dictionnaire
+
+    Returns:
+        Nombre de lignes écrites
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    dictionaries = _dictionaries(
+        {field.name: column for field, column in zip(table.schema, table.columns) if _is_text(field.type)},
+        table.num_rows
+    )
+    return write_snapshot(table.to_batches(), table.schema, dictionaries, path)
+
+
+def read_snapshot(path):
+    """
+    Projette un instantané en mémoire (aucune copie : les pages sont lues à l'accès)
+
+    Returns:
+        Table Arrow adossée au fichier
+    """
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def read_frame_snapshot(path):
+    """
+    DataFrame pandas d'un instantané (write_frame_snapshot)
+
+    Le texte passe par des catégories : chaque valeur distincte n'est créée
+    qu'une fois en objet Python, puis reprise par référence sur toutes les lignes.
+    """
+    import pandas as pd
+
+    df = read_snapshot(path).to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
@@ -0,0 +1,104 @@
+"""
+Benchmark de l'extraction AWS / Azure contre le serveur local fake_cloud_apis
+Mesure le débit des extracteurs selon la taille de page et le nombre de
+sous-fenêtres interrogées en parallèle, avec latence et limitation simulées
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_cloud_apis import FakeCostApiServer
+from extract_azure_costs import AzureCostExtractor
+from extract_costs import CostExtractor
+
+
+def run_extraction(cloud, server, start_date, end_date, workers):
+    """Exécute une extraction complète et retourne (DataFrame, durée en s)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if cloud == 'AWS':
+            extractor = CostExtractor(use_simulation=False, endpoint_url=server.url, max_workers=workers)
+        else:
+            extractor = AzureCostExtractor(endpoint_url=server.url, max_workers=workers)
+        df = extractor.extract_costs(start_date, end_date)
+    return df, time.perf_counter() - start
+
+
+def expected_rows(cloud, server, start_date, end_date):
+    """Lignes que le serveur doit renvoyer pour la fenêtre (contrôle de complétude)"""
+    if cloud == 'AWS':
+        return server.grouped_costs('AWS', start_date, end_date, ['Service', 'Region'])
+    # Azure : borne de fin incluse, regroupement par abonnement en plus
+    end = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return server.grouped_costs('Azure', start_date, end, ['Service', 'Region', 'AccountName'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction des coûts")
+    parser.add_argument('--days', type=int, default=90, help="Fenêtre d'extraction (jours)")
+    parser.add_argument('--scale', type=int, default=5, help="Multiplicateur du catalogue de services")
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--latency', type=float, default=0.05, help="Latence par requête (s)")
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--rate-limit', type=float, help="Requêtes/s avant limitation")
+    parser.add_argument('--clouds', nargs='+', default=['AWS', 'Azure'])
+    args = parser.parse_args()
+
+    # Identifiants factices : le serveur local ne vérifie pas l'authentification
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    os.environ.setdefault('AZURE_SUBSCRIPTION_ID', 'local-subscription')
+    logging.getLogger('azure').setLevel(logging.WARNING)
+    logging.getLogger('extract_azure_costs').setLevel(logging.ERROR)
+
+    end = datetime.now()
+    start_date = (end - timedelta(days=args.days)).strftime('%Y-%m-%d')
+    end_date = end.strftime('%Y-%m-%d')
+
+    print("="*60)
+    print("⏱️  BENCHMARK EXTRACTION")
+    print("="*60)
+    print(f"📅 Fenêtre : {start_date} → {end_date}")
+    print(f"🧪 Latence {args.latency}s (+{args.jitter}s), limite {args.rate_limit or '∞'} req/s")
+
+    server = FakeCostApiServer(
+        days=args.days + 30, scale=args.scale, latency=args.latency,
+        jitter=args.jitter, rate_limit=args.rate_limit
+    ).serve_in_background()
+
+    try:
+        for cloud in args.clouds:
+            expected = expected_rows(cloud, server, start_date, end_date)
+            print(f"\n{'🟠' if cloud == 'AWS' else '🔵'} {cloud} : {len(expected):,} lignes attendues")
+
+            for page_size in args.page_sizes:
+                server.page_size = page_size
+                for workers in args.workers:
+                    server.reset_stats()
+                    df, elapsed = run_extraction(cloud, server, start_date, end_date, workers)
+                    stats = dict(server.stats)
+                    complete = (
+                        len(df) == len(expected)
+                        and round(df['Cost'].sum(), 2) == round(expected['Cost'].sum(), 2)
+                    )
+                    print(f"   page {page_size:5d} ×{workers:<2d} : {elapsed:7.2f} s  "
+                          f"{len(df) / elapsed:9,.0f} lignes/s  "
+                          f"{stats['requests']:4d} requêtes ({stats['throttled']} limitées)  "
+                          f"{'complet' if complete else 'INCOMPLET'}")
+    finally:
+        server.stop()
+
+    print("\n" + "="*60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark des modes de transformation (séquentiel, par blocs, parallèle)
+Génère un jeu de données synthétique, mesure chaque mode et vérifie que
+les sorties sont identiques octet pour octet
+"""
+
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from transform_costs import CostTransformer
+
+
+def generate_dataset(path, rows, seed=42):
+    """Génère un fichier brut synthétique multi-cloud de `rows` lignes"""
+    rng = np.random.default_rng(seed)
+    services = [f'Amazon EC2 {i}' for i in range(60)] + [f'Azure SQL {i}' for i in range(40)]
+    df = pd.DataFrame({
+        'Date': (pd.Timestamp('2025-01-01')
+                 + pd.to_timedelta(rng.integers(0, 180, rows), unit='D')).strftime('%Y-%m-%d'),
+        'Cloud': rng.choice(['AWS', 'Azure'], rows),
+        'Service': rng.choice(services, rows),
+        'Region': rng.choice(['us-east-1', 'us-west-2', 'eu-west-1', 'westeurope'], rows),
+        'Cost': rng.gamma(2.0, 3.0, rows).round(2),
+        'Currency': 'USD',
+        'AccountName': rng.choice([f'account-{i}' for i in range(30)], rows),
+        'AccountId': rng.integers(10**11, 10**12, rows).astype(str),
+    })
+    df.to_csv(path, index=False)
+    return path
+
+
+def run_mode(input_file, ds, chunksize=None, workers=None):
+    """Exécute une transformation complète et retourne sa durée (s)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        transformer = CostTransformer(input_file, chunksize=chunksize)
+        if chunksize is not None:
+            transformer.transform_in_chunks()
+        elif workers is not None:
+            transformer.transform_parallel(workers)
+        else:
+            transformer.clean_data().add_time_dimensions().categorize_services()
+        transformer \
+            .calculate_aggregations() \
+            .detect_series_anomalies() \
+            .forecast_spend() \
+            .calculate_kpis() \
+            .create_summary_report() \
+            .save_transformed_data(ds=ds)
+    return time.perf_counter() - start
+
+
+def same_outputs(dir_a, dir_b):
+    """
+    Vrai si deux partitions transformées contiennent des fichiers identiques
+
+    Le jeu de données Parquet (répertoire) est ignoré : son découpage en
+    fichiers dépend du mode (un fichier par bloc) ; check_transform_modes.py
+    le compare ligne à ligne.
+    """
+    names = sorted(n for n in os.listdir(dir_a) if os.path.isfile(os.path.join(dir_a, n)))
+    if names != sorted(n for n in os.listdir(dir_b) if os.path.isfile(os.path.join(dir_b, n))):
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(dir_a, dir_b, names, shallow=False)
+    return not mismatch and not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des modes de transformation")
+    parser.add_argument('--rows', type=int, nargs='+', default=[200_000, 1_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--chunksize', type=int, default=250_000)
+    args = parser.parse_args()
+
+    print("="*60)
+    print("⏱️  BENCHMARK TRANSFORMATION")
+    print("="*60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        for rows in args.rows:
+            input_file = generate_dataset(os.path.join(workdir, f'raw_{rows}.csv'), rows)
+            print(f"\n📊 {rows:,} lignes ({os.path.getsize(input_file) / 1e6:.0f} Mo)")
+
+            reference = f'serial-{rows}'
+            baseline = run_mode(input_file, reference)
+            print(f"   {'séquentiel':18s} : {baseline:7.2f} s")
+
+            modes = [(f'blocs {args.chunksize:,}', f'chunks{args.chunksize}-{rows}',
+                      {'chunksize': args.chunksize})]
+            modes += [(f'parallèle ×{w}', f'workers{w}-{rows}', {'workers': w})
+                      for w in args.workers]
+            for label, ds, options in modes:
+                elapsed = run_mode(input_file, ds, **options)
+                identical = same_outputs(
+                    os.path.join('data', 'processed', f'dt={reference}'),
+                    os.path.join('data', 'processed', f'dt={ds}')
+                )
+                print(f"   {label:18s} : {elapsed:7.2f} s  "
+                      f"(×{baseline / elapsed:.2f}, sorties {'identiques' if identical else 'DIFFÉRENTES'})")
+
+    print("\n" + "="*60)
+
+
+if __name__ == "__main__":
+    main()
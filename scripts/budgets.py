@@ -0,0 +1,289 @@
+"""
+Évaluation des budgets sur les agrégats journaliers
+Les budgets (data/config/budgets.json) portent sur un compte, un service, une catégorie,
+un cloud ou un tag, par mois ou par trimestre, avec des seuils d'alerte. Tous sont évalués
+en une passe : une jointure par jeu de colonnes filtrées remplit la matrice budgets × jours,
+d'où se lisent la dépense de la période et, par le modèle linéaire de forecasting ajusté
+à toutes les lignes à la fois, le dépassement prévu à la fin de la période
+"""
+
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cost_allocation import MATCH_COLUMNS
+from data_quality import TAG_PREFIX, tag_column
+from forecasting import design_matrix, fit_linear_models
+
+
+# Fichier de budgets par défaut
+BUDGETS_FILE = os.path.join('data', 'config', 'budgets.json')
+
+# Périodes budgétaires et fréquence pandas correspondante
+PERIODS = {'month': 'M', 'quarter': 'Q'}
+
+# Seuils d'alerte par défaut (% du montant)
+DEFAULT_THRESHOLDS = [80, 100]
+
+# Statuts, du plus grave au moins grave
+# Colonnes du filtre absentes de l'agrégat (ex. tag non extrait) : dépense non mesurable
+UNMEASURED = 'colonnes absentes'
+EXCEEDED = 'dépassé'
+FORECAST_OVERRUN = 'dépassement prévu'
+THRESHOLD = 'seuil atteint'
+# Aucune alerte, mais la période commence avant les données : dépense sous-estimée
+INCOMPLETE = 'données incomplètes'
+OK = 'ok'
+
+# Colonnes de l'état des budgets (budget_status.csv)
+STATUS_COLUMNS = [
+    'BudgetId', 'Scope', 'Period', 'PeriodStart', 'PeriodEnd', 'Amount', 'Actual', 'ActualPct',
+    'Projected', 'ProjectedPct', 'Threshold', 'Status', 'DaysObserved', 'DaysElapsed',
+    'MissingColumns',
+]
+
+
+def _values(value):
+    """Valeur ou liste de valeurs d'un filtre, en liste"""
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+class Budgets:
+    """Budgets validés, évalués ensemble"""
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: Dictionnaire des budgets :
+                default_thresholds: Seuils (% du montant) des budgets qui n'en donnent pas
+                budgets: Liste de {id, match: {colonne: valeur(s)}, tags: {clé: valeur(s)},
+                    period: month | quarter, amount (USD), thresholds}
+        """
+        config = config or {}
+        self.config = config
+        self.default_thresholds = list(config.get('default_thresholds', DEFAULT_THRESHOLDS))
+        self.budgets = [self._validate(budget, i) for i, budget in enumerate(config.get('budgets', []))]
+
+    @classmethod
+    def load(cls, path=BUDGETS_FILE):
+        """Charge un fichier de budgets (aucun budget si le fichier n'existe pas)"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def _validate(self, budget, index):
+        """Vérifie un budget, complète ses valeurs par défaut et calcule son filtre"""
+        budget = dict(budget)
+        budget.setdefault('id', f'budget-{index + 1}')
+        budget.setdefault('period', 'month')
+        if budget['period'] not in PERIODS:
+            raise ValueError(f"Budget {budget['id']} : période inconnue {budget['period']!r} "
+                             f"({', '.join(PERIODS)})")
+        if not isinstance(budget.get('amount'), (int, float)) or budget['amount'] <= 0:
+            raise ValueError(f"Budget {budget['id']} : montant positif attendu")
+        budget['thresholds'] = sorted(float(t) for t in budget.get('thresholds', self.default_thresholds))
+        if any(t <= 0 for t in budget['thresholds']):
+            raise ValueError(f"Budget {budget['id']} : les seuils sont des pourcentages positifs")
+
+        # Filtre effectif : dimensions de l'agrégat et colonnes Tag_* (aucun : budget global)
+        conditions = dict(budget.get('match') or {})
+        unknown = [c for c in conditions if c not in MATCH_COLUMNS and not c.startswith(TAG_PREFIX)]
+        if unknown:
+            raise ValueError(f"Budget {budget['id']} : colonnes de filtre inconnues {unknown}")
+        for key, value in (budget.get('tags') or {}).items():
+            conditions[tag_column(key)] = value
+        budget['conditions'] = {c: _values(v) for c, v in sorted(conditions.items())}
+        return budget
+
+    def __len__(self):
+        return len(self.budgets)
+
+    def digest(self):
+        """Empreinte des budgets (entre dans l'empreinte de la transformation)"""
+        payload = json.dumps(self.config, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def daily_matrix(self, table, first_day, n_days):
+        """
+        Coût journalier de chaque budget (USD)
+
+        Les budgets filtrant le même jeu de colonnes sont développés en une table
+        (valeurs..., budget) et joints en une fois à l'agrégat regroupé sur ces
+        colonnes : une ligne peut compter pour plusieurs budgets (compte et service).
+
+        Args:
+            table: Agrégat (Date, colonnes filtrées, CostCents), dates dans la fenêtre
+            first_day: Premier jour de la matrice
+            n_days: Nombre de jours de la matrice
+
+        Returns:
+            Matrice (budgets × jours)
+        """
+        day = ((pd.to_datetime(table['Date']) - first_day) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+        cents = table['CostCents'].to_numpy(dtype=np.float64)
+        matrix = np.zeros(len(self.budgets) * n_days)
+
+        by_columns = {}
+        for position, budget in enumerate(self.budgets):
+            by_columns.setdefault(tuple(budget['conditions']), []).append(position)
+
+        for columns, positions in by_columns.items():
+            if any(c not in table.columns for c in columns):
+                continue
+            if not columns:
+                daily = np.bincount(day, weights=cents, minlength=n_days)
+                for position in positions:
+                    matrix[position * n_days:(position + 1) * n_days] += daily
+                continue
+            grouped = table[list(columns)].astype(object).assign(_day=day, CostCents=cents) \
+                .groupby(list(columns) + ['_day'], sort=False, as_index=False)['CostCents'].sum()
+            expanded = pd.DataFrame(
+                [combo + (position,)
+                 for position in positions
+                 for combo in itertools.product(*(self.budgets[position]['conditions'][c] for c in columns))],
+                columns=list(columns) + ['_budget']
+            )
+            matched = grouped.merge(expanded.astype({c: object for c in columns}), on=list(columns))
+            flat = matched['_budget'].to_numpy(dtype=np.int64) * n_days + matched['_day'].to_numpy(dtype=np.int64)
+            matrix += np.bincount(flat, weights=matched['CostCents'].to_numpy(), minlength=len(matrix))
+
+        return matrix.reshape(len(self.budgets), n_days) / 100
+
+    def evaluate(self, table, as_of=None, lookback_days=28, min_days_weekly=21):
+        """
+        État de tous les budgets à une date
+
+        1. la période de chaque budget est le mois / trimestre contenant as_of ;
+        2. la dépense de la période se lit sur les sommes cumulées de la matrice ;
+        3. les jours restants sont prévus par le modèle linéaire (tendance + semaine)
+           ajusté sur les lookback_days derniers jours de toutes les lignes à la fois ;
+        4. statut : dépassé, dépassement prévu, seuil atteint, ok ; ok devient
+           « données incomplètes » si l'agrégat ne couvre pas toute la période
+           écoulée (partition de 30 jours et budget trimestriel, par exemple).
+           Un budget dont une colonne de filtre manque à l'agrégat (tag absent
+           d'une extraction Cost Explorer, par exemple) est « colonnes absentes »,
+           sans dépense ni prévision (et non une dépense nulle).
+
+        Args:
+            table: Agrégat (Date, colonnes de MATCH_COLUMNS, Tag_*, CostCents)
+            as_of: Date d'évaluation (défaut : dernier jour de l'agrégat)
+            lookback_days: Historique (jours) de la prévision
+            min_days_weekly: Historique minimal (jours) pour activer la saisonnalité hebdo
+
+        Returns:
+            DataFrame (STATUS_COLUMNS), budgets les plus consommés (prévision) d'abord
+        """
+        if not self.budgets or len(table) == 0:
+            return pd.DataFrame(columns=STATUS_COLUMNS)
+
+        dates = pd.to_datetime(table['Date'])
+        as_of = dates.max().normalize() if as_of is None else pd.Timestamp(as_of).normalize()
+        # Une période par type (mois, trimestre), commune aux budgets de ce type
+        kinds = pd.Series([b['period'] for b in self.budgets])
+        current = {kind: pd.Period(as_of, freq=freq) for kind, freq in PERIODS.items()}
+        periods = kinds.map({kind: str(p) for kind, p in current.items()})
+        starts = pd.DatetimeIndex(kinds.map({kind: p.start_time for kind, p in current.items()}))
+        ends = pd.DatetimeIndex(kinds.map({kind: p.end_time.normalize() for kind, p in current.items()}))
+
+        # Fenêtre : début de la plus longue période ou de l'historique de prévision
+        first_day = max(dates.min().normalize(),
+                        min(starts.min(), as_of - pd.Timedelta(days=lookback_days - 1)))
+        n_days = (as_of - first_day).days + 1
+        in_window = ((dates >= first_day) & (dates <= as_of)).to_numpy()
+        matrix = self.daily_matrix(table[in_window], first_day, n_days)
+        rows = np.arange(len(self.budgets))
+
+        # Dépense de la période (période commencée avant les données : jours observés seulement)
+        start_idx = np.clip((starts - first_day) // pd.Timedelta(days=1), 0, None).to_numpy(dtype=np.int64)
+        cumulative = np.hstack([np.zeros((len(rows), 1)), matrix.cumsum(axis=1)])
+        actual = cumulative[:, -1] - cumulative[rows, start_idx]
+
+        # Budgets non mesurables : aucune ligne ne peut satisfaire leur filtre
+        missing = [[c for c in b['conditions'] if c not in table.columns] for b in self.budgets]
+        unmeasured = np.array([bool(columns) for columns in missing])
+        actual[unmeasured] = np.nan
+
+        # Prévision des jours restants de chaque période
+        horizon = ((ends - as_of) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+        remaining = np.zeros(len(rows))
+        history = matrix[:, -lookback_days:]
+        history_dates = pd.date_range(as_of - pd.Timedelta(days=history.shape[1] - 1), as_of, freq='D')
+        if horizon.max() > 0:
+            if len(history_dates) < 3:
+                # Historique insuffisant pour une tendance : moyenne journalière
+                remaining = history.mean(axis=1) * horizon
+            else:
+                weekly = len(history_dates) >= min_days_weekly
+                beta, _, _ = fit_linear_models(history, history_dates, weekly=weekly)
+                future = pd.date_range(as_of + pd.Timedelta(days=1), periods=int(horizon.max()), freq='D')
+                daily_forecast = np.clip(design_matrix(future, history_dates[0], weekly=weekly) @ beta, 0.0, None)
+                forecast_cumulative = np.vstack([np.zeros((1, len(rows))), daily_forecast.cumsum(axis=0)])
+                remaining = forecast_cumulative[horizon, rows]
+        projected = actual + remaining
+
+        # Plus haut seuil atteint par la dépense réelle
+        amounts = np.array([b['amount'] for b in self.budgets], dtype=np.float64)
+        actual_pct = actual / amounts * 100
+        projected_pct = projected / amounts * 100
+        width = max(len(b['thresholds']) for b in self.budgets)
+        thresholds = np.full((len(rows), width), np.nan)
+        for position, budget in enumerate(self.budgets):
+            thresholds[position, :len(budget['thresholds'])] = budget['thresholds']
+        crossed = np.where(actual_pct[:, None] >= thresholds, thresholds, -np.inf).max(axis=1)
+        crossed[np.isinf(crossed)] = np.nan
+
+        # Jours de la période écoulés à as_of et jours couverts par l'agrégat
+        days_elapsed = ((as_of - starts) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64) + 1
+        days_observed = n_days - start_idx
+
+        status = np.select(
+            [unmeasured, actual >= amounts, projected >= amounts, ~np.isnan(crossed),
+             days_observed < days_elapsed],
+            [UNMEASURED, EXCEEDED, FORECAST_OVERRUN, THRESHOLD, INCOMPLETE], default=OK
+        )
+
+        result = pd.DataFrame({
+            'BudgetId': [b['id'] for b in self.budgets],
+            'Scope': [self.scope(b) for b in self.budgets],
+            'Period': periods.to_numpy(),
+            'PeriodStart': starts,
+            'PeriodEnd': ends,
+            'Amount': amounts,
+            'Actual': actual.round(2),
+            'ActualPct': actual_pct.round(1),
+            'Projected': projected.round(2),
+            'ProjectedPct': projected_pct.round(1),
+            'Threshold': crossed,
+            'Status': status,
+            'DaysObserved': days_observed,
+            'DaysElapsed': days_elapsed,
+            'MissingColumns': [', '.join(columns) for columns in missing],
+        })
+        return result.sort_values('ProjectedPct', ascending=False, kind='mergesort').reset_index(drop=True)
+
+    @staticmethod
+    def scope(budget):
+        """Libellé du périmètre d'un budget (ex. AccountName=Production · Tag_team=web)"""
+        if not budget['conditions']:
+            return 'Global'
+        return ' · '.join(f"{c}={'|'.join(map(str, v))}" for c, v in budget['conditions'].items())
+
+
+def breaches(status):
+    """Budgets dépassés, en dépassement prévu ou au-delà d'un seuil (table de notification)"""
+    return status[~status['Status'].isin([OK, INCOMPLETE, UNMEASURED])].reset_index(drop=True)
+
+
+def incomplete(status):
+    """Budgets sans alerte dont la période n'est pas entièrement couverte par les données"""
+    return status[status['Status'] == INCOMPLETE].reset_index(drop=True)
+
+
+def unmeasured(status):
+    """Budgets dont une colonne de filtre manque aux données (dépense non mesurable)"""
+    return status[status['Status'] == UNMEASURED].reset_index(drop=True)
@@ -0,0 +1,147 @@
+"""
+Dimension calendrier : une ligne par date (libellés, semaine ISO, exercice fiscal, jours fériés)
+Les lignes de coûts y sont rattachées par un entier (jours depuis l'epoch) au lieu de
+formater chaque date ligne à ligne
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+
+
+# Colonnes de la dimension recopiées sur les lignes de coûts (ordre des sorties)
+CALENDAR_COLUMNS = [
+    'Year', 'Month', 'MonthName', 'Week', 'DayOfWeek', 'DayName', 'IsWeekend',
+    'YearMonth', 'DateKey', 'Quarter', 'FiscalYear', 'FiscalQuarter', 'IsHoliday',
+]
+
+
+def french_holidays(years):
+    """Jours fériés en France métropolitaine (date → libellé)"""
+    holidays = {}
+    for year in years:
+        easter_day = easter(year)
+        holidays.update({
+            date(year, 1, 1): "Jour de l'an",
+            easter_day + timedelta(days=1): 'Lundi de Pâques',
+            date(year, 5, 1): 'Fête du Travail',
+            date(year, 5, 8): 'Victoire 1945',
+            easter_day + timedelta(days=39): 'Ascension',
+            easter_day + timedelta(days=50): 'Lundi de Pentecôte',
+            date(year, 7, 14): 'Fête nationale',
+            date(year, 8, 15): 'Assomption',
+            date(year, 11, 1): 'Toussaint',
+            date(year, 11, 11): 'Armistice 1918',
+            date(year, 12, 25): 'Noël',
+        })
+    return holidays
+
+
+def us_holidays(years):
+    """Jours fériés fédéraux américains (date → libellé)"""
+    from pandas.tseries.holiday import USFederalHolidayCalendar
+
+    calendar = USFederalHolidayCalendar()
+    observed = calendar.holidays(
+        start=f'{min(years)}-01-01', end=f'{max(years)}-12-31', return_name=True
+    )
+    return {day.date(): name for day, name in observed.items()}
+
+
+# Calendriers de jours fériés disponibles (transform_config.CALENDAR['holidays'])
+HOLIDAY_CALENDARS = {
+    'FR': french_holidays,
+    'US': us_holidays,
+}
+
+
+def build_calendar(start, end, fiscal_year_start_month=1, holidays='FR', extra_holidays=None):
+    """
+    Construit la dimension calendrier entre deux dates (incluses)
+
+    L'exercice fiscal commence le premier jour de fiscal_year_start_month et
+    porte le numéro de l'année civile où il se termine (ex. juillet 2025 →
+    exercice 2026 si fiscal_year_start_month=7).
+
+    Args:
+        start, end: Bornes de la période
+        fiscal_year_start_month: Mois de début de l'exercice fiscal (1 = année civile)
+        holidays: Code du calendrier de jours fériés (HOLIDAY_CALENDARS) ou None
+        extra_holidays: Jours fériés supplémentaires {YYYY-MM-DD: libellé}
+
+    Returns:
+        DataFrame indexé par Date (une ligne par jour) : CALENDAR_COLUMNS + HolidayName
+    """
+    dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+    months = dates.month.to_numpy()
+
+    calendar = pd.DataFrame(index=pd.Index(dates, name='Date'))
+    calendar['Year'] = dates.year
+    calendar['Month'] = dates.month
+    calendar['MonthName'] = dates.strftime('%B')
+    calendar['Week'] = dates.isocalendar().week
+    calendar['DayOfWeek'] = dates.dayofweek
+    calendar['DayName'] = dates.strftime('%A')
+    calendar['IsWeekend'] = calendar['DayOfWeek'].isin([5, 6])
+    calendar['YearMonth'] = dates.strftime('%Y-%m')
+    calendar['DateKey'] = dates.year * 10000 + dates.month * 100 + dates.day
+    calendar['Quarter'] = dates.quarter
+
+    shift = fiscal_year_start_month - 1
+    calendar['FiscalYear'] = dates.year + ((months > shift) & (shift > 0)).astype(np.int32)
+    calendar['FiscalQuarter'] = (months - 1 - shift) % 12 // 3 + 1
+
+    holiday_names = {}
+    if holidays is not None and len(dates):
+        holiday_names.update(HOLIDAY_CALENDARS[holidays](range(dates[0].year, dates[-1].year + 1)))
+    for day, name in (extra_holidays or {}).items():
+        holiday_names[pd.Timestamp(day).date()] = name
+    names = pd.Series([holiday_names.get(d) for d in dates.date], index=dates, dtype=object)
+    calendar['IsHoliday'] = names.notna().to_numpy()
+    calendar['HolidayName'] = names.to_numpy()
+    return calendar
+
+
+def day_numbers(dates):
+    """Clé entière des dates (jours depuis 1970-01-01) ; NaT → valeur minimale int64"""
+    return pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+def add_calendar_columns(df, date_col='Date', calendar_config=None):
+    """
+    Ajoute les attributs calendrier à chaque ligne par simple indexation entière
+
+    La dimension est construite pour la plage de dates du bloc (quelques
+    centaines de lignes), puis chaque ligne y lit sa position
+    (jours depuis la première date) : aucun formatage de chaîne par ligne.
+
+    Args:
+        df: Lignes de coûts avec une colonne date
+        calendar_config: Paramètres de build_calendar (transform_config.CALENDAR)
+    """
+    dates = df[date_col]
+    valid = dates.notna().to_numpy()
+    keys = day_numbers(dates)
+
+    if valid.any():
+        first, last = keys[valid].min(), keys[valid].max()
+        calendar = build_calendar(
+            pd.Timestamp(first, unit='D'), pd.Timestamp(last, unit='D'), **(calendar_config or {})
+        )
+    else:
+        calendar = build_calendar(pd.Timestamp(0), pd.Timestamp(0), **(calendar_config or {}))
+        first = 0
+
+    calendar = calendar[CALENDAR_COLUMNS].reset_index(drop=True)
+    positions = np.where(valid, keys - first, 0)
+    if valid.all():
+        block = calendar.take(positions)
+    else:
+        # Dates manquantes : attributs manquants
+        block = calendar.reindex(np.where(valid, positions, -1))
+
+    for column in CALENDAR_COLUMNS:
+        df[column] = block[column].array
+    return df
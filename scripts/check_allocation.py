@@ -0,0 +1,89 @@
+"""
+Vérification de la répartition des coûts partagés
+Répartit un agrégat 'allocation' construit à la main et contrôle que les coûts
+sans propriétaire (Unallocated) ne prennent aucune part des pools au prorata
+dès qu'une équipe a une base, et qu'un pool sans base attribuée reste Unallocated
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cost_allocation import UNALLOCATED, AllocationRules
+from data_quality import tag_column
+
+
+RULES = {
+    'team_tag': 'team',
+    'rules': [{
+        'id': 'networking-by-usage',
+        'match': {'ServiceCategory': 'Networking'},
+        'method': 'usage',
+        'basis': {'ServiceCategory': 'Compute'},
+    }],
+}
+
+
+def allocation_table():
+    """
+    Agrégat de deux jours (centimes) :
+    - 2025-06-01 : calcul de l'équipe platform et calcul sans propriétaire, réseau partagé
+    - 2025-06-02 : calcul sans propriétaire seulement, réseau partagé
+    """
+    team = tag_column('team')
+    return pd.DataFrame([
+        {'Date': '2025-06-01', 'ServiceCategory': 'Compute', team: 'platform', 'CostCents': 1_000},
+        {'Date': '2025-06-01', 'ServiceCategory': 'Compute', team: None, 'CostCents': 9_000},
+        {'Date': '2025-06-01', 'ServiceCategory': 'Networking', team: None, 'CostCents': 500},
+        {'Date': '2025-06-02', 'ServiceCategory': 'Compute', team: None, 'CostCents': 4_000},
+        {'Date': '2025-06-02', 'ServiceCategory': 'Networking', team: None, 'CostCents': 300},
+    ])
+
+
+def check_allocation():
+    """
+    Contrôles de la répartition
+
+    Returns:
+        Liste des contrôles en échec
+    """
+    team_costs, _ = AllocationRules(RULES).allocate(allocation_table())
+    allocated = team_costs.set_index(['Date', 'Team'])['AllocatedCents']
+
+    expected = {
+        ('2025-06-01', 'platform'): 500,    # seule équipe de la base : tout le pool
+        ('2025-06-01', UNALLOCATED): 0,     # malgré 90 % du calcul du jour
+        ('2025-06-02', UNALLOCATED): 300,   # aucune base attribuée : pool orphelin
+    }
+    problems = []
+    for (date, team), cents in expected.items():
+        actual = int(allocated.get((date, team), 0))
+        status = "✅" if actual == cents else "❌"
+        print(f"   {status} {date} {team:12s} : {actual:>4} centimes répartis (attendu {cents})")
+        if actual != cents:
+            problems.append(f"{date} {team}")
+    return problems
+
+
+def main():
+    """Retourne un code de sortie non nul si un contrôle échoue"""
+    print("="*60)
+    print("🧮 RÉPARTITION DES COÛTS PARTAGÉS")
+    print("="*60 + "\n")
+
+    problems = check_allocation()
+
+    print()
+    if problems:
+        print(f"❌ {len(problems)} contrôle(s) en échec")
+        return 1
+
+    print("✅ Aucune part attribuée à Unallocated lorsqu'une équipe a une base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
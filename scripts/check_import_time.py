@@ -0,0 +1,150 @@
+"""
+Vérification du temps d'import des scripts, du DAG et du dashboard
+Lance `python -X importtime` sur chaque module, affiche un résumé et échoue
+si un SDK lourd (boto3, azure, plotly...) est chargé dès l'import
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(PROJECT_DIR, 'scripts')
+DAGS_DIR = os.path.join(PROJECT_DIR, 'airflow', 'dags')
+
+# Module à importer → (répertoire à ajouter au path, paquets interdits à l'import)
+IMPORT_CHECKS = {
+    'extract_multicloud_costs': (SCRIPTS_DIR, ['azure', 'boto3', 'botocore']),
+    'extract_azure_costs': (SCRIPTS_DIR, ['azure']),
+    'extract_costs': (SCRIPTS_DIR, ['boto3', 'botocore']),
+    'extract_cur': (SCRIPTS_DIR, ['boto3', 'botocore']),
+    'extract_azure_exports': (SCRIPTS_DIR, ['azure']),
+    's3_uploader': (SCRIPTS_DIR, ['boto3', 'botocore']),
+    'transform_costs': (SCRIPTS_DIR, ['boto3', 'botocore', 'azure']),
+    'cost_queries': (SCRIPTS_DIR, ['duckdb']),
+    'finops_pipeline_dag': (DAGS_DIR, ['boto3', 'botocore', 'azure', 'pandas']),
+    'dashboard': (PROJECT_DIR, ['plotly', 'duckdb', 'boto3', 'botocore', 'azure']),
+}
+
+# Prérequis d'un module (instruction d'import) : sans lui, le module est ignoré avec un
+# avertissement (le répertoire airflow/ du projet masque le paquet s'il n'est pas installé)
+REQUIREMENTS = {
+    'finops_pipeline_dag': 'from airflow import DAG',
+}
+
+# Framework importé de toute façon : les paquets qu'il charge lui-même ne sont pas reprochés
+# (les versions récentes de streamlit importent plotly pour leur thème de graphiques)
+FRAMEWORKS = {
+    'dashboard': 'streamlit',
+}
+
+# Budget de temps d'import cumulé (ms) au-delà duquel on signale une régression
+DEFAULT_BUDGET_MS = 3000
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def run_python(code, path, *options):
+    """Exécute du code dans un processus neuf (même path et répertoire que le module mesuré)"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [path, SCRIPTS_DIR, env.get('PYTHONPATH')]))
+    return subprocess.run(
+        [sys.executable, *options, '-c', code],
+        capture_output=True, text=True, cwd=PROJECT_DIR, env=env
+    )
+
+
+def measure_import(module, path):
+    """
+    Importe un module dans un processus neuf avec -X importtime
+
+    Returns:
+        (returncode, entries, stderr) où entries est une liste de
+        (paquet, temps_propre_us, temps_cumulé_us, profondeur)
+    """
+    result = run_python(f'import {module}', path, '-X', 'importtime')
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return result.returncode, entries, result.stderr
+
+
+def loaded_packages(entries):
+    """Paquets de premier niveau chargés pendant un import"""
+    return {name.split('.')[0] for name, _, _, _ in entries}
+
+
+def check_module(module, path, forbidden, budget_ms=DEFAULT_BUDGET_MS, top=5):
+    """Mesure un module et retourne la liste des problèmes détectés"""
+
+    if module in REQUIREMENTS and run_python(REQUIREMENTS[module], path).returncode != 0:
+        print(f"⏭️  {module:28s} : ignoré ({REQUIREMENTS[module]} impossible dans cet environnement)")
+        return []
+
+    returncode, entries, stderr = measure_import(module, path)
+    problems = []
+
+    if returncode != 0:
+        last_line = stderr.strip().splitlines()[-1] if stderr.strip() else 'erreur inconnue'
+        print(f"⚠️  {module:28s} : import impossible ({last_line})")
+        return [f"{module} : import impossible ({last_line})"]
+
+    # Les lignes sont émises après leurs dépendances : le module cible est la
+    # dernière entrée de profondeur 0, ses imports directs le précèdent (profondeur 1)
+    target = max(i for i, e in enumerate(entries) if e[0] == module and e[3] == 0)
+    total_ms = entries[target][2] / 1000
+    print(f"📦 {module:28s} : {total_ms:8.1f} ms")
+
+    direct = []
+    for entry in reversed(entries[:target]):
+        if entry[3] == 0:
+            break
+        if entry[3] == 1:
+            direct.append(entry)
+    for name, _, cumulative_us, _ in sorted(direct, key=lambda e: e[2], reverse=True)[:top]:
+        print(f"      • {name:24s} {cumulative_us / 1000:8.1f} ms")
+
+    loaded = loaded_packages(entries)
+    if module in FRAMEWORKS:
+        _, framework_entries, _ = measure_import(FRAMEWORKS[module], path)
+        loaded -= loaded_packages(framework_entries)
+    for package in forbidden:
+        if package in loaded:
+            problems.append(f"{module} : '{package}' chargé dès l'import")
+
+    if total_ms > budget_ms:
+        problems.append(f"{module} : {total_ms:.0f} ms > budget {budget_ms} ms")
+
+    return problems
+
+
+def main():
+    """Vérifie tous les modules et retourne un code de sortie non nul en cas de régression"""
+
+    print("="*60)
+    print("⏱️  TEMPS D'IMPORT (python -X importtime)")
+    print("="*60 + "\n")
+
+    problems = []
+    for module, (path, forbidden) in IMPORT_CHECKS.items():
+        problems += check_module(module, path, forbidden)
+
+    print()
+    if problems:
+        print("❌ Problèmes détectés :")
+        for problem in problems:
+            print(f"   • {problem}")
+        return 1
+
+    print("✅ Aucun SDK lourd chargé à l'import")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
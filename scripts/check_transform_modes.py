@@ -0,0 +1,117 @@
+"""
+Vérification de l'équivalence des modes de transformation
+Transforme la même partition synthétique en mode séquentiel, par blocs et parallèle
+(pipeline complet de transform_costs.main) et compare toutes les sorties au mode
+séquentiel : fichiers identiques octet pour octet, instantané Arrow compris ; le jeu
+Parquet est comparé octet pour octet s'il a le même découpage en fichiers (mode
+parallèle), sinon ligne à ligne (mode par blocs : un fichier par bloc)
+"""
+
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_transform import generate_dataset
+from partitions import PROCESSED_DIR, RAW_DIR, partition_dir
+
+
+# Fichiers propres à chaque exécution (empreinte, horodatages) : non comparés
+IGNORED_FILES = {'_manifest.json'}
+
+
+def run_mode(ds, **options):
+    """Transformation complète de la partition ds ; retourne une copie de ses sorties"""
+    from transform_costs import main as transform
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        transform(ds=ds, force=True, **options)
+    label = '-'.join(f'{k}{v}' for k, v in options.items()) or 'serial'
+    copy = os.path.join('outputs', label)
+    shutil.copytree(partition_dir(PROCESSED_DIR, ds), copy)
+    return copy
+
+
+def same_parquet(dir_a, dir_b):
+    """Vrai si deux jeux Parquet contiennent les mêmes lignes, dans le même ordre"""
+    import pyarrow.dataset as ds
+
+    table_a = ds.dataset(dir_a, format='parquet').to_table().replace_schema_metadata(None)
+    table_b = ds.dataset(dir_b, format='parquet').to_table().replace_schema_metadata(None)
+    return table_a.equals(table_b)
+
+
+def compare_outputs(reference, candidate):
+    """
+    Différences entre deux répertoires de sorties
+
+    Returns:
+        Liste des fichiers différents ou absents d'un côté
+    """
+    problems = []
+    names = sorted((set(os.listdir(reference)) | set(os.listdir(candidate))) - IGNORED_FILES)
+    for name in names:
+        path_a, path_b = os.path.join(reference, name), os.path.join(candidate, name)
+        if not os.path.exists(path_a) or not os.path.exists(path_b):
+            problems.append(f"{name} : absent d'un côté")
+        elif os.path.isdir(path_a):
+            parts = sorted(os.listdir(path_a))
+            if parts == sorted(os.listdir(path_b)):
+                _, mismatch, errors = filecmp.cmpfiles(path_a, path_b, parts, shallow=False)
+                problems += [f"{name}/{part}" for part in mismatch + errors]
+            elif not same_parquet(path_a, path_b):
+                problems.append(f"{name} : lignes différentes")
+        elif not filecmp.cmp(path_a, path_b, shallow=False):
+            problems.append(name)
+    return problems
+
+
+def main():
+    """Compare les modes et retourne un code de sortie non nul si une sortie diffère"""
+    parser = argparse.ArgumentParser(description="Équivalence des modes de transformation")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ds', default='2025-06-30', help="Partition synthétique (fenêtre des données)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("🔁 ÉQUIVALENCE DES MODES DE TRANSFORMATION")
+    print("="*60 + "\n")
+
+    problems = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        raw_file = os.path.join(partition_dir(RAW_DIR, args.ds), 'multicloud_costs.csv')
+        os.makedirs(os.path.dirname(raw_file))
+        generate_dataset(raw_file, args.rows)
+        print(f"📊 {args.rows:,} lignes synthétiques (partition {args.ds})")
+
+        reference = run_mode(args.ds)
+        modes = [(f"blocs {args.chunksize:,}", {'chunksize': args.chunksize}),
+                 (f"parallèle ×{args.workers}", {'workers': args.workers})]
+        for label, options in modes:
+            differences = compare_outputs(reference, run_mode(args.ds, **options))
+            status = "identiques" if not differences else f"{len(differences)} différence(s)"
+            print(f"   {label:18s} : sorties {status}")
+            for difference in differences:
+                print(f"      • {difference}")
+            problems += [f"{label} : {d}" for d in differences]
+
+    print()
+    if problems:
+        print("❌ Sorties différentes du mode séquentiel")
+        return 1
+
+    print("✅ Sorties identiques dans tous les modes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
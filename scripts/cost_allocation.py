@@ -0,0 +1,323 @@
+"""
+Répartition des coûts partagés entre équipes par règles
+Les règles (data/config/allocation_rules.json) sont compilées une fois : la sélection
+des lignes partagées est une jointure par jeu de colonnes filtrées, la répartition un
+produit creux pools × équipes calculé avec numpy. Le moteur travaille sur l'agrégat
+'allocation' de la transformation (jour × service × région × compte × tags, en centimes) :
+son coût dépend du nombre de groupes distincts, pas du nombre de lignes brutes
+"""
+
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_quality import TAG_PREFIX, tag_column
+
+
+# Fichier de règles par défaut
+ALLOCATION_RULES_FILE = os.path.join('data', 'config', 'allocation_rules.json')
+
+# Méthodes de répartition d'un pool de coûts partagés :
+#   fixed : pourcentages fixes par équipe
+#   usage : au prorata du coût direct de chaque équipe le même jour (filtré par `basis`) ;
+#           les coûts directs sans propriétaire (Unallocated) n'entrent pas dans la base
+#   tag   : comme usage, parmi les lignes portant la même valeur du tag `tag`
+METHODS = ('fixed', 'usage', 'tag')
+
+# Équipe des coûts sans propriétaire ni base de répartition
+UNALLOCATED = 'Unallocated'
+
+# Dimensions de l'agrégat 'allocation' sur lesquelles portent les règles (+ colonnes Tag_*)
+MATCH_COLUMNS = ['Cloud', 'ServiceCategory', 'Service', 'Region', 'AccountName', 'AccountId']
+ALLOCATION_KEYS = ['Date'] + MATCH_COLUMNS
+
+
+def _values(value):
+    """Valeur ou liste de valeurs d'un filtre, en liste"""
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _filter_key(conditions):
+    """Clé canonique d'un filtre {colonne: valeur(s)} (filtres identiques partagés)"""
+    return json.dumps({k: sorted(map(str, _values(v))) for k, v in (conditions or {}).items()},
+                      sort_keys=True)
+
+
+def match_filters(table, filters):
+    """
+    Premier filtre satisfait par chaque ligne
+
+    Les filtres portant sur le même jeu de colonnes sont développés en une table
+    (valeurs..., position) et joints en une fois aux lignes : le coût est celui
+    de quelques jointures, pas d'un masque par filtre.
+
+    Args:
+        table: DataFrame à filtrer
+        filters: Liste de {colonne: valeur ou liste de valeurs} (ET entre colonnes)
+
+    Returns:
+        Tableau d'entiers : position du premier filtre satisfait, -1 sinon
+    """
+    first = np.full(len(table), np.iinfo(np.int64).max, dtype=np.int64)
+    by_columns = {}
+    for position, conditions in enumerate(filters):
+        by_columns.setdefault(tuple(sorted(conditions)), []).append(position)
+
+    for columns, positions in by_columns.items():
+        if any(c not in table.columns for c in columns):
+            continue
+        if not columns:
+            first[:] = np.minimum(first, min(positions))
+            continue
+        expanded = pd.DataFrame(
+            [combo + (position,)
+             for position in positions
+             for combo in itertools.product(*(_values(filters[position][c]) for c in columns))],
+            columns=list(columns) + ['_position']
+        )
+        left = table[list(columns)].astype(object).assign(_row=np.arange(len(table)))
+        matched = left.merge(expanded.astype({c: object for c in columns}), on=list(columns), how='inner')
+        np.minimum.at(first, matched['_row'].to_numpy(), matched['_position'].to_numpy())
+
+    first[first == np.iinfo(np.int64).max] = -1
+    return first
+
+
+class AllocationRules:
+    """Règles de répartition validées et compilées"""
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: Dictionnaire des règles :
+                team_tag: Clé du tag désignant l'équipe propriétaire (défaut : team)
+                account_teams: {compte: équipe} pour les lignes sans tag d'équipe
+                rules: Liste ordonnée (première règle satisfaite) de
+                    {id, match: {colonne: valeur(s)}, method, shares | basis, targets, tag}
+        """
+        config = config or {}
+        self.config = config
+        self.team_column = tag_column(config.get('team_tag', 'team'))
+        self.account_teams = dict(config.get('account_teams', {}))
+        self.rules = [self._validate(rule, i) for i, rule in enumerate(config.get('rules', []))]
+
+    @classmethod
+    def load(cls, path=ALLOCATION_RULES_FILE):
+        """Charge un fichier de règles (aucune règle si le fichier n'existe pas)"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _validate(rule, index):
+        """Vérifie une règle et complète ses valeurs par défaut"""
+        rule = dict(rule)
+        rule.setdefault('id', f'rule-{index + 1}')
+        if not rule.get('match'):
+            raise ValueError(f"Règle {rule['id']} : filtre 'match' manquant")
+        method = rule.get('method')
+        if method not in METHODS:
+            raise ValueError(f"Règle {rule['id']} : méthode inconnue {method!r} ({', '.join(METHODS)})")
+        if method == 'fixed':
+            shares = rule.get('shares') or {}
+            if not shares or abs(sum(shares.values()) - 100) > 0.01:
+                raise ValueError(f"Règle {rule['id']} : les parts fixes doivent totaliser 100")
+        if method == 'tag' and not rule.get('tag'):
+            raise ValueError(f"Règle {rule['id']} : clé de tag manquante")
+        return rule
+
+    def __len__(self):
+        return len(self.rules)
+
+    def digest(self):
+        """Empreinte des règles (entre dans l'empreinte de la transformation)"""
+        payload = json.dumps(self.config, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def teams(self, table):
+        """Équipe propriétaire de chaque ligne : tag d'équipe, sinon compte, sinon Unallocated"""
+        team = pd.Series(np.nan, index=table.index, dtype=object)
+        if self.team_column in table.columns:
+            team = table[self.team_column].astype(object)
+            team = team.where(team.notna() & (team != ''))
+        if self.account_teams and 'AccountName' in table.columns:
+            team = team.fillna(table['AccountName'].map(self.account_teams))
+        return team.fillna(UNALLOCATED).to_numpy(dtype=object)
+
+    @staticmethod
+    def _weights(direct, teams, conditions, tag):
+        """
+        Coût direct par jour × valeur de tag × équipe des lignes satisfaisant un filtre
+
+        Seules les lignes attribuées à une équipe forment la base : Unallocated
+        n'est pas une équipe et ne reçoit pas de part des pools au prorata.
+
+        Returns:
+            DataFrame (Date, TagValue, Team, Weight)
+        """
+        direct = direct[teams[direct.index.to_numpy()] != UNALLOCATED]
+        rows = direct[match_filters(direct, [conditions]) == 0] if conditions else direct
+        values = rows[tag].astype(object).fillna('').to_numpy() if tag in rows.columns else ''
+        return pd.DataFrame({
+            'Date': rows['Date'].to_numpy(), 'TagValue': values,
+            'Team': teams[rows.index.to_numpy()], 'Weight': rows['CostCents'].to_numpy(),
+        }).groupby(['Date', 'TagValue', 'Team'], sort=False, as_index=False)['Weight'].sum()
+
+    def allocate(self, table):
+        """
+        Répartit les coûts partagés de l'agrégat 'allocation'
+
+        1. chaque ligne reçoit la première règle qu'elle satisfait (jointure compilée) ;
+           les autres sont des coûts directs de leur équipe propriétaire ;
+        2. les lignes partagées forment des pools (règle × jour × valeur de tag) ;
+        3. chaque pool est réparti selon une matrice creuse pools × équipes (parts fixes
+           ou coût direct des équipes), en centimes exacts (plus forts restes) : la somme
+           répartie d'un pool est exactement son montant. Un pool sans base de
+           répartition attribuée à une équipe revient à Unallocated.
+
+        Args:
+            table: Agrégat (Date, colonnes de MATCH_COLUMNS, Tag_*, CostCents)
+
+        Returns:
+            (coûts par jour × équipe : Date, Team, DirectCents, AllocatedCents ;
+             répartition par règle × équipe : RuleId, Method, Team, AllocatedCents)
+        """
+        table = table.reset_index(drop=True)
+        teams = self.teams(table)
+        rule_of_row = match_filters(table, [rule['match'] for rule in self.rules])
+        direct = table[rule_of_row < 0]
+
+        direct_costs = pd.DataFrame({
+            'Date': direct['Date'].to_numpy(), 'Team': teams[rule_of_row < 0],
+            'DirectCents': direct['CostCents'].to_numpy(),
+        }).groupby(['Date', 'Team'], as_index=False)['DirectCents'].sum()
+
+        shared = table[rule_of_row >= 0]
+        empty_by_rule = pd.DataFrame(columns=['RuleId', 'Method', 'Team', 'AllocatedCents'])
+        if len(shared) == 0:
+            direct_costs['AllocatedCents'] = np.int64(0)
+            return direct_costs, empty_by_rule
+
+        # Pools : coûts partagés par règle × jour × valeur du tag de répartition
+        rules = pd.DataFrame({
+            'Rule': np.arange(len(self.rules)),
+            'Tag': [tag_column(r['tag']) if r['method'] == 'tag' else '' for r in self.rules],
+        })
+        rule_ids = rule_of_row[rule_of_row >= 0]
+        tag_values = np.full(len(shared), '', dtype=object)
+        for tag in rules['Tag'].unique():
+            if tag and tag in shared.columns:
+                selected = rules['Tag'].to_numpy()[rule_ids] == tag
+                tag_values[selected] = shared[tag].astype(object).fillna('').to_numpy()[selected]
+        pools = pd.DataFrame({
+            'Rule': rule_ids, 'Date': shared['Date'].to_numpy(), 'TagValue': tag_values,
+            'Cents': shared['CostCents'].to_numpy(),
+        }).groupby(['Rule', 'Date', 'TagValue'], as_index=False)['Cents'].sum()
+        pools['Pool'] = np.arange(len(pools))
+
+        # Entrées de la matrice creuse (pool, équipe, poids)
+        entries = [self._fixed_entries(pools), self._prorata_entries(pools, direct, teams)]
+        entries = pd.concat([e for e in entries if len(e)], ignore_index=True) if any(len(e) for e in entries) \
+            else pd.DataFrame({'Pool': pd.Series(dtype=np.int64), 'Team': pd.Series(dtype=object),
+                               'Weight': pd.Series(dtype=np.float64)})
+        entries = entries[entries['Weight'] > 0]
+
+        # Pools sans base de répartition : Unallocated
+        weight_sum = np.bincount(entries['Pool'].to_numpy(dtype=np.int64),
+                                 weights=entries['Weight'].to_numpy(dtype=np.float64),
+                                 minlength=len(pools))
+        orphan = np.flatnonzero(weight_sum <= 0)
+        if len(orphan):
+            entries = pd.concat([entries, pd.DataFrame({
+                'Pool': orphan, 'Team': UNALLOCATED, 'Weight': 1.0
+            })], ignore_index=True)
+            weight_sum[orphan] = 1.0
+
+        allocated = self._split_cents(entries, pools['Cents'].to_numpy(dtype=np.int64), weight_sum)
+        allocated = allocated.merge(pools[['Pool', 'Rule', 'Date']], on='Pool')
+
+        team_costs = direct_costs.merge(
+            allocated.groupby(['Date', 'Team'], as_index=False)['AllocatedCents'].sum(),
+            on=['Date', 'Team'], how='outer'
+        ).fillna({'DirectCents': 0, 'AllocatedCents': 0})
+        team_costs = team_costs.astype({'DirectCents': np.int64, 'AllocatedCents': np.int64}) \
+            .sort_values(['Date', 'Team'], ignore_index=True)
+
+        by_rule = allocated.groupby(['Rule', 'Team'], as_index=False)['AllocatedCents'].sum()
+        by_rule.insert(0, 'RuleId', [self.rules[i]['id'] for i in by_rule['Rule']])
+        by_rule.insert(1, 'Method', [self.rules[i]['method'] for i in by_rule['Rule']])
+        by_rule = by_rule.drop(columns='Rule').sort_values(['RuleId', 'Team'], ignore_index=True)
+        return team_costs, by_rule
+
+    def _fixed_entries(self, pools):
+        """Entrées des règles à parts fixes : (pool, équipe, pourcentage)"""
+        shares = pd.DataFrame(
+            [(i, team, float(share)) for i, rule in enumerate(self.rules) if rule['method'] == 'fixed'
+             for team, share in rule['shares'].items()],
+            columns=['Rule', 'Team', 'Weight']
+        )
+        if len(shares) == 0:
+            return shares
+        return pools[['Pool', 'Rule']].merge(shares, on='Rule')[['Pool', 'Team', 'Weight']]
+
+    def _prorata_entries(self, pools, direct, teams):
+        """Entrées des règles au prorata (usage, tag) : (pool, équipe, coût direct)"""
+        prorata = [(i, rule) for i, rule in enumerate(self.rules) if rule['method'] != 'fixed']
+        if not prorata:
+            return pd.DataFrame(columns=['Pool', 'Team', 'Weight'])
+
+        # Une base de poids par couple (filtre basis, tag) distinct, partagée entre règles
+        bases, basis_of_rule = {}, {}
+        for i, rule in prorata:
+            key = (_filter_key(rule.get('basis')), tag_column(rule['tag']) if rule['method'] == 'tag' else '')
+            basis_of_rule[i] = bases.setdefault(key, (len(bases), rule.get('basis') or {}, key[1]))[0]
+
+        weights = pd.concat([
+            self._weights(direct, teams, conditions, tag).assign(Basis=basis_id)
+            for basis_id, conditions, tag in bases.values()
+        ], ignore_index=True)
+
+        rules = pd.DataFrame({'Rule': list(basis_of_rule), 'Basis': list(basis_of_rule.values())})
+        entries = pools.merge(rules, on='Rule').merge(weights, on=['Basis', 'Date', 'TagValue'])
+
+        # Équipes cibles : les autres équipes sont exclues de la base
+        targets = pd.DataFrame(
+            [(i, team) for i, rule in prorata for team in rule.get('targets') or []],
+            columns=['Rule', 'Team']
+        )
+        if len(targets):
+            restricted = entries['Rule'].isin(targets['Rule'])
+            allowed = entries[restricted].merge(targets, on=['Rule', 'Team'])
+            entries = pd.concat([entries[~restricted], allowed], ignore_index=True)
+        return entries[['Pool', 'Team', 'Weight']].astype({'Weight': np.float64})
+
+    @staticmethod
+    def _split_cents(entries, pool_cents, weight_sum):
+        """
+        Montant de chaque entrée en centimes entiers (méthode des plus forts restes)
+
+        Returns:
+            DataFrame (Pool, Team, AllocatedCents)
+        """
+        pool = entries['Pool'].to_numpy(dtype=np.int64)
+        exact = pool_cents[pool] * (entries['Weight'].to_numpy(dtype=np.float64) / weight_sum[pool])
+        cents = np.floor(exact).astype(np.int64)
+        remainder = pool_cents - np.bincount(pool, weights=cents, minlength=len(pool_cents)).astype(np.int64)
+
+        # Centimes restants aux plus grandes parties fractionnaires de chaque pool
+        order = np.lexsort((-(exact - cents), pool))
+        sorted_pool = pool[order]
+        starts = np.searchsorted(sorted_pool, sorted_pool, side='left')
+        rank = np.arange(len(order)) - starts
+        cents[order[rank < remainder[sorted_pool]]] += 1
+        return pd.DataFrame({'Pool': pool, 'Team': entries['Team'].to_numpy(), 'AllocatedCents': cents})
+
+
+def allocation_columns(columns):
+    """Colonnes de l'agrégat 'allocation' présentes dans un bloc enrichi"""
+    return [c for c in ALLOCATION_KEYS if c in columns] + [c for c in columns if c.startswith(TAG_PREFIX)]
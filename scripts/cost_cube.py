@@ -0,0 +1,353 @@
+"""
+Cube de coûts pré-agrégés (rollups) et choix du rollup le plus compact pour une requête
+Trois hiérarchies : temps (jour → semaine → mois), service (service → catégorie) et
+compte (compte → cloud). Le transformateur matérialise une petite table par niveau
+configuré ; une requête (dimensions, filtres) est servie par la plus petite table
+capable d'y répondre, avec les mêmes résultats que le moteur de requêtes détaillé
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from arrow_snapshot import read_frame_snapshot, snapshot_available
+from cost_queries import finish_aggregate
+
+
+# Clés de l'agrégat partiel de base (grain jour × service × compte), voir transform_costs
+ROLLUP_KEYS = ['Date', 'Cloud', 'AccountName', 'ServiceCategory', 'Service']
+
+# Colonnes de temps de chaque grain : jour, semaine (lundi), mois (YYYY-MM)
+TIME_COLUMNS = {'day': 'Date', 'week': 'WeekStart', 'month': 'YearMonth'}
+
+# Colonnes de temps dérivables d'un grain plus fin
+DERIVED_COLUMNS = {
+    'day': ['WeekStart', 'YearMonth', 'DayName'],
+    'week': [],
+    'month': [],
+}
+
+# Colonnes gardées selon le niveau de chaque hiérarchie (les niveaux supérieurs suivent)
+SERVICE_LEVELS = {'Service': ['ServiceCategory', 'Service'], 'ServiceCategory': ['ServiceCategory'], None: []}
+ACCOUNT_LEVELS = {'AccountName': ['Cloud', 'AccountName'], 'Cloud': ['Cloud'], None: []}
+
+# Noms courts des niveaux (noms des tables)
+LEVEL_NAMES = {'Service': 'service', 'ServiceCategory': 'category', 'AccountName': 'account', 'Cloud': 'cloud'}
+
+# Index des rollups d'une exécution
+ROLLUP_INDEX = 'rollups'
+
+
+def rollup_name(time, service, account):
+    """Nom d'un rollup, ex. ('month', 'ServiceCategory', 'AccountName') → month_category_account"""
+    return '_'.join([time] + [LEVEL_NAMES[level] for level in (service, account) if level])
+
+
+def time_columns(dates):
+    """Semaine (lundi), mois (YYYY-MM) et nom du jour d'une série de dates (calculés par jour distinct)"""
+    codes, days = pd.factorize(dates)
+    days = pd.DatetimeIndex(days)
+    columns = {
+        'WeekStart': days - pd.to_timedelta(days.dayofweek, unit='D'),
+        'YearMonth': days.strftime('%Y-%m'),
+        'DayName': days.day_name(),
+    }
+    return {
+        name: pd.Series(np.asarray(values)[codes], index=dates.index)
+        for name, values in columns.items()
+    }
+
+
+def build_rollups(base, levels):
+    """
+    Matérialise les rollups à partir de l'agrégat de base
+
+    Chaque rollup est calculé depuis la plus petite table déjà construite qui le
+    couvre (un rollup mensuel par catégorie part du mensuel par service), pas
+    depuis la base.
+
+    Args:
+        base: DataFrame (ROLLUP_KEYS présentes, CostCents, Count) au grain jour
+        levels: Liste de (grain, niveau service, niveau compte), voir transform_config.ROLLUPS
+
+    Returns:
+        {nom: (niveaux, DataFrame (colonnes du rollup, CostCents, Count))}
+    """
+    base = base.assign(Date=pd.to_datetime(base['Date']))
+    sources = [('day', base)]
+    rollups = {}
+    for time, service, account in levels:
+        columns = [TIME_COLUMNS[time]] + SERVICE_LEVELS[service] + ACCOUNT_LEVELS[account]
+        columns = [c for c in columns if c in base.columns or c in DERIVED_COLUMNS['day']]
+        source_time, source = min(
+            ((t, table) for t, table in sources
+             if all(c in table.columns or c in DERIVED_COLUMNS[t] for c in columns)),
+            key=lambda candidate: len(candidate[1])
+        )
+        missing = [c for c in columns if c not in source.columns]
+        if missing:
+            derived = time_columns(source['Date'])
+            source = source.assign(**{c: derived[c] for c in missing})
+        table = source.groupby(columns, dropna=False, sort=True).agg(
+            {'CostCents': 'sum', 'Count': 'sum'}
+        ).reset_index()
+        rollups[rollup_name(time, service, account)] = ((time, service, account), table)
+        sources.append((time, table))
+    return rollups
+
+
+class CostCube:
+    """Rollups d'une exécution, chargés à la demande, et requêtes servies par le plus compact"""
+
+    def __init__(self, specs, date_min, date_max, tables=None, directory=None):
+        """
+        Args:
+            specs: {nom: {'time', 'service', 'account', 'columns', 'rows', 'file', 'snapshot'}}
+            date_min, date_max: Premier et dernier jour des données
+            tables: {nom: DataFrame} déjà en mémoire (sinon lus depuis directory)
+            directory: Répertoire des fichiers de rollups
+        """
+        self.specs = specs
+        self.date_min = pd.Timestamp(date_min) if date_min is not None else None
+        self.date_max = pd.Timestamp(date_max) if date_max is not None else None
+        self.tables = dict(tables or {})
+        self.directory = directory
+        self.columns = sorted({
+            c for spec in specs.values()
+            for c in spec['columns'] + DERIVED_COLUMNS[spec['time']]
+        })
+
+    @classmethod
+    def from_rollups(cls, rollups, files=None):
+        """
+        Cube en mémoire (transformateur)
+
+        Args:
+            rollups: Résultat de build_rollups
+            files: {nom: nom de fichier} si les rollups sont écrits (index)
+        """
+        specs, tables = {}, {}
+        dates = []
+        for name, ((time, service, account), table) in rollups.items():
+            specs[name] = {
+                'time': time, 'service': service, 'account': account,
+                'columns': [c for c in table.columns if c not in ('CostCents', 'Count')],
+                'rows': len(table),
+                'file': (files or {}).get(name),
+                'snapshot': None,
+            }
+            tables[name] = table
+            if time == 'day' and len(table):
+                dates += [table['Date'].min(), table['Date'].max()]
+        date_min = min(dates) if dates else None
+        date_max = max(dates) if dates else None
+        return cls(specs, date_min, date_max, tables)
+
+    def index(self):
+        """Index sérialisable (JSON) des rollups écrits"""
+        return {
+            'date_min': self.date_min.strftime('%Y-%m-%d') if self.date_min is not None else None,
+            'date_max': self.date_max.strftime('%Y-%m-%d') if self.date_max is not None else None,
+            'rollups': self.specs,
+        }
+
+    @classmethod
+    def open(cls, index_file):
+        """Cube relu depuis son index (les tables ne sont lues qu'à la première requête)"""
+        import json
+
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+        return cls(index['rollups'], index['date_min'], index['date_max'],
+                   directory=os.path.dirname(index_file))
+
+    def _table(self, name):
+        """Table d'un rollup (lue une fois, depuis son instantané Arrow s'il existe)"""
+        if name not in self.tables:
+            spec = self.specs[name]
+            snapshot = os.path.join(self.directory, spec['snapshot']) if spec.get('snapshot') else None
+            if snapshot is not None and os.path.exists(snapshot) and snapshot_available():
+                # Projection en mémoire : ni analyse du CSV ni conversion des dates
+                table = read_frame_snapshot(snapshot)
+            else:
+                time_column = TIME_COLUMNS[spec['time']]
+                dtypes = {c: str for c in spec['columns'] if c != time_column}
+                if time_column == 'YearMonth':
+                    dtypes[time_column] = str
+                table = pd.read_csv(os.path.join(self.directory, spec['file']), dtype=dtypes)
+                if time_column != 'YearMonth':
+                    table[time_column] = pd.to_datetime(table[time_column])
+            self.tables[name] = table
+        return self.tables[name]
+
+    def load(self):
+        """Lit toutes les tables (avant publication : aucune lecture pendant les requêtes)"""
+        for name in self.specs:
+            self._table(name)
+        return self
+
+    def _aligned(self, time, low, high):
+        """Vrai si une plage de dates couvre des périodes entières du grain (au vu des données)"""
+        if time == 'day':
+            return True
+        low, high = pd.Timestamp(low), pd.Timestamp(high)
+        if time == 'week':
+            start = low - pd.Timedelta(days=low.dayofweek)
+            end = high + pd.Timedelta(days=6 - high.dayofweek)
+        else:
+            start = low.replace(day=1)
+            end = high + pd.offsets.MonthEnd(0)
+        low_ok = low == start or (self.date_min is not None and low <= self.date_min)
+        high_ok = high == end or (self.date_max is not None and high >= self.date_max)
+        return low_ok and high_ok
+
+    def _answers(self, spec, by, filters):
+        """Vrai si le rollup contient (ou dérive) toutes les colonnes demandées"""
+        available = set(spec['columns']) | set(DERIVED_COLUMNS[spec['time']])
+        for column, value in filters.items():
+            if column == 'Date' and isinstance(value, tuple):
+                if not self._aligned(spec['time'], *value):
+                    return False
+            elif column not in available:
+                return False
+        return all(column in available for column in by)
+
+    def choose(self, by, filters=None):
+        """
+        Rollup le plus compact capable de répondre, ou None
+
+        Args:
+            by: Colonnes de regroupement
+            filters: {colonne: valeur ou (min, max)} comme cost_queries
+        """
+        filters = {c: v for c, v in (filters or {}).items() if v is not None}
+        candidates = [name for name, spec in self.specs.items() if self._answers(spec, by, filters)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda name: (self.specs[name]['rows'], name))
+
+    def _select(self, name, by, filters):
+        """Lignes du rollup retenues par les filtres, colonnes dérivées ajoutées"""
+        spec = self.specs[name]
+        table = self._table(name)
+        needed = set(by) | set(filters)
+        if spec['time'] == 'day':
+            derived = [c for c in DERIVED_COLUMNS['day'] if c in needed]
+            if derived:
+                columns = time_columns(table['Date'])
+                table = table.assign(**{c: columns[c] for c in derived})
+
+        mask = np.ones(len(table), dtype=bool)
+        for column, value in filters.items():
+            if column == 'Date' and isinstance(value, tuple) and spec['time'] != 'day':
+                low, high = pd.Timestamp(value[0]), pd.Timestamp(value[1])
+                if spec['time'] == 'week':
+                    period = table['WeekStart']
+                    low = low - pd.Timedelta(days=low.dayofweek)
+                else:
+                    period = table['YearMonth']
+                    low, high = low.strftime('%Y-%m'), high.strftime('%Y-%m')
+                mask &= ((period >= low) & (period <= high)).to_numpy()
+            elif isinstance(value, tuple):
+                low, high = value
+                mask &= ((table[column] >= low) & (table[column] <= high)).to_numpy()
+            else:
+                mask &= (table[column] == value).to_numpy()
+        return table[mask]
+
+    def aggregate(self, by, filters=None):
+        """
+        Coûts regroupés par `by` depuis le rollup le plus compact
+
+        Returns:
+            DataFrame (by, Cost, Mean, Count) comme cost_queries, ou None si aucun
+            rollup ne peut répondre
+        """
+        filters = {c: v for c, v in (filters or {}).items() if v is not None}
+        name = self.choose(by, filters)
+        if name is None:
+            return None
+        table = self._select(name, by, filters)
+        result = table.groupby(by, dropna=False, sort=True).agg(
+            {'CostCents': 'sum', 'Count': 'sum'}
+        ).reset_index()
+        return finish_aggregate(result, by)
+
+    def totals(self, filters=None):
+        """(centimes, lignes) des données filtrées, ou None si aucun rollup ne peut répondre"""
+        filters = {c: v for c, v in (filters or {}).items() if v is not None}
+        name = self.choose([], filters)
+        if name is None:
+            return None
+        table = self._select(name, [], filters)
+        return int(table['CostCents'].sum()), int(table['Count'].sum())
+
+    def distinct(self, column):
+        """Valeurs distinctes d'une colonne (rollup le plus compact qui la contient), ou None"""
+        name = self.choose([column])
+        if name is None:
+            return None
+        table = self._select(name, [column], {})
+        return sorted(table[column].dropna().unique().tolist())
+
+
+class CubeCostQueries:
+    """
+    Moteur de requêtes servi par le cube, avec repli sur le moteur détaillé
+
+    Même interface que cost_queries : les requêtes que les rollups ne couvrent pas
+    (autres dimensions, lignes détaillées) ouvrent le moteur détaillé à la demande.
+    """
+
+    def __init__(self, cube, open_detail):
+        """
+        Args:
+            cube: CostCube
+            open_detail: Fonction sans argument ouvrant le moteur détaillé
+        """
+        self.cube = cube
+        self._open_detail = open_detail
+        self._detail = None
+        self.columns = cube.columns
+
+    @property
+    def detail(self):
+        """Moteur détaillé (ouvert à la première requête non couverte)"""
+        if self._detail is None:
+            self._detail = self._open_detail()
+        return self._detail
+
+    @property
+    def name(self):
+        return f"cube + {self.detail.name}" if self._detail is not None else 'cube'
+
+    def date_range(self):
+        """Première et dernière date des données"""
+        if self.cube.date_min is None:
+            return self.detail.date_range()
+        return self.cube.date_min, self.cube.date_max
+
+    def distinct(self, column):
+        """Valeurs distinctes (triées, sans valeur manquante) d'une colonne"""
+        values = self.cube.distinct(column)
+        return values if values is not None else self.detail.distinct(column)
+
+    def row_count(self, filters=None):
+        """Nombre de lignes retenues par les filtres"""
+        totals = self.cube.totals(filters)
+        return totals[1] if totals is not None else self.detail.row_count(filters)
+
+    def total_cost(self, filters=None):
+        """Coût total (USD) des lignes filtrées"""
+        totals = self.cube.totals(filters)
+        return totals[0] / 100 if totals is not None else self.detail.total_cost(filters)
+
+    def aggregate(self, by, filters=None):
+        """Coûts regroupés par les colonnes `by` (voir cost_queries)"""
+        result = self.cube.aggregate(by, filters)
+        return result if result is not None else self.detail.aggregate(by, filters)
+
+    def rows(self, filters=None):
+        """Lignes détaillées retenues par les filtres (export)"""
+        return self.detail.rows(filters)
@@ -0,0 +1,450 @@
+"""
+Couche de requêtes du dashboard sur les données enrichies
+Moteurs interchangeables : instantané Arrow projeté en mémoire (publié par la
+transformation, ouverture sans analyse), DuckDB (SQL exécuté directement sur le jeu de
+données Parquet, sans le charger en mémoire), Arrow (table immuable en mémoire, partagée
+par toutes les sessions du processus) et pandas (repli sur un DataFrame en mémoire).
+Les moteurs ne font que filtrer, regrouper et sommer des centimes entiers : les coûts
+et moyennes sont dérivés ensuite par le même code, d'où des résultats identiques.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from arrow_snapshot import read_snapshot, snapshot_available
+from data_quality import TAG_PREFIX
+
+
+# Moteurs disponibles, par ordre de préférence
+BACKENDS = ('snapshot', 'duckdb', 'arrow', 'pandas')
+
+# Colonnes toujours lues comme texte (identifiants)
+TEXT_COLUMNS = ('AccountName', 'AccountId', 'ResourceId')
+
+# Coût d'une ligne en centimes entiers côté SQL (coût manquant → 0), comme côté pandas
+CENTS_SQL = 'COALESCE(CAST(round("Cost" * 100) AS BIGINT), 0)'
+
+
+def duckdb_available():
+    """Vrai si le moteur SQL embarqué DuckDB est installé"""
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def arrow_available():
+    """Vrai si pyarrow est installé (moteur Arrow en mémoire)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def text_dtypes(csv_path):
+    """
+    Types texte des colonnes d'identifiants et de tags d'un CSV enrichi
+
+    Sans eux, un compte identifié par un numéro (« 000012345678 ») serait lu
+    comme un entier : zéros initiaux perdus et valeurs mixtes non triables.
+    """
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    return {c: str for c in columns if c in TEXT_COLUMNS or c.startswith(TAG_PREFIX)}
+
+
+def finish_aggregate(result, by):
+    """
+    Dérive Cost (USD) et Mean (coût moyen par ligne) des sommes en centimes
+
+    Partagé par les deux moteurs pour que l'arithmétique flottante soit la même.
+    """
+    result = result.reset_index(drop=True)
+    if 'Date' in by:
+        result['Date'] = pd.to_datetime(result['Date']).astype('datetime64[ns]')
+    cents = result.pop('CostCents').to_numpy(dtype=np.int64)
+    count = result.pop('Count').to_numpy(dtype=np.int64)
+    result['Cost'] = cents / 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['Mean'] = cents / count / 100
+    result['Count'] = count
+    return result
+
+
+class PandasCostQueries:
+    """Requêtes sur un DataFrame enrichi chargé en mémoire (moteur de repli)"""
+
+    name = 'pandas'
+
+    def __init__(self, df):
+        """
+        Args:
+            df: Données enrichies (costs_enriched), colonne Date de type datetime
+        """
+        self.df = df
+        self.columns = list(df.columns)
+        cost = df['Cost'].to_numpy(dtype=np.float64)
+        self._has_cost = ~np.isnan(cost)
+        self._cents = np.rint(np.where(self._has_cost, cost, 0.0) * 100).astype(np.int64)
+
+    def _mask(self, filters):
+        """Masque des lignes retenues par les filtres"""
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            values = self.df[column]
+            if isinstance(value, tuple):
+                low, high = value
+                mask &= ((values >= low) & (values <= high)).to_numpy()
+            else:
+                mask &= (values == value).to_numpy()
+        return mask
+
+    def date_range(self):
+        """Première et dernière date des données"""
+        return self.df['Date'].min(), self.df['Date'].max()
+
+    def distinct(self, column):
+        """Valeurs distinctes (triées, sans valeur manquante) d'une colonne"""
+        return sorted(self.df[column].dropna().unique().tolist())
+
+    def row_count(self, filters=None):
+        """Nombre de lignes retenues par les filtres"""
+        return int(self._mask(filters).sum())
+
+    def total_cost(self, filters=None):
+        """Coût total (USD) des lignes filtrées"""
+        return int(self._cents[self._mask(filters)].sum()) / 100
+
+    def aggregate(self, by, filters=None):
+        """
+        Coûts regroupés par les colonnes `by`
+
+        Returns:
+            DataFrame (by, Cost, Mean, Count) trié par clés, valeurs manquantes en dernier
+        """
+        mask = self._mask(filters)
+        frame = self.df.loc[mask, by].assign(
+            CostCents=self._cents[mask],
+            Count=self._has_cost[mask].astype(np.int64)
+        )
+        result = frame.groupby(by, dropna=False, sort=True).agg(
+            {'CostCents': 'sum', 'Count': 'sum'}
+        ).reset_index()
+        return finish_aggregate(result, by)
+
+    def rows(self, filters=None):
+        """Lignes détaillées retenues par les filtres (export)"""
+        return self.df[self._mask(filters)]
+
+
+def read_arrow_table(enriched_csv=None, parquet_dir=None):
+    """
+    Charge les données enrichies en table Arrow compacte et immuable
+
+    Le jeu de données Parquet est préféré au CSV (types déjà connus) ; chaque
+    colonne texte est encodée en dictionnaire (chaque valeur distincte stockée
+    une fois) et la colonne Date est convertie en timestamp[ns].
+    """
+    import pyarrow as pa
+
+    parts = sorted(glob.glob(os.path.join(parquet_dir, '*.parquet'))) if parquet_dir else []
+    if parts:
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        # Colonnes texte lues directement en dictionnaire (pas de chaînes décodées)
+        strings = [f.name for f in pq.read_schema(parts[0]) if pa.types.is_string(f.type)]
+        file_format = ds.ParquetFileFormat(
+            read_options=ds.ParquetReadOptions(dictionary_columns=strings)
+        )
+        table = ds.dataset(parts, format=file_format).to_table()
+        table = table.unify_dictionaries().combine_chunks()
+    else:
+        import pyarrow.csv as pacsv
+        column_types = {c: pa.string() for c in text_dtypes(enriched_csv)}
+        options = pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+        table = pacsv.read_csv(enriched_csv, convert_options=options)
+
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_null(column.type):
+            # CSV sans ligne (tout en quarantaine) : types non inférés
+            column = column.cast(pa.float64() if name == 'Cost' else pa.string())
+        if name == 'Date':
+            column = column.cast(pa.timestamp('ns'))
+        elif pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = column.combine_chunks().dictionary_encode()
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+class ArrowCostQueries:
+    """
+    Requêtes sur une table Arrow en mémoire (une par processus, partagée par les sessions)
+
+    La table est immuable : les sessions la lisent sans copie. Un filtre est un
+    masque calculé colonne par colonne ; seules les colonnes regroupées des lignes
+    retenues sont matérialisées pour une agrégation.
+    """
+
+    name = 'arrow'
+
+    def __init__(self, table):
+        """
+        Args:
+            table: Table Arrow des données enrichies (voir read_arrow_table)
+        """
+        import pyarrow as pa
+
+        self.table = table
+        self.columns = list(table.column_names)
+        cost = table['Cost'].to_numpy()
+        has_cost = ~np.isnan(cost)
+        self._cents = pa.array(np.rint(np.where(has_cost, cost, 0.0) * 100).astype(np.int64))
+        self._counts = pa.array(has_cost.astype(np.int64))
+
+    def _mask(self, filters):
+        """Masque Arrow des lignes retenues par les filtres (None : toutes les lignes)"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        mask = None
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            values = self.table[column]
+            value_type = values.type.value_type if pa.types.is_dictionary(values.type) else values.type
+            if isinstance(value, tuple):
+                low, high = (pa.scalar(v, type=value_type) for v in value)
+                condition = pc.and_(pc.greater_equal(values, low), pc.less_equal(values, high))
+            else:
+                condition = pc.is_in(values, value_set=pa.array([value], type=value_type))
+            condition = pc.fill_null(condition, False)
+            mask = condition if mask is None else pc.and_(mask, condition)
+        return mask
+
+    def date_range(self):
+        """Première et dernière date des données"""
+        import pyarrow.compute as pc
+
+        bounds = pc.min_max(self.table['Date'])
+        return pd.Timestamp(bounds['min'].as_py()), pd.Timestamp(bounds['max'].as_py())
+
+    def distinct(self, column):
+        """Valeurs distinctes (triées, sans valeur manquante) d'une colonne"""
+        values = self.table[column].unique()
+        if hasattr(values, 'dictionary_decode'):
+            values = values.dictionary_decode()
+        return sorted(v for v in values.to_pylist() if v is not None)
+
+    def row_count(self, filters=None):
+        """Nombre de lignes retenues par les filtres"""
+        import pyarrow.compute as pc
+
+        mask = self._mask(filters)
+        return len(self.table) if mask is None else int(pc.sum(mask).as_py() or 0)
+
+    def total_cost(self, filters=None):
+        """Coût total (USD) des lignes filtrées"""
+        import pyarrow.compute as pc
+
+        mask = self._mask(filters)
+        cents = self._cents if mask is None else pc.filter(self._cents, mask)
+        return int(pc.sum(cents).as_py() or 0) / 100
+
+    def aggregate(self, by, filters=None):
+        """
+        Coûts regroupés par les colonnes `by`
+
+        Returns:
+            DataFrame (by, Cost, Mean, Count) trié par clés, valeurs manquantes en dernier
+        """
+        import pyarrow as pa
+
+        frame = pa.table(
+            [self.table[c] for c in by] + [self._cents, self._counts],
+            names=list(by) + ['CostCents', 'Count']
+        )
+        mask = self._mask(filters)
+        if mask is not None:
+            frame = frame.filter(mask)
+        result = frame.group_by(list(by)).aggregate([('CostCents', 'sum'), ('Count', 'sum')])
+        result = result.rename_columns(
+            [{'CostCents_sum': 'CostCents', 'Count_sum': 'Count'}.get(c, c) for c in result.column_names]
+        ).to_pandas()
+        for column in by:
+            if isinstance(result[column].dtype, pd.CategoricalDtype):
+                result[column] = result[column].astype(object)
+        result = result[list(by) + ['CostCents', 'Count']] \
+            .sort_values(list(by), na_position='last', kind='stable')
+        return finish_aggregate(result, by)
+
+    def rows(self, filters=None):
+        """Lignes détaillées retenues par les filtres (export)"""
+        mask = self._mask(filters)
+        return (self.table if mask is None else self.table.filter(mask)).to_pandas()
+
+
+class SnapshotCostQueries(ArrowCostQueries):
+    """
+    Requêtes sur l'instantané Arrow publié par la transformation, projeté en mémoire
+
+    Ouverture quasi immédiate : rien n'est analysé ni copié, seules les pages des
+    colonnes lues sont chargées, et elles sont partagées entre les processus du
+    dashboard par le cache du système.
+    """
+
+    name = 'snapshot'
+
+    def __init__(self, snapshot_file):
+        """
+        Args:
+            snapshot_file: Fichier costs_enriched.arrow (voir arrow_snapshot)
+        """
+        super().__init__(read_snapshot(snapshot_file))
+
+
+class DuckDBCostQueries:
+    """Requêtes SQL (DuckDB) directement sur le jeu de données Parquet"""
+
+    name = 'duckdb'
+
+    def __init__(self, dataset_dir):
+        """
+        Args:
+            dataset_dir: Répertoire costs_enriched.parquet (un fichier par bloc)
+        """
+        import duckdb
+
+        self.dataset_dir = dataset_dir
+        self.con = duckdb.connect(database=':memory:')
+        pattern = os.path.join(dataset_dir, '*.parquet').replace("'", "''")
+        self.con.execute(f"CREATE VIEW costs AS SELECT * FROM read_parquet('{pattern}')")
+        self.columns = [row[0] for row in self.con.execute("DESCRIBE costs").fetchall()]
+
+    def _query(self, sql, params=None):
+        """Exécute une requête (curseur dédié : sûr entre les threads Streamlit)"""
+        return self.con.cursor().execute(sql, params or []).df()
+
+    @staticmethod
+    def _ident(column):
+        """Nom de colonne entre guillemets SQL"""
+        return '"' + column.replace('"', '""') + '"'
+
+    def _where(self, filters):
+        """Clause WHERE paramétrée correspondant aux filtres"""
+        clauses, params = [], []
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, tuple):
+                clauses.append(f"{self._ident(column)} BETWEEN ? AND ?")
+                params += list(value)
+            else:
+                clauses.append(f"{self._ident(column)} = ?")
+                params.append(value)
+        sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return sql, params
+
+    def date_range(self):
+        """Première et dernière date des données"""
+        result = self._query('SELECT min("Date") AS lo, max("Date") AS hi FROM costs')
+        return pd.Timestamp(result['lo'].iloc[0]), pd.Timestamp(result['hi'].iloc[0])
+
+    def distinct(self, column):
+        """Valeurs distinctes (triées, sans valeur manquante) d'une colonne"""
+        col = self._ident(column)
+        result = self._query(
+            f"SELECT DISTINCT {col} AS v FROM costs WHERE {col} IS NOT NULL ORDER BY 1"
+        )
+        return result['v'].tolist()
+
+    def row_count(self, filters=None):
+        """Nombre de lignes retenues par les filtres"""
+        where, params = self._where(filters)
+        return int(self._query(f"SELECT count(*) AS n FROM costs{where}", params)['n'].iloc[0])
+
+    def total_cost(self, filters=None):
+        """Coût total (USD) des lignes filtrées"""
+        where, params = self._where(filters)
+        result = self._query(
+            f"SELECT CAST(COALESCE(sum({CENTS_SQL}), 0) AS BIGINT) AS cents FROM costs{where}",
+            params
+        )
+        return int(result['cents'].iloc[0]) / 100
+
+    def aggregate(self, by, filters=None):
+        """
+        Coûts regroupés par les colonnes `by`
+
+        Returns:
+            DataFrame (by, Cost, Mean, Count) trié par clés, valeurs manquantes en dernier
+        """
+        where, params = self._where(filters)
+        keys = ', '.join(self._ident(c) for c in by)
+        order = ', '.join(f"{self._ident(c)} ASC NULLS LAST" for c in by)
+        result = self._query(
+            f"SELECT {keys}, CAST(sum({CENTS_SQL}) AS BIGINT) AS CostCents, "
+            f'count("Cost") AS Count FROM costs{where} GROUP BY {keys} ORDER BY {order}',
+            params
+        )
+        return finish_aggregate(result, by)
+
+    def rows(self, filters=None):
+        """Lignes détaillées retenues par les filtres (export)"""
+        where, params = self._where(filters)
+        return self._query(f"SELECT * FROM costs{where}", params)
+
+
+def open_queries(enriched_csv=None, parquet_dir=None, backend=None, snapshot_file=None):
+    """
+    Ouvre le moteur de requêtes le plus adapté aux données disponibles
+
+    Args:
+        enriched_csv: Fichier costs_enriched CSV (moteurs en mémoire)
+        parquet_dir: Jeu de données costs_enriched.parquet (moteurs DuckDB et Arrow), ou None
+        backend: 'snapshot', 'duckdb', 'arrow', 'pandas' ou None (instantané Arrow s'il
+                 est publié, sinon DuckDB si installé et Parquet présent, sinon Arrow
+                 si pyarrow est installé, sinon pandas)
+        snapshot_file: Instantané costs_enriched.arrow, ou None
+
+    Returns:
+        SnapshotCostQueries, DuckDBCostQueries, ArrowCostQueries ou PandasCostQueries
+    """
+    if backend not in (None, 'auto') + BACKENDS:
+        raise ValueError(f"Moteur de requêtes inconnu : {backend}")
+
+    use_snapshot = (
+        backend in (None, 'auto', 'snapshot')
+        and snapshot_file is not None and os.path.exists(snapshot_file)
+        and snapshot_available()
+    )
+    if backend == 'snapshot' and not use_snapshot:
+        print("⚠️  Instantané Arrow indisponible : repli sur un autre moteur")
+
+    if use_snapshot:
+        return SnapshotCostQueries(snapshot_file)
+
+    use_duckdb = (
+        backend in (None, 'auto', 'snapshot', 'duckdb')
+        and parquet_dir is not None and glob.glob(os.path.join(parquet_dir, '*.parquet'))
+        and duckdb_available()
+    )
+    if backend == 'duckdb' and not use_duckdb:
+        print("⚠️  DuckDB ou jeu de données Parquet indisponible : repli sur un moteur en mémoire")
+
+    if use_duckdb:
+        return DuckDBCostQueries(parquet_dir)
+
+    # Table Arrow partagée (mémoire compacte, lecture sans copie), sinon DataFrame pandas
+    if backend != 'pandas' and arrow_available():
+        return ArrowCostQueries(read_arrow_table(enriched_csv, parquet_dir))
+
+    df = pd.read_csv(enriched_csv, dtype=text_dtypes(enriched_csv))
+    df['Date'] = pd.to_datetime(df['Date'])
+    return PandasCostQueries(df)
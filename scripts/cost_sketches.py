@@ -0,0 +1,448 @@
+"""
+Résumés en flux (sketches) des dimensions à forte cardinalité
+Space-Saving pour les éléments les plus coûteux (top-K) et HyperLogLog pour le nombre
+de valeurs distinctes (ressources par compte). Les deux sont tenus par jour et
+fusionnables : blocs, partitions parallèles, puis jours et mois de plusieurs
+partitions se combinent sans relire les données détaillées
+"""
+
+import argparse
+import base64
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from partitions import PROCESSED_DIR, list_partitions, partition_dir
+
+
+TOP_K_COLUMNS = ['Date', 'Dimension', 'Item', 'Count', 'Error']
+DISTINCT_COLUMNS = ['Date', 'Dimension', 'Group', 'Registers']
+
+# Fichiers d'une partition
+TOP_K_FILE = 'topk_sketch.csv'
+DISTINCT_FILE = 'distinct_sketch.csv'
+
+# Paramètres par défaut (voir transform_config.SKETCHES)
+DEFAULT_CAPACITY = 500
+DEFAULT_PRECISION = 12
+
+
+def _cents(df):
+    """Coût d'un bloc en centimes entiers (comme les agrégats partiels)"""
+    return np.rint(df['Cost'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+
+class TopKSketch:
+    """
+    Space-Saving pondéré par le coût, un résumé de `capacity` compteurs par jour et dimension
+
+    Count majore le coût réel d'un élément et Count - Error le minore. Un jour dont
+    le résumé a moins de `capacity` compteurs est exact ; sinon un élément absent a
+    coûté au plus le plus petit compteur du jour (son « plancher »).
+    """
+
+    def __init__(self, table=None, capacity=DEFAULT_CAPACITY):
+        """
+        Args:
+            table: DataFrame (Date, Dimension, Item, Count, Error), montants en centimes
+            capacity: Nombre de compteurs par jour et dimension
+        """
+        if table is None:
+            table = pd.DataFrame({
+                'Date': pd.Series(dtype='datetime64[ns]'),
+                'Dimension': pd.Series(dtype=object),
+                'Item': pd.Series(dtype=object),
+                'Count': pd.Series(dtype=np.int64),
+                'Error': pd.Series(dtype=np.int64),
+            })
+        self.table = table[TOP_K_COLUMNS].reset_index(drop=True)
+        self.capacity = capacity
+
+    @classmethod
+    def from_frame(cls, df, dimensions, capacity=DEFAULT_CAPACITY):
+        """
+        Résumé d'un bloc enrichi (exact avant troncature : Error = 0)
+
+        Args:
+            df: Bloc enrichi (Date, Cost et colonnes des dimensions)
+            dimensions: Colonnes suivies (les colonnes absentes sont ignorées)
+        """
+        cents = _cents(df)
+        tables = []
+        for dimension in dimensions:
+            if dimension not in df.columns:
+                continue
+            frame = pd.DataFrame({'Date': df['Date'], 'Item': df[dimension], 'Count': cents})
+            table = frame.groupby(['Date', 'Item'], sort=False)['Count'].sum().reset_index()
+            tables.append(table.assign(Dimension=dimension, Error=np.int64(0)))
+        if not tables:
+            return cls(capacity=capacity)
+        return cls(cls._truncate(pd.concat(tables, ignore_index=True), capacity), capacity)
+
+    @staticmethod
+    def _truncate(table, capacity):
+        """Garde les `capacity` plus gros compteurs de chaque jour et dimension (ordre stable)"""
+        table = table.sort_values(
+            ['Date', 'Dimension', 'Count', 'Item'], ascending=[True, True, False, True],
+            kind='stable', ignore_index=True
+        )
+        rank = table.groupby(['Date', 'Dimension'], sort=False).cumcount()
+        return table[rank.to_numpy() < capacity].reset_index(drop=True)
+
+    def _floors(self, table):
+        """Plancher de chaque ligne : plus petit compteur du jour s'il est plein, sinon 0"""
+        groups = table.groupby(['Date', 'Dimension'], sort=False)['Count']
+        full = groups.transform('size').to_numpy() >= self.capacity
+        return np.where(full, groups.transform('min').to_numpy(), 0)
+
+    def merge(self, other):
+        """
+        Fusionne deux résumés (blocs, partitions ou jours disjoints)
+
+        Un élément absent d'un résumé y compte pour son plancher, en valeur et en
+        erreur : les bornes restent garanties après troncature.
+        """
+        keys = ['Date', 'Dimension', 'Item']
+        left = self.table.assign(Floor=self._floors(self.table))
+        right = other.table.assign(Floor=other._floors(other.table))
+        merged = left.merge(right, on=keys, how='outer', suffixes=('L', 'R'))
+
+        for side in ('L', 'R'):
+            floors = (left if side == 'L' else right).groupby(['Date', 'Dimension'])['Floor'].max()
+            day = pd.MultiIndex.from_frame(merged[['Date', 'Dimension']])
+            floor = floors.reindex(day).fillna(0).to_numpy(dtype=np.int64)
+            merged['Count' + side] = merged['Count' + side].fillna(pd.Series(floor, index=merged.index))
+            merged['Error' + side] = merged['Error' + side].fillna(pd.Series(floor, index=merged.index))
+
+        table = merged[keys].assign(
+            Count=(merged['CountL'] + merged['CountR']).astype(np.int64),
+            Error=(merged['ErrorL'] + merged['ErrorR']).astype(np.int64),
+        )
+        return TopKSketch(self._truncate(table, self.capacity), self.capacity)
+
+    def without_dates(self, dates):
+        """Résumé privé des jours donnés (jours déjà couverts par une partition plus récente)"""
+        return TopKSketch(self.table[~self.table['Date'].isin(dates)], self.capacity)
+
+    def top(self, dimension, n=10, start=None, end=None):
+        """
+        Éléments les plus coûteux d'une dimension sur une période
+
+        Les jours sont combinés sans troncature : chaque élément reçoit la somme de
+        ses compteurs et, pour les jours où il est absent, le plancher du jour.
+
+        Args:
+            dimension: Dimension suivie (Service, ResourceId...)
+            n: Nombre d'éléments
+            start, end: Bornes incluses de la période (None : toutes les dates)
+
+        Returns:
+            DataFrame (Item, Cost, MinCost) : le coût réel est compris entre MinCost et Cost
+        """
+        table = self.table[self.table['Dimension'] == dimension]
+        if start is not None:
+            table = table[table['Date'] >= pd.Timestamp(start)]
+        if end is not None:
+            table = table[table['Date'] <= pd.Timestamp(end)]
+
+        floor = self._floors(table)
+        day_floors = pd.Series(floor, index=table.index).groupby(
+            [table['Date'], table['Dimension']]).max()
+        total_floor = int(day_floors.sum())
+        items = table.assign(Count=table['Count'] - floor, Error=table['Error'] - floor) \
+            .groupby('Item')[['Count', 'Error']].sum().reset_index()
+        items['Count'] += total_floor
+        items['Error'] += total_floor
+        items = items.sort_values(['Count', 'Item'], ascending=[False, True], kind='stable').head(n)
+        return pd.DataFrame({
+            'Item': items['Item'].to_numpy(),
+            'Cost': items['Count'].to_numpy() / 100,
+            'MinCost': (items['Count'] - items['Error']).to_numpy() / 100,
+        })
+
+
+def _hash_ranks(values, precision):
+    """
+    Registre et rang HyperLogLog de chaque valeur (hachage 64 bits déterministe)
+
+    Les `precision` bits de poids fort choisissent le registre ; le rang est la
+    position du premier bit à 1 dans les bits restants (limités à 52, exacts en float64).
+    """
+    hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest_bits = 64 - precision
+    shift = max(rest_bits - 52, 0)
+    rest = ((hashes & np.uint64((1 << rest_bits) - 1)) >> np.uint64(shift)).astype(np.float64)
+    _, bit_length = np.frexp(rest)
+    ranks = (rest_bits - shift) - bit_length + 1
+    return index, ranks.astype(np.uint8)
+
+
+def hll_estimate(registers):
+    """Cardinalité estimée de registres HyperLogLog (correction linéaire des petits effectifs)"""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class DistinctSketch:
+    """
+    HyperLogLog par jour, dimension et groupe (ressources distinctes par compte)
+
+    Fusionner revient à prendre le maximum registre par registre : le résultat ne
+    dépend ni de l'ordre ni du découpage, et un nombre de ressources distinctes
+    sur un mois se calcule à partir des registres journaliers.
+    """
+
+    def __init__(self, keys=None, registers=None, precision=DEFAULT_PRECISION):
+        """
+        Args:
+            keys: DataFrame (Date, Dimension, Group), une ligne par registre
+            registers: Tableau uint8 (len(keys), 2**precision)
+            precision: Nombre de bits d'index (erreur type ≈ 1.04 / sqrt(2**precision))
+        """
+        if keys is None:
+            keys = pd.DataFrame({
+                'Date': pd.Series(dtype='datetime64[ns]'),
+                'Dimension': pd.Series(dtype=object),
+                'Group': pd.Series(dtype=object),
+            })
+            registers = np.zeros((0, 1 << precision), dtype=np.uint8)
+        self.keys = keys.reset_index(drop=True)
+        self.registers = registers
+        self.precision = precision
+
+    @classmethod
+    def from_frame(cls, df, dimensions, precision=DEFAULT_PRECISION):
+        """
+        Registres d'un bloc enrichi
+
+        Args:
+            df: Bloc enrichi
+            dimensions: {colonne comptée: colonne de groupe}, ex. {'ResourceId': 'AccountId'}
+        """
+        parts = []
+        for dimension, group in dimensions.items():
+            if dimension not in df.columns or group not in df.columns:
+                continue
+            rows = df.loc[df[dimension].notna() & df['Date'].notna(), ['Date', group, dimension]]
+            if len(rows) == 0:
+                continue
+            keys = pd.DataFrame({'Date': rows['Date'], 'Dimension': dimension, 'Group': rows[group]})
+            codes = keys.groupby(['Date', 'Dimension', 'Group'], sort=True, dropna=False).ngroup().to_numpy()
+            index, ranks = _hash_ranks(rows[dimension].astype(str).to_numpy(), precision)
+            registers = np.zeros((codes.max() + 1) << precision, dtype=np.uint8)
+            np.maximum.at(registers, (codes.astype(np.int64) << precision) + index, ranks)
+            first = np.unique(codes, return_index=True)[1]
+            parts.append(cls(keys.iloc[first], registers.reshape(-1, 1 << precision), precision))
+
+        sketch = cls(precision=precision)
+        for part in parts:
+            sketch = sketch.merge(part)
+        return sketch
+
+    @staticmethod
+    def _reduce(keys, registers):
+        """Maximum des registres de même clé, clés triées"""
+        codes = keys.groupby(['Date', 'Dimension', 'Group'], sort=True, dropna=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        return keys.iloc[order[starts]], np.maximum.reduceat(registers[order], starts, axis=0)
+
+    def merge(self, other):
+        """Fusionne deux résumés (maximum registre par registre)"""
+        if len(other.keys) == 0:
+            return self
+        if len(self.keys) == 0:
+            return other
+        keys = pd.concat([self.keys, other.keys], ignore_index=True)
+        registers = np.concatenate([self.registers, other.registers])
+        return DistinctSketch(*self._reduce(keys, registers), precision=self.precision)
+
+    def without_dates(self, dates):
+        """Résumé privé des jours donnés (jours déjà couverts par une partition plus récente)"""
+        keep = ~self.keys['Date'].isin(dates).to_numpy()
+        return DistinctSketch(self.keys[keep], self.registers[keep], self.precision)
+
+    def count(self, dimension, start=None, end=None):
+        """
+        Nombre estimé de valeurs distinctes sur une période
+
+        Returns:
+            (Series estimation par groupe, estimation tous groupes confondus)
+        """
+        mask = (self.keys['Dimension'] == dimension).to_numpy()
+        if start is not None:
+            mask &= (self.keys['Date'] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (self.keys['Date'] <= pd.Timestamp(end)).to_numpy()
+        if not mask.any():
+            return pd.Series(dtype=np.int64), 0
+
+        keys = self.keys[mask].assign(Date=pd.NaT)
+        keys, registers = self._reduce(keys, self.registers[mask])
+        by_group = pd.Series(
+            np.rint(hll_estimate(registers)).astype(np.int64), index=keys['Group'].to_numpy()
+        ).sort_values(ascending=False, kind='stable')
+        overall = int(np.rint(hll_estimate(registers.max(axis=0))))
+        return by_group, overall
+
+    def to_frame(self):
+        """Registres sérialisés (zlib + base64), une ligne par clé"""
+        return self.keys.assign(Registers=[
+            base64.b64encode(zlib.compress(row.tobytes())).decode('ascii') for row in self.registers
+        ])[DISTINCT_COLUMNS]
+
+    @classmethod
+    def from_table(cls, table, precision=DEFAULT_PRECISION):
+        """Résumé relu depuis to_frame()"""
+        registers = np.array([
+            np.frombuffer(zlib.decompress(base64.b64decode(value)), dtype=np.uint8)
+            for value in table['Registers']
+        ], dtype=np.uint8).reshape(len(table), 1 << precision)
+        return cls(table[['Date', 'Dimension', 'Group']], registers, precision)
+
+
+class CostSketches:
+    """Résumés top-K et distincts d'une partition, alimentés bloc par bloc"""
+
+    def __init__(self, top_k=None, distinct=None, config=None):
+        """
+        Args:
+            top_k: TopKSketch
+            distinct: DistinctSketch
+            config: Paramètres (voir transform_config.SKETCHES)
+        """
+        config = config or {}
+        self.config = config
+        self.top_k = top_k or TopKSketch(capacity=config.get('top_k_capacity', DEFAULT_CAPACITY))
+        self.distinct = distinct or DistinctSketch(
+            precision=config.get('hll_precision', DEFAULT_PRECISION))
+
+    @classmethod
+    def from_frame(cls, df, config):
+        """Résumés d'un bloc enrichi"""
+        return cls(
+            TopKSketch.from_frame(df, config['top_k_dimensions'], config['top_k_capacity']),
+            DistinctSketch.from_frame(df, config['distinct'], config['hll_precision']),
+            config
+        )
+
+    def merge(self, other):
+        """Fusionne les résumés de deux blocs ou partitions"""
+        return CostSketches(self.top_k.merge(other.top_k),
+                            self.distinct.merge(other.distinct), self.config)
+
+    def without_dates(self, dates):
+        """Résumés privés des jours donnés"""
+        return CostSketches(self.top_k.without_dates(dates),
+                            self.distinct.without_dates(dates), self.config)
+
+    def dates(self):
+        """Jours couverts par les résumés"""
+        return pd.Index(self.top_k.table['Date']).union(pd.Index(self.distinct.keys['Date'])).dropna()
+
+    def save(self, top_k_file, distinct_file, write_csv):
+        """
+        Écrit les deux résumés en CSV
+
+        Args:
+            write_csv: Fonction d'écriture (partitions.write_csv_atomic)
+        """
+        write_csv(self.top_k.table, top_k_file, index=False)
+        write_csv(self.distinct.to_frame(), distinct_file, index=False)
+
+    @classmethod
+    def load(cls, top_k_file, distinct_file, config):
+        """Relit les résumés écrits par save()"""
+        text = {'Dimension': str, 'Item': str, 'Group': str}
+        top_k = pd.read_csv(top_k_file, parse_dates=['Date'], dtype=text)
+        distinct = pd.read_csv(distinct_file, parse_dates=['Date'], dtype=text)
+        return cls(
+            TopKSketch(top_k, config['top_k_capacity']),
+            DistinctSketch.from_table(distinct, config['hll_precision']),
+            config
+        )
+
+
+def combine_partitions(config, base_dir=PROCESSED_DIR, start=None, end=None):
+    """
+    Combine les résumés de plusieurs partitions (jours et mois de plusieurs exécutions)
+
+    Les partitions se recouvrent (chaque exécution re-traite une fenêtre glissante) :
+    chaque jour est pris dans la partition la plus récente qui le contient.
+
+    Args:
+        config: Paramètres des résumés (transform_config.SKETCHES)
+        start, end: Bornes incluses (YYYY-MM-DD) des jours retenus, ou None
+
+    Returns:
+        (CostSketches combinés, nombre de partitions lues)
+    """
+    combined = CostSketches(config=config)
+    claimed = pd.DatetimeIndex([])
+    n_read = 0
+    for ds in reversed(list_partitions(base_dir)):
+        directory = partition_dir(base_dir, ds)
+        top_k_file = os.path.join(directory, TOP_K_FILE)
+        distinct_file = os.path.join(directory, DISTINCT_FILE)
+        if not (os.path.exists(top_k_file) and os.path.exists(distinct_file)):
+            continue
+        sketches = CostSketches.load(top_k_file, distinct_file, config).without_dates(claimed)
+        dates = sketches.dates()
+        if start is not None:
+            dates = dates[dates >= pd.Timestamp(start)]
+        if end is not None:
+            dates = dates[dates <= pd.Timestamp(end)]
+        if len(dates) == 0:
+            continue
+        combined = combined.merge(sketches)
+        claimed = claimed.union(dates)
+        n_read += 1
+    return combined, n_read
+
+
+def main():
+    """Top-N et ressources distinctes sur une période, depuis les résumés des partitions"""
+    import transform_config
+
+    parser = argparse.ArgumentParser(description="Requêtes approchées sur les résumés des partitions")
+    parser.add_argument('--start', help="Premier jour (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Dernier jour inclus (YYYY-MM-DD)")
+    parser.add_argument('--top', type=int, default=10, help="Nombre d'éléments affichés")
+    args = parser.parse_args()
+
+    config = transform_config.SKETCHES
+    sketches, n_read = combine_partitions(config, start=args.start, end=args.end)
+    print("="*60)
+    print(f"🧮 RÉSUMÉS APPROCHÉS ({n_read} partitions)")
+    print("="*60)
+
+    for dimension in config['top_k_dimensions']:
+        top = sketches.top_k.top(dimension, args.top, args.start, args.end)
+        if len(top) == 0:
+            continue
+        print(f"\n🏆 TOP {args.top} {dimension}")
+        print("-" * 60)
+        for _, row in top.iterrows():
+            print(f"   {str(row['Item'])[:40]:40s} : ${row['Cost']:12,.2f} (≥ ${row['MinCost']:,.2f})")
+
+    for dimension, group in config['distinct'].items():
+        by_group, overall = sketches.distinct.count(dimension, args.start, args.end)
+        if overall == 0:
+            continue
+        print(f"\n🔢 {dimension} DISTINCTS PAR {group} (≈ {overall:,} au total)")
+        print("-" * 60)
+        for value, count in by_group.head(args.top).items():
+            print(f"   {str(value):40s} : ≈ {count:,}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
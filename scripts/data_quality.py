@@ -0,0 +1,252 @@
+"""
+Contrôle qualité des données brutes en une seule passe
+Chaque règle positionne un bit d'un code de rejet par ligne ; les lignes rejetées sont
+mises en quarantaine avec leurs motifs au lieu d'être supprimées silencieusement
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Codes de rejet (bits combinables : une ligne peut enfreindre plusieurs règles)
+DUPLICATE = 1           # clé déjà vue (première occurrence valide conservée)
+NEGATIVE_COST = 2       # coût négatif
+MISSING_COST = 4        # coût manquant
+UNKNOWN_CURRENCY = 8    # devise absente ou non prise en charge
+OUT_OF_WINDOW = 16      # date manquante ou hors de la fenêtre de la partition
+SCHEMA_DRIFT = 32       # valeur non conforme au type attendu (date ou coût illisible)
+
+# Libellés des règles, dans l'ordre des bits
+RULES = {
+    DUPLICATE: 'duplicate',
+    NEGATIVE_COST: 'negative_cost',
+    MISSING_COST: 'missing_cost',
+    UNKNOWN_CURRENCY: 'unknown_currency',
+    OUT_OF_WINDOW: 'out_of_window',
+    SCHEMA_DRIFT: 'schema_drift',
+}
+
+# Schéma unifié attendu des fichiers bruts
+EXPECTED_COLUMNS = ['Date', 'Cloud', 'Service', 'Region', 'Cost', 'Currency',
+                    'AccountName', 'AccountId']
+REQUIRED_COLUMNS = ['Date', 'Service', 'Cost']
+
+# Colonnes facultatives des extractions détaillées (CUR, exports) : ressource et tags
+OPTIONAL_COLUMNS = ['ResourceId']
+TAG_PREFIX = 'Tag_'
+
+# Clés de tags conservées par défaut (une colonne Tag_<clé> chacune)
+DEFAULT_TAG_KEYS = ['team', 'project', 'environment', 'cost-center']
+
+# Dimensions manquantes remplacées par 'Unknown' (la ligne reste valide)
+FILL_UNKNOWN = ['Service', 'Region', 'AccountName']
+
+# Colonnes ajoutées aux lignes mises en quarantaine
+QUARANTINE_COLUMNS = ['ReasonCode', 'Reasons']
+
+
+class SeenRows:
+    """
+    Ensemble d'empreintes 64 bits des clés déjà vues (dédoublonnage entre blocs)
+
+    Les empreintes sont gardées dans quelques tableaux triés, fusionnés
+    périodiquement : 8 octets par ligne distincte au lieu de la ligne complète.
+    """
+
+    def __init__(self, max_runs=8):
+        self.runs = []
+        self.max_runs = max_runs
+
+    def contains(self, hashes):
+        """Retourne un masque des empreintes déjà présentes"""
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            if len(run) == 0:
+                continue
+            pos = np.searchsorted(run, hashes)
+            pos[pos == len(run)] = 0
+            found |= run[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        """Ajoute des empreintes (fusion des tableaux triés au-delà de max_runs)"""
+        self.runs.append(np.unique(hashes))
+        if len(self.runs) > self.max_runs:
+            self.runs = [np.unique(np.concatenate(self.runs))]
+
+
+def tag_column(key):
+    """Nom de la colonne d'un tag (ex. 'user:cost-center' → 'Tag_cost_center')"""
+    key = key[len('user:'):] if key.startswith('user:') else key
+    return TAG_PREFIX + re.sub(r'[^0-9A-Za-z]+', '_', key).strip('_')
+
+
+def check_schema(columns):
+    """
+    Compare les colonnes d'un fichier brut au schéma unifié
+
+    Returns:
+        {'missing': [...], 'unexpected': [...]} (dérive tolérée)
+
+    Raises:
+        ValueError: si une colonne indispensable manque
+    """
+    columns = list(columns)
+    missing = [c for c in EXPECTED_COLUMNS if c not in columns]
+    absent_required = [c for c in REQUIRED_COLUMNS if c in missing]
+    if absent_required:
+        raise ValueError(f"Colonnes obligatoires absentes : {', '.join(absent_required)}")
+    return {
+        'missing': missing,
+        'unexpected': [
+            c for c in columns
+            if c not in EXPECTED_COLUMNS and c not in OPTIONAL_COLUMNS
+            and not c.startswith(TAG_PREFIX)
+        ],
+    }
+
+
+def parse_dates(values):
+    """Convertit une colonne de dates (texte ISO) ; valeurs illisibles → NaT"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, format='ISO8601', errors='coerce')
+
+
+def parse_costs(values):
+    """Convertit une colonne de coûts en float64 ; valeurs illisibles → NaN"""
+    if pd.api.types.is_float_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def key_hashes(columns):
+    """Empreinte 64 bits par ligne d'un ensemble de colonnes clés (sans copie du DataFrame)"""
+    hashes = None
+    for values in columns:
+        column_hash = pd.util.hash_array(np.asarray(values))
+        hashes = column_hash if hashes is None else \
+            (hashes * np.uint64(1000003)) ^ column_hash
+    return hashes
+
+
+def reason_labels(codes):
+    """Libellés des motifs de rejet ('duplicate|negative_cost'...) pour chaque code"""
+    labels = {
+        code: '|'.join(name for bit, name in RULES.items() if code & bit)
+        for code in np.unique(codes)
+    }
+    return pd.Series(codes).map(labels).to_numpy(dtype=object)
+
+
+def validate_frame(df, seen=None, dedup_keys=None, currencies=None, window=None, fx=None):
+    """
+    Applique toutes les règles de qualité à un bloc en une seule passe
+
+    Chaque règle est une opération vectorisée sur une colonne qui positionne
+    son bit dans un tableau de codes ; le bloc n'est filtré qu'une fois à la fin.
+    Le dédoublonnage ne considère que les lignes valides par ailleurs, pour
+    qu'une première occurrence rejetée n'élimine pas une version correcte.
+
+    Args:
+        df: Données brutes (Date et Cost en texte ou déjà typées)
+        seen: SeenRows des blocs précédents (mode par morceaux), ou None
+        dedup_keys: Colonnes identifiant une ligne (celles absentes sont ignorées,
+                    les colonnes Tag_* sont ajoutées)
+        currencies: Devises acceptées (None : pas de contrôle)
+        window: (début inclus, fin exclue) des dates acceptées, ou None
+        fx: FxRates pour convertir Cost dans la devise de référence (montant, devise
+            et taux d'origine gardés dans OriginalCost, OriginalCurrency, FxRate) ;
+            une ligne sans taux à sa date est rejetée comme de devise inconnue
+
+    Returns:
+        (lignes valides, lignes en quarantaine avec ReasonCode/Reasons, compteurs)
+    """
+    n_rows = len(df)
+    reasons = np.zeros(n_rows, dtype=np.uint8)
+
+    # Dates : manquantes, illisibles ou hors fenêtre
+    dates = parse_dates(df['Date'])
+    date_missing = df['Date'].isna().to_numpy()
+    date_invalid = dates.isna().to_numpy() & ~date_missing
+    reasons[date_invalid] |= SCHEMA_DRIFT
+    out_of_window = date_missing
+    if window is not None:
+        start, end = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+        out_of_window = out_of_window | ((dates < start) | (dates >= end)).to_numpy()
+    reasons[out_of_window] |= OUT_OF_WINDOW
+
+    # Coûts : manquants, illisibles ou négatifs
+    costs = parse_costs(df['Cost'])
+    cost_missing = df['Cost'].isna().to_numpy()
+    reasons[np.isnan(costs) & ~cost_missing] |= SCHEMA_DRIFT
+    reasons[cost_missing] |= MISSING_COST
+    with np.errstate(invalid='ignore'):
+        reasons[costs < 0] |= NEGATIVE_COST
+
+    # Devise : acceptée et, si les coûts sont convertis, dotée d'un taux à la date de la ligne
+    if currencies is not None and 'Currency' in df.columns:
+        reasons[~df['Currency'].isin(currencies).to_numpy()] |= UNKNOWN_CURRENCY
+    if fx is not None:
+        if 'Currency' in df.columns:
+            fx_rates = fx.lookup(dates, df['Currency'])
+        else:
+            fx_rates = np.ones(n_rows)
+        reasons[np.isnan(fx_rates)] |= UNKNOWN_CURRENCY
+
+    # Doublons de clé parmi les lignes valides (dans le bloc puis avec les blocs précédents) ;
+    # les tags font partie de l'identité d'une ligne détaillée (CUR, exports)
+    keys = [k for k in (dedup_keys or df.columns) if k in df.columns]
+    keys += [c for c in df.columns if c.startswith(TAG_PREFIX) and c not in keys]
+    candidates = np.flatnonzero(reasons == 0)
+    hashes = key_hashes(
+        (dates if k == 'Date' else df[k]).to_numpy()[candidates] for k in keys
+    )
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    if seen is not None:
+        duplicated |= seen.contains(hashes)
+        seen.add(hashes[~duplicated])
+    reasons[candidates[duplicated]] |= DUPLICATE
+
+    # Filtrage unique : lignes valides d'un côté, quarantaine de l'autre
+    valid = reasons == 0
+    rejected = df[~valid].assign(
+        ReasonCode=reasons[~valid],
+        Reasons=reason_labels(reasons[~valid])
+    )
+    # Nouveau DataFrame (copie superficielle : colonnes remplacées, pas modifiées) :
+    # le DataFrame de l'appelant n'est jamais modifié
+    clean = df.take(np.flatnonzero(valid)) if not valid.all() else df
+    clean = clean.copy(deep=False)
+    clean['Date'] = dates.to_numpy()[valid]
+    converted_rows = 0
+    if fx is None:
+        clean['Cost'] = np.round(costs[valid], 2)
+    else:
+        rates = fx_rates[valid]
+        original = clean['Currency'].copy() if 'Currency' in clean.columns else fx.base
+        clean['Cost'] = np.round(costs[valid] * rates, 2)
+        clean['Currency'] = fx.base
+        clean['OriginalCost'] = np.round(costs[valid], 2)
+        clean['OriginalCurrency'] = original
+        clean['FxRate'] = rates
+        converted_rows = int((clean['OriginalCurrency'] != fx.base).sum())
+
+    missing_values = 0
+    for column in FILL_UNKNOWN:
+        if column in clean.columns:
+            missing = clean[column].isna()
+            if missing.any():
+                missing_values += int(missing.sum())
+                clean[column] = clean[column].fillna('Unknown')
+
+    counts = {'initial_rows': n_rows}
+    for bit, name in RULES.items():
+        counts[name] = int(((reasons & bit) != 0).sum())
+    counts['missing_values'] = missing_values
+    counts['converted_rows'] = converted_rows
+    counts['quarantined'] = int((~valid).sum())
+    counts['final_rows'] = int(valid.sum())
+    return clean, rejected, counts
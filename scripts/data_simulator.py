@@ -109,16 +109,18 @@ class CloudCostSimulator:
         return monthly
 
 
-def generate_sample_data(months=3):
+def generate_sample_data(months=3, end_date=None):
     """
     Fonction principale pour générer des données de test
     
     Args:
         months: Nombre de mois de données à générer
+        end_date: Date de fin de la simulation (par défaut : maintenant)
     """
     
     # Calculer les dates
-    end_date = datetime.now()
+    if end_date is None:
+        end_date = datetime.now()
     start_date = end_date - timedelta(days=months * 30)
     
     print(f"🎲 Génération de données simulées...")
@@ -3,31 +3,47 @@ Module d'extraction des coûts Azure via Cost Management API
 """
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
 from dotenv import load_dotenv
 import pandas as pd
-from azure.identity import ClientSecretCredential
-from azure.mgmt.costmanagement import CostManagementClient
-from azure.mgmt.costmanagement.models import (
-    QueryDefinition, 
-    QueryTimePeriod, 
-    TimeframeType,
-    QueryDataset,
-    QueryAggregation,
-    QueryGrouping
-)
 import logging
+from partitions import split_window
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Colonnes produites par l'extraction Azure
+AZURE_COLUMNS = ['Date', 'Cloud', 'Service', 'Region', 'AccountName', 'AccountId', 'Cost', 'Currency']
+
+
+class StaticTokenCredential:
+    """Jeton fixe pour un point d'accès local (fake_cloud_apis) : pas d'appel à Azure AD"""
+    
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+        return AccessToken('local-token', int(time.time()) + 3600)
+
 
 class AzureCostExtractor:
     """Extracteur de coûts Azure Cost Management"""
     
-    def __init__(self):
-        """Initialise la connexion Azure"""
+    def __init__(self, endpoint_url=None, max_workers=1):
+        """
+        Initialise la connexion Azure
+        
+        Args:
+            endpoint_url: Point d'accès Cost Management (ex. serveur local
+                          fake_cloud_apis) ; par défaut AZURE_COST_MANAGEMENT_ENDPOINT
+                          ou management.azure.com
+            max_workers: Nombre de sous-fenêtres de dates interrogées en parallèle
+        """
+        
+        self.endpoint_url = endpoint_url or os.getenv('AZURE_COST_MANAGEMENT_ENDPOINT')
+        self.max_workers = max_workers
         
         # Credentials Azure
         tenant_id = os.getenv('AZURE_TENANT_ID')
@@ -35,22 +51,36 @@ class AzureCostExtractor:
         client_secret = os.getenv('AZURE_CLIENT_SECRET')
         subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
         
-        if not all([tenant_id, client_id, client_secret, subscription_id]):
+        if self.endpoint_url and not subscription_id:
+            raise ValueError("AZURE_SUBSCRIPTION_ID manquant dans .env")
+        if not self.endpoint_url and not all([tenant_id, client_id, client_secret, subscription_id]):
             raise ValueError("Credentials Azure manquants dans .env")
         
-        # Authentification
-        self.credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret
-        )
+        # SDK Azure chargé uniquement quand Azure est configuré
+        from azure.mgmt.costmanagement import CostManagementClient
+        
+        # Authentification (jeton fixe pour un point d'accès de substitution)
+        if self.endpoint_url:
+            self.credential = StaticTokenCredential()
+        else:
+            from azure.identity import ClientSecretCredential
+            self.credential = ClientSecretCredential(
+                tenant_id=tenant_id,
+                client_id=client_id,
+                client_secret=client_secret
+            )
         
         # Client Cost Management
         self.client = CostManagementClient(
             credential=self.credential,
-            base_url='https://management.azure.com'
+            base_url=self.endpoint_url or 'https://management.azure.com'
         )
         
+        # Un point d'accès local peut être servi en HTTP simple
+        self.request_options = {}
+        if self.endpoint_url and self.endpoint_url.startswith('http://'):
+            self.request_options['enforce_https'] = False
+        
         self.subscription_id = subscription_id
         self.scope = f"/subscriptions/{subscription_id}"
     
@@ -58,6 +88,9 @@ class AzureCostExtractor:
         """
         Extrait les coûts Azure pour une période
         
+        La période est découpée en max_workers sous-fenêtres interrogées en
+        parallèle ; chacune suit la pagination de l'API (nextLink).
+        
         Args:
             start_date: Date de début (YYYY-MM-DD)
             end_date: Date de fin (YYYY-MM-DD)
@@ -68,54 +101,24 @@ class AzureCostExtractor:
         
         logger.info(f"☁️  Extraction Azure : {start_date} → {end_date}")
         
+        # La borne `to` d'Azure est incluse : chaque sous-fenêtre s'arrête la veille
+        # du début de la suivante, la dernière garde la fin demandée
+        windows = split_window(start_date, end_date, self.max_workers)
+        periods = [
+            (start, end if i == len(windows) - 1 else
+             (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d'))
+            for i, (start, end) in enumerate(windows)
+        ]
+        
         try:
-            # Définir la requête
-            query = QueryDefinition(
-                type="ActualCost",
-                timeframe=TimeframeType.CUSTOM,
-                time_period=QueryTimePeriod(
-                    from_property=datetime.strptime(start_date, '%Y-%m-%d'),
-                    to=datetime.strptime(end_date, '%Y-%m-%d')
-                ),
-                dataset=QueryDataset(
-                    granularity="Daily",
-                    aggregation={
-                        "totalCost": QueryAggregation(name="Cost", function="Sum")
-                    },
-                    grouping=[
-                        QueryGrouping(type="Dimension", name="ServiceName"),
-                        QueryGrouping(type="Dimension", name="ResourceLocation"),
-                        QueryGrouping(type="Dimension", name="SubscriptionName")
-                    ]
-                )
-            )
-            
-            # Exécuter la requête
             logger.info("⏳ Requête Azure Cost Management en cours...")
-            result = self.client.query.usage(scope=self.scope, parameters=query)
-            
-            # Extraire les données
-            data = []
-            
-            if hasattr(result, 'rows') and result.rows:
-                columns = [col.name for col in result.columns]
-                
-                for row in result.rows:
-                    row_dict = dict(zip(columns, row))
-                    
-                    # Normaliser les données
-                    data.append({
-                        'Date': pd.to_datetime(row_dict.get('UsageDate', row_dict.get('Date'))).strftime('%Y-%m-%d'),
-                        'Cloud': 'Azure',
-                        'Service': row_dict.get('ServiceName', 'Unknown'),
-                        'Region': row_dict.get('ResourceLocation', 'Unknown'),
-                        'AccountName': row_dict.get('SubscriptionName', 'Azure Subscription'),
-                        'AccountId': self.subscription_id,
-                        'Cost': float(row_dict.get('Cost', row_dict.get('totalCost', 0))),
-                        'Currency': row_dict.get('Currency', 'USD')
-                    })
+            if len(periods) == 1:
+                frames = [self._query_usage(*periods[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(periods)) as pool:
+                    frames = list(pool.map(lambda period: self._query_usage(*period), periods))
             
-            df = pd.DataFrame(data)
+            df = pd.concat(frames, ignore_index=True)
             
             if len(df) > 0:
                 logger.info(f"✅ {len(df)} enregistrements Azure extraits")
@@ -128,8 +131,88 @@ class AzureCostExtractor:
         except Exception as e:
             logger.error(f"❌ Erreur extraction Azure : {e}")
             # Retourner un DataFrame vide en cas d'erreur
-            return pd.DataFrame(columns=['Date', 'Cloud', 'Service', 'Region', 
-                                        'AccountName', 'AccountId', 'Cost', 'Currency'])
+            return pd.DataFrame(columns=AZURE_COLUMNS)
+    
+    def _query_usage(self, start_date, end_date):
+        """Interroge Cost Management sur une période en suivant les pages (nextLink)"""
+        
+        from azure.mgmt.costmanagement.models import (
+            QueryDefinition, 
+            QueryTimePeriod, 
+            TimeframeType,
+            QueryDataset,
+            QueryAggregation,
+            QueryGrouping
+        )
+        
+        # Définir la requête
+        query = QueryDefinition(
+            type="ActualCost",
+            timeframe=TimeframeType.CUSTOM,
+            time_period=QueryTimePeriod(
+                from_property=datetime.strptime(start_date, '%Y-%m-%d'),
+                to=datetime.strptime(end_date, '%Y-%m-%d')
+            ),
+            dataset=QueryDataset(
+                granularity="Daily",
+                aggregation={
+                    "totalCost": QueryAggregation(name="Cost", function="Sum")
+                },
+                grouping=[
+                    QueryGrouping(type="Dimension", name="ServiceName"),
+                    QueryGrouping(type="Dimension", name="ResourceLocation"),
+                    QueryGrouping(type="Dimension", name="SubscriptionName")
+                ]
+            )
+        )
+        
+        frames = []
+        params = {}
+        while True:
+            result = self.client.query.usage(
+                scope=self.scope, parameters=query, params=params, **self.request_options
+            )
+            if result is None:
+                break
+            
+            if result.rows:
+                frames.append(self._normalize(result.columns, result.rows))
+            
+            # Page suivante : même requête avec le $skiptoken du nextLink
+            if not result.next_link:
+                break
+            params = {'$skiptoken': parse_qs(urlsplit(result.next_link).query)['$skiptoken'][0]}
+        
+        if not frames:
+            return pd.DataFrame(columns=AZURE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+    
+    def _normalize(self, columns, rows):
+        """Normalise une page de résultats au schéma unifié (colonnes vectorisées)"""
+        
+        page = pd.DataFrame(rows, columns=[col.name for col in columns])
+        
+        def column(*names, default=None):
+            for name in names:
+                if name in page.columns:
+                    return page[name]
+            return default
+        
+        # UsageDate est un entier AAAAMMJJ en granularité journalière
+        dates = pd.to_datetime(column('UsageDate', 'Date').astype(str))
+        
+        df = pd.DataFrame({
+            'Date': dates.dt.strftime('%Y-%m-%d'),
+            'Cloud': 'Azure',
+            'Service': column('ServiceName', default='Unknown'),
+            'Region': column('ResourceLocation', default='Unknown'),
+            'AccountName': column('SubscriptionName', default='Azure Subscription'),
+            'AccountId': self.subscription_id,
+            'Cost': column('Cost', 'totalCost', default=0),
+            'Currency': column('Currency', default='USD')
+        })
+        df['Cost'] = df['Cost'].astype(float)
+        return df
 
 
 def main():
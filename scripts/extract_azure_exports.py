@@ -0,0 +1,393 @@
+"""
+Extraction Azure depuis les exports planifiés Cost Management (CSV vers un stockage blob)
+Lit les fichiers d'export (répertoire local ou conteneur blob, Azurite compris) en flux,
+bloc par bloc, en ne chargeant que les colonnes utiles, et les agrège à la volée au schéma
+du pipeline : pas de pagination ni de quota d'API, le débit est celui du disque.
+Un export « mois en cours » réécrit chaque jour les jours déjà exportés : pour chaque
+export et chaque jour, seules les lignes de l'exécution la plus récente sont retenues
+"""
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_quality import DEFAULT_TAG_KEYS, EXPECTED_COLUMNS, tag_column
+from streaming_aggregation import MAX_PARTIAL_ROWS, StreamingAggregator
+
+
+# Colonnes d'export candidates par champ (schémas EA, MCA et historique ; casse ignorée)
+EXPORT_FIELDS = {
+    'Date': ['Date', 'UsageDate'],
+    'AccountId': ['SubscriptionId', 'SubscriptionGuid'],
+    'AccountName': ['SubscriptionName'],
+    'Service': ['MeterCategory', 'ServiceName'],
+    'ConsumedService': ['ConsumedService'],
+    'Region': ['ResourceLocation', 'Location'],
+    'ResourceId': ['ResourceId', 'InstanceId'],
+    'Cost': ['CostInBillingCurrency', 'Cost', 'PreTaxCost'],
+    'Currency': ['BillingCurrencyCode', 'BillingCurrency', 'Currency'],
+    'ChargeType': ['ChargeType'],
+    'Tags': ['Tags'],
+}
+REQUIRED_FIELDS = ['Date', 'AccountId', 'Cost']
+
+# Types de charges exclus par défaut : les remboursements sont négatifs
+# et seraient mis en quarantaine par le contrôle qualité ; lignes et montant
+# exclus sont affichés dans le résumé de l'extraction
+EXCLUDED_CHARGE_TYPES = ('Refund',)
+
+# Lignes lues par bloc
+DEFAULT_CHUNKSIZE = 100_000
+
+# Répertoire de période d'un export (ex. 20251001-20251031, fin incluse)
+PERIOD_RE = re.compile(r'(\d{8})-(\d{8})')
+DATA_SUFFIXES = ('.csv', '.csv.gz')
+
+
+def export_days(values):
+    """
+    Jour (YYYY-MM-DD) d'une colonne de dates d'export
+
+    Les exports écrivent MM/DD/YYYY (schéma historique) ou une date ISO ; seules
+    les valeurs distinctes, quelques dizaines par fichier, sont analysées.
+    """
+    codes, uniques = pd.factorize(values.fillna(''))
+    uniques = pd.Series(uniques, dtype=object)
+    days = uniques.str[:10]
+    us_format = uniques.str.contains('/', regex=False)
+    if us_format.any():
+        parsed = pd.to_datetime(uniques[us_format].str.split(' ').str[0], format='%m/%d/%Y', errors='coerce')
+        days[us_format] = parsed.dt.strftime('%Y-%m-%d')
+    return pd.Series(days.fillna('').to_numpy()[codes], index=values.index)
+
+
+def tag_pattern(key):
+    """Expression d'une clé dans la colonne Tags ("clé": "valeur", casse ignorée comme Azure)"""
+    return re.compile(r'"' + re.escape(key) + r'"\s*:\s*"((?:[^"\\]|\\.)*)"', re.IGNORECASE)
+
+
+def export_run(relative_path):
+    """
+    (export, période, exécution) d'un fichier d'après son chemin relatif à la source
+
+    Disposition des exports : <export>/<AAAAMMJJ-AAAAMMJJ>/<fichier>.csv (une exécution
+    par fichier) ou <export>/<AAAAMMJJ-AAAAMMJJ>/<id d'exécution>/part_*.csv (exports
+    partitionnés). Sans répertoire de période, chaque fichier est une exécution.
+    """
+    parts = relative_path.split('/')
+    for i, part in enumerate(parts[:-1]):
+        match = PERIOD_RE.fullmatch(part)
+        if match:
+            export = '/'.join(parts[:i])
+            run = '/'.join(parts[:i + 2]) if len(parts) > i + 2 else relative_path
+            return export, match.groups(), run
+    return '/'.join(parts[:-1]), None, relative_path
+
+
+class AzureExportExtractor:
+    """Extracteur de coûts Azure par lecture en flux des exports Cost Management"""
+
+    def __init__(self, source=None, tag_keys=None, chunksize=DEFAULT_CHUNKSIZE,
+                 exclude_charge_types=EXCLUDED_CHARGE_TYPES, max_partial_rows=MAX_PARTIAL_ROWS):
+        """
+        Args:
+            source: Répertoire local ou conteneur blob (az://conteneur/prefix, compte
+                    défini par AZURE_STORAGE_CONNECTION_STRING) ; par défaut AZURE_EXPORT_PATH
+            tag_keys: Clés de tags conservées (colonnes Tag_<clé>)
+            chunksize: Lignes lues par bloc
+            exclude_charge_types: Types de charges ignorés
+            max_partial_rows: Seuil de recompactage des agrégats intermédiaires
+        """
+        self.source = (source or os.getenv('AZURE_EXPORT_PATH') or '').rstrip('/')
+        if not self.source:
+            raise ValueError("Emplacement des exports Azure manquant (AZURE_EXPORT_PATH)")
+
+        self.tag_keys = list(DEFAULT_TAG_KEYS if tag_keys is None else tag_keys)
+        self.tag_columns = [tag_column(key) for key in self.tag_keys]
+        self.tag_patterns = [tag_pattern(key) for key in self.tag_keys]
+        self.chunksize = chunksize
+        self.exclude_charge_types = list(exclude_charge_types or [])
+        self.max_partial_rows = max_partial_rows
+        self.group_keys = ['Date', 'Cloud', 'Service', 'Region', 'AccountName', 'AccountId',
+                           'ResourceId'] + self.tag_columns + ['Currency']
+        self.stats = {}
+        self._container_client = None
+
+    @property
+    def is_blob(self):
+        return self.source.startswith('az://')
+
+    def _container(self):
+        """Client du conteneur blob (SDK chargé seulement pour une source blob)"""
+        if self._container_client is None:
+            from azure.storage.blob import ContainerClient
+            connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+            if not connection_string:
+                raise ValueError("AZURE_STORAGE_CONNECTION_STRING manquant pour une source blob")
+            container, _, _ = self.source[len('az://'):].partition('/')
+            self._container_client = ContainerClient.from_connection_string(connection_string, container)
+        return self._container_client
+
+    def _list_files(self):
+        """
+        Fichiers de données sous la source
+
+        Returns:
+            Liste de (chemin relatif, chemin complet, date de modification, taille en octets)
+        """
+        if self.is_blob:
+            _, _, prefix = self.source[len('az://'):].partition('/')
+            prefix = prefix + '/' if prefix else ''
+            files = [
+                (blob.name[len(prefix):], blob.name, blob.last_modified.timestamp(), blob.size)
+                for blob in self._container().list_blobs(name_starts_with=prefix)
+            ]
+        else:
+            files = []
+            for dirpath, _, names in os.walk(self.source):
+                for name in names:
+                    path = os.path.join(dirpath, name)
+                    relative = os.path.relpath(path, self.source).replace(os.sep, '/')
+                    files.append((relative, path, os.path.getmtime(path), os.path.getsize(path)))
+        return sorted(f for f in files if f[0].endswith(DATA_SUFFIXES))
+
+    @contextmanager
+    def _local_copy(self, path):
+        """Chemin local d'un fichier (copie temporaire pour un blob)"""
+        if not self.is_blob:
+            yield path
+            return
+        tmp_dir = tempfile.mkdtemp(prefix='azure_export_')
+        try:
+            local_path = os.path.join(tmp_dir, os.path.basename(path))
+            with open(local_path, 'wb') as f:
+                self._container().download_blob(path).readinto(f)
+            yield local_path
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def export_runs(self, start_date, end_date):
+        """
+        Exécutions d'export couvrant la fenêtre [start_date, end_date[
+
+        Returns:
+            Liste de (export, jours de la fenêtre couverts par sa période ou None,
+            [(chemin, taille), ...]) de la plus récente à la plus ancienne
+            (date de modification de son dernier fichier)
+        """
+        runs = defaultdict(list)
+        periods = {}
+        for relative, path, modified, size in self._list_files():
+            export, period, run = export_run(relative)
+            days = None
+            if period is not None:
+                period_start = datetime.strptime(period[0], '%Y%m%d').strftime('%Y-%m-%d')
+                period_end = datetime.strptime(period[1], '%Y%m%d').strftime('%Y-%m-%d')
+                if period_end < start_date or period_start >= end_date:
+                    continue
+                days = pd.date_range(max(period_start, start_date), period_end).strftime('%Y-%m-%d')
+                days = frozenset(d for d in days if d < end_date)
+            runs[(export, run)].append((modified, path, size))
+            periods[(export, run)] = days
+
+        ordered = sorted(runs.items(), key=lambda item: (max(f[0] for f in item[1]), item[0][1]), reverse=True)
+        return [
+            (export, periods[(export, run)], [(path, size) for _, path, size in sorted(files)])
+            for (export, run), files in ordered
+        ]
+
+    def _resolve_columns(self, available):
+        """Associe chaque champ à la première colonne d'export disponible (casse ignorée)"""
+        by_lower = {c.lower(): c for c in available}
+        columns = {}
+        for field, candidates in EXPORT_FIELDS.items():
+            found = next((by_lower[c.lower()] for c in candidates if c.lower() in by_lower), None)
+            if found is not None:
+                columns[field] = found
+        missing = [f for f in REQUIRED_FIELDS if f not in columns]
+        if missing:
+            raise ValueError(f"Colonnes d'export obligatoires absentes : {', '.join(missing)}")
+        return columns
+
+    def _read_chunks(self, path):
+        """Itère sur (colonnes résolues, bloc) d'un fichier d'export sans le charger entièrement"""
+        wanted = {c.lower() for candidates in EXPORT_FIELDS.values() for c in candidates}
+        with self._local_copy(path) as local_path:
+            # utf-8-sig : les exports commencent par un BOM
+            reader = pd.read_csv(
+                local_path, usecols=lambda c: c.lower() in wanted, dtype=str,
+                chunksize=self.chunksize, encoding='utf-8-sig',
+                compression='gzip' if path.endswith('.gz') else None
+            )
+            columns = None
+            for chunk in reader:
+                if columns is None:
+                    columns = self._resolve_columns(chunk.columns)
+                yield columns, chunk
+
+    def _tags(self, values):
+        """Colonnes Tag_* extraites du champ Tags (analysé une fois par valeur distincte)"""
+        codes, uniques = pd.factorize(values.fillna(''))
+        uniques = pd.Series(uniques, dtype=object)
+        tags = {}
+        for column, pattern in zip(self.tag_columns, self.tag_patterns):
+            extracted = uniques.str.extract(pattern, expand=False).fillna('')
+            tags[column] = pd.Series(extracted.to_numpy()[codes], index=values.index)
+        return tags
+
+    def _normalize(self, chunk, columns, days, costs):
+        """Ramène un bloc d'export au schéma du pipeline (coûts déjà convertis)"""
+
+        def field(name, default=None):
+            if name in columns:
+                values = chunk[columns[name]]
+                values = values.where(values != '')
+            else:
+                values = pd.Series(None, index=chunk.index, dtype=object)
+            return values if default is None else values.fillna(default)
+
+        # Service : catégorie du compteur, à défaut le fournisseur de ressources
+        account_id = field('AccountId', '')
+        frame = pd.DataFrame({
+            'Date': days,
+            'Cloud': 'Azure',
+            'Service': field('Service').fillna(field('ConsumedService', 'Unknown')),
+            'Region': field('Region', 'Unknown'),
+            'AccountName': field('AccountName').fillna(account_id),
+            'AccountId': account_id,
+            'ResourceId': field('ResourceId', ''),
+            'Currency': field('Currency', 'USD'),
+            'Cost': costs,
+        })
+        tags = self._tags(field('Tags', ''))
+        for column in self.tag_columns:
+            frame[column] = tags[column]
+        return frame
+
+    def extract_costs(self, start_date, end_date):
+        """
+        Extrait les coûts Azure des exports pour une période
+
+        Les exécutions sont lues de la plus récente à la plus ancienne : un jour déjà
+        fourni par une exécution plus récente du même export est ignoré (jour réédité).
+
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin exclue (YYYY-MM-DD)
+
+        Returns:
+            DataFrame au schéma du pipeline + ResourceId et colonnes Tag_*
+        """
+        print(f"📦 Lecture des exports Azure : {self.source}")
+        started = time.perf_counter()
+        runs = self.export_runs(start_date, end_date)
+        self.stats = {'runs': len(runs), 'runs_skipped': 0, 'files': 0, 'bytes': 0, 'rows_read': 0,
+                      'rows_kept': 0, 'rows_restated': 0, 'rows_excluded': 0, 'excluded_cost': 0.0,
+                      'invalid_cost': 0, 'compactions': 0}
+
+        aggregator = StreamingAggregator(self.group_keys, self.max_partial_rows)
+        claimed_days = defaultdict(set)
+        for export, period_days, files in runs:
+            # Tous les jours de la période déjà fournis par des exécutions plus récentes :
+            # l'exécution n'est même pas lue
+            if period_days is not None and period_days <= claimed_days[export]:
+                self.stats['runs_skipped'] += 1
+                continue
+
+            claimed = np.array(sorted(claimed_days[export]), dtype=object)
+            run_days = set()
+            for path, size in files:
+                self.stats['files'] += 1
+                self.stats['bytes'] += size
+                for columns, chunk in self._read_chunks(path):
+                    self.stats['rows_read'] += len(chunk)
+                    days = export_days(chunk[columns['Date']])
+                    keep = ((days >= start_date) & (days < end_date)).to_numpy()
+                    run_days.update(pd.unique(days[keep]))
+
+                    restated = keep & days.isin(claimed).to_numpy()
+                    self.stats['rows_restated'] += int(restated.sum())
+                    keep &= ~restated
+                    costs = pd.to_numeric(chunk[columns['Cost']], errors='coerce')
+                    if 'ChargeType' in columns and self.exclude_charge_types:
+                        excluded = keep & chunk[columns['ChargeType']].isin(self.exclude_charge_types).to_numpy()
+                        self.stats['rows_excluded'] += int(excluded.sum())
+                        self.stats['excluded_cost'] += float(costs[excluded].sum())
+                        keep &= ~excluded
+                    # Coût illisible ou manquant : ligne écartée et comptée, jamais ramenée à 0
+                    invalid = keep & costs.isna().to_numpy()
+                    self.stats['invalid_cost'] += int(invalid.sum())
+                    keep &= ~invalid
+                    if not keep.any():
+                        continue
+
+                    frame = self._normalize(chunk[keep], columns, days[keep], costs[keep])
+                    self.stats['rows_kept'] += len(frame)
+                    aggregator.add(frame)
+            claimed_days[export] |= run_days
+        self.stats['compactions'] = aggregator.compactions
+        if self.stats['rows_excluded']:
+            print(f"➖ Types exclus ({', '.join(self.exclude_charge_types)}) : "
+                  f"{self.stats['rows_excluded']:,} lignes, ${self.stats['excluded_cost']:,.2f}")
+        if self.stats['invalid_cost']:
+            print(f"⚠️  Coût illisible ou manquant : {self.stats['invalid_cost']:,} lignes écartées")
+
+        output_columns = EXPECTED_COLUMNS + ['ResourceId'] + self.tag_columns
+        if not aggregator.partials:
+            print("⚠️  Aucune ligne d'export Azure dans la fenêtre demandée")
+            return pd.DataFrame(columns=output_columns)
+
+        result = aggregator.result()[output_columns]
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ {self.stats['runs']} exécution(s) ({self.stats['runs_skipped']} entièrement rééditées), "
+              f"{self.stats['files']} fichier(s) lus, "
+              f"{self.stats['rows_read']:,} lignes lues ({self.stats['rows_restated']:,} rééditées), "
+              f"{len(result):,} lignes agrégées")
+        print(f"⏱️  {self.stats['bytes'] / 1e6 / elapsed:,.1f} Mo/s, "
+              f"{self.stats['rows_read'] / elapsed:,.0f} lignes/s")
+        print(f"💰 Coût total Azure (exports) : ${result['Cost'].sum():,.2f}")
+        return result
+
+
+def main():
+    """Extraction autonome des exports Azure vers un fichier horodaté de data/raw/"""
+
+    parser = argparse.ArgumentParser(description="Extraction des coûts Azure depuis les exports Cost Management")
+    parser.add_argument('--source', help="Répertoire local ou az://conteneur/prefix (défaut : AZURE_EXPORT_PATH)")
+    parser.add_argument('--days', type=int, default=30, help="Taille de la fenêtre en jours")
+    parser.add_argument('--tags', nargs='*', help="Clés de tags à conserver")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    print("="*60)
+    print("📦 EXTRACTION AZURE (EXPORTS)")
+    print("="*60 + "\n")
+
+    end = datetime.now() + timedelta(days=1)
+    start_str = (end - timedelta(days=args.days)).strftime('%Y-%m-%d')
+    end_str = end.strftime('%Y-%m-%d')
+    print(f"📅 Période d'extraction : {start_str} → {end_str}\n")
+
+    extractor = AzureExportExtractor(args.source, tag_keys=args.tags, chunksize=args.chunksize)
+    df = extractor.extract_costs(start_str, end_str)
+
+    raw_dir = os.path.join('data', 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+    filepath = os.path.join(raw_dir, f"azure_export_costs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    df.to_csv(filepath, index=False)
+    print(f"\n💾 Données sauvegardées : {filepath}")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,35 +3,52 @@ Script d'extraction des coûts cloud
 Peut utiliser soit des données AWS réelles, soit des données simulées
 """
 
-import boto3
 import pandas as pd
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from data_simulator import generate_sample_data
+from partitions import split_window
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Colonnes produites par l'extraction Cost Explorer
+AWS_COLUMNS = ['Date', 'Cloud', 'Service', 'Region', 'Cost', 'Currency']
+
 
 class CostExtractor:
     """Classe pour extraire les coûts depuis AWS ou données simulées"""
     
-    def __init__(self, use_simulation=True):
+    def __init__(self, use_simulation=True, endpoint_url=None, max_workers=1):
         """
         Args:
             use_simulation: Si True, utilise des données simulées
                           Si False, utilise l'API AWS Cost Explorer
+            endpoint_url: Point d'accès Cost Explorer (ex. serveur local
+                          fake_cloud_apis) ; par défaut AWS_CE_ENDPOINT_URL ou AWS
+            max_workers: Nombre de sous-fenêtres de dates interrogées en parallèle
         """
         self.use_simulation = use_simulation
+        self.endpoint_url = endpoint_url or os.getenv('AWS_CE_ENDPOINT_URL')
+        self.max_workers = max_workers
         
         if not use_simulation:
-            # Initialiser le client AWS
+            # Initialiser le client AWS (boto3 chargé seulement en mode réel)
+            # Mode de relance « standard » : le mode historique de botocore ne
+            # relance pas LimitExceededException, l'erreur de limitation de Cost Explorer
+            import boto3
+            from botocore.config import Config
             self.client = boto3.client(
                 'ce',
                 aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                 aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_REGION', 'us-east-1')
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=self.endpoint_url,
+                config=Config(
+                    max_pool_connections=max(10, max_workers),
+                    retries={'mode': 'standard', 'max_attempts': 10}
+                )
             )
     
     def extract_costs(self, start_date, end_date, granularity='DAILY'):
@@ -57,13 +74,15 @@ class CostExtractor:
     def _extract_simulated_costs(self, start_date, end_date):
         """Extrait des données simulées"""
         
+        from data_simulator import generate_sample_data
+        
         # Calculer le nombre de mois
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
         months = ((end.year - start.year) * 12 + end.month - start.month) + 1
         
-        # Générer les données
-        daily_costs, monthly_costs = generate_sample_data(months=months)
+        # Générer les données (ancrées sur la fin de période pour les backfills)
+        daily_costs, monthly_costs = generate_sample_data(months=months, end_date=end)
         
         # Filtrer par dates
         daily_costs['Date'] = pd.to_datetime(daily_costs['Date'])
@@ -72,49 +91,67 @@ class CostExtractor:
         return daily_costs[mask].reset_index(drop=True)
     
     def _extract_aws_costs(self, start_date, end_date, granularity):
-        """Extrait les données depuis AWS Cost Explorer"""
+        """
+        Extrait les données depuis AWS Cost Explorer
+        
+        En granularité journalière, la fenêtre est découpée en max_workers
+        sous-fenêtres interrogées en parallèle (chacune suit sa pagination).
+        """
         
         try:
-            response = self.client.get_cost_and_usage(
-                TimePeriod={
-                    'Start': start_date,
-                    'End': end_date
-                },
-                Granularity=granularity,
-                Metrics=['UnblendedCost'],
-                GroupBy=[
-                    {'Type': 'DIMENSION', 'Key': 'SERVICE'},
-                    {'Type': 'DIMENSION', 'Key': 'REGION'}
-                ]
-            )
+            parts = self.max_workers if granularity == 'DAILY' else 1
+            windows = split_window(start_date, end_date, parts)
             
-            # Transformer la réponse en DataFrame
-            data = []
-            for result in response['ResultsByTime']:
-                date = result['TimePeriod']['Start']
-                
-                for group in result['Groups']:
-                    service = group['Keys'][0]
-                    region = group['Keys'][1]
-                    cost = float(group['Metrics']['UnblendedCost']['Amount'])
-                    
-                    data.append({
-                        'Date': date,
-                        'Cloud': 'AWS',  
-                        'Service': service,
-                        'Region': region,
-                        'Cost': cost,
-                        'Currency': 'USD'
-                    })
+            if len(windows) == 1:
+                frames = [self._query_cost_explorer(start_date, end_date, granularity)]
+            else:
+                with ThreadPoolExecutor(max_workers=len(windows)) as pool:
+                    frames = list(pool.map(
+                        lambda window: self._query_cost_explorer(*window, granularity), windows
+                    ))
             
-            df = pd.DataFrame(data)
-            return df
+            return pd.concat(frames, ignore_index=True)
             
         except Exception as e:
             print(f"❌ Erreur lors de l'extraction AWS : {e}")
             print("🔄 Basculement sur les données simulées...")
             return self._extract_simulated_costs(start_date, end_date)
     
+    def _query_cost_explorer(self, start_date, end_date, granularity):
+        """Interroge Cost Explorer sur une fenêtre en suivant les pages (NextPageToken)"""
+        
+        request = {
+            'TimePeriod': {
+                'Start': start_date,
+                'End': end_date
+            },
+            'Granularity': granularity,
+            'Metrics': ['UnblendedCost'],
+            'GroupBy': [
+                {'Type': 'DIMENSION', 'Key': 'SERVICE'},
+                {'Type': 'DIMENSION', 'Key': 'REGION'}
+            ]
+        }
+        
+        # Transformer les réponses en DataFrame
+        data = []
+        while True:
+            response = self.client.get_cost_and_usage(**request)
+            
+            for result in response['ResultsByTime']:
+                date = result['TimePeriod']['Start']
+                
+                for group in result['Groups']:
+                    service, region = group['Keys'][0], group['Keys'][1]
+                    metric = group['Metrics']['UnblendedCost']
+                    data.append((date, 'AWS', service, region,
+                                 float(metric['Amount']), metric.get('Unit', 'USD')))
+            
+            token = response.get('NextPageToken')
+            if not token:
+                return pd.DataFrame(data, columns=AWS_COLUMNS)
+            request['NextPageToken'] = token
+    
     def save_to_csv(self, df, filename):
         """Sauvegarde les données dans un fichier CSV"""
         
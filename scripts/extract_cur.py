@@ -0,0 +1,361 @@
+"""
+Extraction AWS depuis les exports CUR (Cost and Usage Report)
+Lit les fichiers CUR (CSV gzip ou Parquet, répertoire local ou S3) en flux, bloc par bloc,
+en ne chargeant que les colonnes utiles, et les agrège à la volée au schéma du pipeline
+(jour × compte × service × région × ressource × tags) : mémoire bornée par le nombre de
+groupes distincts, pas par la taille des fichiers
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from data_quality import DEFAULT_TAG_KEYS, EXPECTED_COLUMNS, tag_column
+from streaming_aggregation import MAX_PARTIAL_ROWS, StreamingAggregator
+
+
+# Colonnes CUR candidates par champ : format CSV (catégorie/nom) puis Parquet (snake_case)
+CUR_FIELDS = {
+    'Date': ['lineItem/UsageStartDate', 'line_item_usage_start_date'],
+    'AccountId': ['lineItem/UsageAccountId', 'line_item_usage_account_id'],
+    'AccountName': ['lineItem/UsageAccountName', 'line_item_usage_account_name'],
+    'ProductName': ['product/ProductName', 'product_product_name'],
+    'ProductCode': ['lineItem/ProductCode', 'line_item_product_code'],
+    'Region': ['product/region', 'product_region', 'product/regionCode', 'product_region_code'],
+    'ResourceId': ['lineItem/ResourceId', 'line_item_resource_id'],
+    'Cost': ['lineItem/UnblendedCost', 'line_item_unblended_cost'],
+    'Currency': ['lineItem/CurrencyCode', 'line_item_currency_code'],
+    'LineItemType': ['lineItem/LineItemType', 'line_item_line_item_type'],
+}
+REQUIRED_FIELDS = ['Date', 'AccountId', 'Cost']
+
+# Types de lignes exclus par défaut : les crédits et remboursements sont négatifs
+# et seraient mis en quarantaine par le contrôle qualité. Cost Explorer (UnblendedCost)
+# les inclut : lignes et montant exclus sont affichés dans le résumé de l'extraction
+EXCLUDED_LINE_ITEM_TYPES = ('Credit', 'Refund')
+
+# Lignes lues par bloc (CSV) ou par lot (Parquet)
+DEFAULT_CHUNKSIZE = 100_000
+
+# Répertoire de période des manifestes CUR (ex. 20251001-20251101)
+PERIOD_RE = re.compile(r'\d{8}-\d{8}')
+DATA_SUFFIXES = ('.csv', '.csv.gz', '.parquet')
+
+
+def tag_candidates(key):
+    """Colonnes CUR possibles d'un tag utilisateur (CSV puis Parquet)"""
+    key = key[len('user:'):] if key.startswith('user:') else key
+    snake = re.sub(r'[^0-9a-z]+', '_', key.lower()).strip('_')
+    return [f'resourceTags/user:{key}', f'resource_tags_user_{snake}']
+
+
+def usage_days(values):
+    """Jour d'usage (YYYY-MM-DD) d'une colonne texte ISO ou horodatée"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            values = values.dt.tz_convert(None)
+        days = values.to_numpy().astype('datetime64[D]').astype(str)
+        return pd.Series(days, index=values.index)
+    return values.str[:10]
+
+
+class CurExtractor:
+    """Extracteur de coûts AWS par lecture en flux des exports CUR"""
+
+    def __init__(self, source=None, tag_keys=None, chunksize=DEFAULT_CHUNKSIZE,
+                 exclude_line_item_types=EXCLUDED_LINE_ITEM_TYPES, max_partial_rows=MAX_PARTIAL_ROWS):
+        """
+        Args:
+            source: Répertoire local ou préfixe S3 (s3://bucket/prefix) des exports CUR ;
+                    par défaut AWS_CUR_PATH
+            tag_keys: Clés de tags utilisateur conservées (colonnes Tag_<clé>)
+            chunksize: Lignes lues par bloc
+            exclude_line_item_types: Types de lignes CUR ignorés
+            max_partial_rows: Seuil de recompactage des agrégats intermédiaires
+        """
+        self.source = source or os.getenv('AWS_CUR_PATH')
+        if not self.source:
+            raise ValueError("Emplacement des exports CUR manquant (AWS_CUR_PATH)")
+
+        self.tag_keys = list(DEFAULT_TAG_KEYS if tag_keys is None else tag_keys)
+        self.tag_columns = [tag_column(key) for key in self.tag_keys]
+        self.chunksize = chunksize
+        self.exclude_line_item_types = list(exclude_line_item_types or [])
+        self.max_partial_rows = max_partial_rows
+        self.group_keys = ['Date', 'Cloud', 'Service', 'Region', 'AccountName', 'AccountId',
+                           'ResourceId'] + self.tag_columns + ['Currency']
+        self.stats = {}
+        self._s3_client = None
+
+    @property
+    def is_s3(self):
+        return self.source.startswith('s3://')
+
+    def _s3(self):
+        """Client S3 (boto3 chargé seulement pour une source S3)"""
+        if self._s3_client is None:
+            import boto3
+            self._s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+        return self._s3_client
+
+    @staticmethod
+    def _split_s3(path):
+        bucket, _, key = path[len('s3://'):].partition('/')
+        return bucket, key
+
+    def _list_files(self):
+        """Chemins de tous les fichiers sous la source, triés"""
+        if self.is_s3:
+            bucket, prefix = self._split_s3(self.source)
+            paginator = self._s3().get_paginator('list_objects_v2')
+            paths = [
+                f"s3://{bucket}/{obj['Key']}"
+                for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+                for obj in page.get('Contents', [])
+            ]
+        else:
+            paths = [
+                os.path.join(dirpath, name)
+                for dirpath, _, names in os.walk(self.source) for name in names
+            ]
+        return sorted(paths)
+
+    def _open(self, path):
+        """Flux binaire d'un fichier (corps S3 lu au fil de l'eau, sans copie locale)"""
+        if self.is_s3:
+            bucket, key = self._split_s3(path)
+            return closing(self._s3().get_object(Bucket=bucket, Key=key)['Body'])
+        return open(path, 'rb')
+
+    @contextmanager
+    def _local_copy(self, path):
+        """Chemin local d'un fichier (copie temporaire pour un objet S3, lu par Parquet)"""
+        if not self.is_s3:
+            yield path
+            return
+        tmp_dir = tempfile.mkdtemp(prefix='cur_')
+        try:
+            local_path = os.path.join(tmp_dir, os.path.basename(path))
+            bucket, key = self._split_s3(path)
+            self._s3().download_file(bucket, key, local_path)
+            yield local_path
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _resolve_key(self, key, paths):
+        """Chemin d'une clé de manifeste (clé du bucket, ou suffixe le plus long en local)"""
+        if self.is_s3:
+            bucket, _ = self._split_s3(self.source)
+            return f"s3://{bucket}/{key}"
+        parts = key.split('/')
+        for i in range(len(parts)):
+            candidate = os.path.join(self.source, *parts[i:])
+            if candidate in paths:
+                return candidate
+        raise FileNotFoundError(f"Fichier du manifeste CUR introuvable : {key}")
+
+    def report_files(self, start_date, end_date):
+        """
+        Fichiers de données CUR couvrant la fenêtre [start_date, end_date[
+
+        Si des manifestes de période sont présents, seuls les fichiers de la dernière
+        version de chaque période chevauchant la fenêtre sont retenus ; sinon tous
+        les fichiers de données de la source (les lignes sont filtrées par date).
+        """
+        paths = self._list_files()
+        manifests = [
+            p for p in paths
+            if p.endswith('-Manifest.json') and PERIOD_RE.fullmatch(os.path.basename(os.path.dirname(p)))
+        ]
+        if not manifests:
+            return [p for p in paths if p.endswith(DATA_SUFFIXES)]
+
+        path_set = set(paths)
+        files = []
+        for manifest_path in manifests:
+            with self._open(manifest_path) as f:
+                manifest = json.load(f)
+            period = manifest.get('billingPeriod', {})
+            period_start = datetime.strptime(period['start'][:8], '%Y%m%d').strftime('%Y-%m-%d')
+            period_end = datetime.strptime(period['end'][:8], '%Y%m%d').strftime('%Y-%m-%d')
+            if period_end <= start_date or period_start >= end_date:
+                continue
+            files += [self._resolve_key(key, path_set) for key in manifest.get('reportKeys', [])]
+        return files
+
+    def _resolve_columns(self, available):
+        """Associe chaque champ (et tag) à la première colonne CUR disponible"""
+        available = set(available)
+        columns = {}
+        for field, candidates in CUR_FIELDS.items():
+            found = next((c for c in candidates if c in available), None)
+            if found is not None:
+                columns[field] = found
+        for key, column in zip(self.tag_keys, self.tag_columns):
+            found = next((c for c in tag_candidates(key) if c in available), None)
+            if found is not None:
+                columns[column] = found
+        missing = [f for f in REQUIRED_FIELDS if f not in columns]
+        if missing:
+            raise ValueError(f"Colonnes CUR obligatoires absentes : {', '.join(missing)}")
+        return columns
+
+    def _wanted_columns(self):
+        """Toutes les colonnes CUR susceptibles d'être lues"""
+        wanted = {c for candidates in CUR_FIELDS.values() for c in candidates}
+        for key in self.tag_keys:
+            wanted.update(tag_candidates(key))
+        return wanted
+
+    def _read_chunks(self, path):
+        """Itère sur (colonnes résolues, bloc) d'un fichier CUR sans le charger entièrement"""
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("pyarrow est requis pour lire les CUR Parquet") from e
+            with self._local_copy(path) as local_path:
+                parquet_file = pq.ParquetFile(local_path)
+                columns = self._resolve_columns(parquet_file.schema_arrow.names)
+                for batch in parquet_file.iter_batches(
+                    batch_size=self.chunksize, columns=sorted(set(columns.values()))
+                ):
+                    yield columns, batch.to_pandas()
+            return
+
+        wanted = self._wanted_columns()
+        with self._open(path) as f:
+            reader = pd.read_csv(
+                f, usecols=lambda c: c in wanted, dtype=str, chunksize=self.chunksize,
+                compression='gzip' if path.endswith('.gz') else None
+            )
+            columns = None
+            for chunk in reader:
+                if columns is None:
+                    columns = self._resolve_columns(chunk.columns)
+                yield columns, chunk
+
+    def _normalize(self, chunk, columns, start_date, end_date):
+        """Ramène un bloc CUR au schéma du pipeline (lignes de la fenêtre uniquement)"""
+        days = usage_days(chunk[columns['Date']])
+        keep = ((days >= start_date) & (days < end_date)).to_numpy()
+        costs = pd.to_numeric(chunk[columns['Cost']], errors='coerce')
+        if 'LineItemType' in columns and self.exclude_line_item_types:
+            excluded = keep & chunk[columns['LineItemType']].isin(self.exclude_line_item_types).to_numpy()
+            self.stats['rows_excluded'] += int(excluded.sum())
+            self.stats['excluded_cost'] += float(costs[excluded].sum())
+            keep &= ~excluded
+        # Coût illisible ou manquant : ligne écartée et comptée, jamais ramenée à 0
+        invalid = keep & costs.isna().to_numpy()
+        self.stats['invalid_cost'] += int(invalid.sum())
+        keep &= ~invalid
+        chunk, days, costs = chunk[keep], days[keep], costs[keep]
+
+        def field(name, default=None):
+            if name in columns:
+                values = chunk[columns[name]]
+                values = values.where(values != '')
+            else:
+                values = pd.Series(None, index=chunk.index, dtype=object)
+            return values if default is None else values.fillna(default)
+
+        # Service : nom du produit, à défaut son code (taxes, frais sans produit)
+        account_id = field('AccountId', '')
+        frame = pd.DataFrame({
+            'Date': days,
+            'Cloud': 'AWS',
+            'Service': field('ProductName').fillna(field('ProductCode', 'Unknown')),
+            'Region': field('Region', 'global'),
+            'AccountName': field('AccountName').fillna(account_id),
+            'AccountId': account_id,
+            'ResourceId': field('ResourceId', ''),
+            'Currency': field('Currency', 'USD'),
+            'Cost': costs,
+        })
+        for column in self.tag_columns:
+            frame[column] = field(column, '')
+        return frame
+
+    def extract_costs(self, start_date, end_date):
+        """
+        Extrait les coûts AWS des exports CUR pour une période
+
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin exclue (YYYY-MM-DD), comme Cost Explorer
+
+        Returns:
+            DataFrame au schéma du pipeline + ResourceId et colonnes Tag_*
+        """
+        print(f"📦 Lecture des exports CUR : {self.source}")
+        files = self.report_files(start_date, end_date)
+        self.stats = {'files': len(files), 'rows_read': 0, 'rows_kept': 0, 'rows_excluded': 0,
+                      'excluded_cost': 0.0, 'invalid_cost': 0, 'compactions': 0}
+
+        aggregator = StreamingAggregator(self.group_keys, self.max_partial_rows)
+        for path in files:
+            for columns, chunk in self._read_chunks(path):
+                self.stats['rows_read'] += len(chunk)
+                frame = self._normalize(chunk, columns, start_date, end_date)
+                self.stats['rows_kept'] += len(frame)
+                aggregator.add(frame)
+        self.stats['compactions'] = aggregator.compactions
+        if self.stats['rows_excluded']:
+            print(f"➖ Types exclus ({', '.join(self.exclude_line_item_types)}) : "
+                  f"{self.stats['rows_excluded']:,} lignes, ${self.stats['excluded_cost']:,.2f} "
+                  f"(inclus dans l'UnblendedCost de Cost Explorer)")
+        if self.stats['invalid_cost']:
+            print(f"⚠️  Coût illisible ou manquant : {self.stats['invalid_cost']:,} lignes écartées")
+
+        output_columns = EXPECTED_COLUMNS + ['ResourceId'] + self.tag_columns
+        if not aggregator.partials:
+            print("⚠️  Aucune ligne CUR dans la fenêtre demandée")
+            return pd.DataFrame(columns=output_columns)
+
+        result = aggregator.result()[output_columns]
+
+        print(f"✅ {self.stats['files']} fichier(s), {self.stats['rows_read']:,} lignes lues, "
+              f"{len(result):,} lignes agrégées")
+        print(f"💰 Coût total CUR : ${result['Cost'].sum():,.2f}")
+        return result
+
+
+def main():
+    """Extraction CUR autonome vers un fichier horodaté de data/raw/"""
+
+    parser = argparse.ArgumentParser(description="Extraction des coûts AWS depuis les exports CUR")
+    parser.add_argument('--source', help="Répertoire local ou s3://bucket/prefix (défaut : AWS_CUR_PATH)")
+    parser.add_argument('--days', type=int, default=30, help="Taille de la fenêtre en jours")
+    parser.add_argument('--tags', nargs='*', help="Clés de tags utilisateur à conserver")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    print("="*60)
+    print("📦 EXTRACTION AWS CUR")
+    print("="*60 + "\n")
+
+    end = datetime.now() + timedelta(days=1)
+    start_str = (end - timedelta(days=args.days)).strftime('%Y-%m-%d')
+    end_str = end.strftime('%Y-%m-%d')
+    print(f"📅 Période d'extraction : {start_str} → {end_str}\n")
+
+    extractor = CurExtractor(args.source, tag_keys=args.tags, chunksize=args.chunksize)
+    df = extractor.extract_costs(start_str, end_str)
+
+    raw_dir = os.path.join('data', 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+    filepath = os.path.join(raw_dir, f"aws_cur_costs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    df.to_csv(filepath, index=False)
+    print(f"\n💾 Données sauvegardées : {filepath}")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
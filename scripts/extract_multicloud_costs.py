@@ -4,25 +4,60 @@ Extracteur unifié multi-cloud : AWS + Azure
 
 import pandas as pd
 from datetime import datetime, timedelta
+import argparse
 import os
 from extract_costs import CostExtractor as AWSExtractor
 from extract_azure_costs import AzureCostExtractor
+from partitions import RAW_DIR, partition_dir, extraction_window, write_csv_atomic
+from raw_store import CONFIGURATION_ERROR, NO_DATA, NOT_CONFIGURED, store_available, upsert
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sources possibles des coûts AWS et Azure
+AWS_SOURCES = ('cost_explorer', 'cur')
+AZURE_SOURCES = ('query', 'export')
+
 
 class MultiCloudExtractor:
     """Extracteur unifié AWS + Azure"""
     
-    def __init__(self, use_simulation=False):
+    def __init__(self, use_simulation=False, aws_source=None, cur_path=None,
+                 azure_source=None, azure_export_path=None):
+        """
+        Args:
+            use_simulation: Si True, utilise des données AWS simulées
+            aws_source: Source des coûts AWS : 'cost_explorer' (API, défaut) ou 'cur'
+                        (exports Cost and Usage Report) ; par défaut AWS_COST_SOURCE
+            cur_path: Répertoire local ou s3://bucket/prefix des exports CUR
+            azure_source: Source des coûts Azure : 'query' (API Cost Management, défaut)
+                          ou 'export' (exports planifiés) ; par défaut AZURE_COST_SOURCE
+            azure_export_path: Répertoire local ou az://conteneur/prefix des exports Azure
+        """
         self.use_simulation = use_simulation
-        self.aws_extractor = AWSExtractor(use_simulation=use_simulation)
+        self.aws_source = aws_source or os.getenv('AWS_COST_SOURCE', 'cost_explorer')
+        if self.aws_source not in AWS_SOURCES:
+            raise ValueError(f"Source AWS inconnue : {self.aws_source}")
+        self.azure_source = azure_source or os.getenv('AZURE_COST_SOURCE', 'query')
+        if self.azure_source not in AZURE_SOURCES:
+            raise ValueError(f"Source Azure inconnue : {self.azure_source}")
+        
+        if self.aws_source == 'cur' and not use_simulation:
+            # CUR : détail par ressource et tags, lu en flux (pas de quota d'API)
+            from extract_cur import CurExtractor
+            self.aws_extractor = CurExtractor(cur_path)
+        else:
+            self.aws_extractor = AWSExtractor(use_simulation=use_simulation)
         
         # Tenter d'initialiser Azure (optionnel si credentials manquants)
         try:
-            self.azure_extractor = AzureCostExtractor()
+            if self.azure_source == 'export':
+                # Exports : détail par ressource et tags, lu en flux (pas de quota d'API)
+                from extract_azure_exports import AzureExportExtractor
+                self.azure_extractor = AzureExportExtractor(azure_export_path)
+            else:
+                self.azure_extractor = AzureCostExtractor()
             self.azure_enabled = True
         except Exception as e:
             logger.warning(f"⚠️  Azure non configuré : {e}")
@@ -70,7 +105,7 @@ class MultiCloudExtractor:
                     azure_placeholder = pd.DataFrame([{
                         'Date': start_date,
                         'Cloud': 'Azure',
-                        'Service': 'No Data',
+                        'Service': NO_DATA,
                         'Region': 'N/A',
                         'AccountName': 'Azure Subscription',
                         'AccountId': 'azure-sub-1',
@@ -84,7 +119,7 @@ class MultiCloudExtractor:
                 azure_placeholder = pd.DataFrame([{
                     'Date': start_date,
                     'Cloud': 'Azure',
-                    'Service': 'Configuration Error',
+                    'Service': CONFIGURATION_ERROR,
                     'Region': 'N/A',
                     'AccountName': 'Azure Subscription',
                     'AccountId': 'azure-sub-1',
@@ -97,7 +132,7 @@ class MultiCloudExtractor:
             azure_placeholder = pd.DataFrame([{
                 'Date': start_date,
                 'Cloud': 'Azure',
-                'Service': 'Not Configured',
+                'Service': NOT_CONFIGURED,
                 'Region': 'N/A',
                 'AccountName': 'Azure Subscription',
                 'AccountId': 'not-configured',
@@ -138,29 +173,82 @@ class MultiCloudExtractor:
         filepath = os.path.join(raw_dir, filename)
         df.to_csv(filepath, index=False)
         logger.info(f"\n💾 Données sauvegardées : {filepath}")
+    
+    def save_partition(self, df, ds):
+        """
+        Sauvegarde les données dans la partition de la date logique ds
+        
+        Le fichier est remplacé atomiquement : une re-exécution du même
+        intervalle écrase la partition au lieu de créer un nouveau fichier.
+        """
+        filepath = os.path.join(partition_dir(RAW_DIR, ds), 'multicloud_costs.csv')
+        write_csv_atomic(df, filepath, index=False)
+        logger.info(f"\n💾 Partition sauvegardée : {filepath}")
+        return filepath
 
 
-def main():
-    """Extraction multi-cloud complète"""
+def main(ds=None, lookback_days=30, aws_source=None, cur_path=None,
+         azure_source=None, azure_export_path=None):
+    """
+    Extraction multi-cloud complète
+    
+    Args:
+        ds: Date logique (YYYY-MM-DD) de l'intervalle Airflow.
+            Si None, extrait les derniers jours vers un fichier horodaté.
+        lookback_days: Taille de la fenêtre d'extraction en jours
+        aws_source: 'cost_explorer' ou 'cur' (défaut : AWS_COST_SOURCE)
+        cur_path: Emplacement des exports CUR (défaut : AWS_CUR_PATH)
+        azure_source: 'query' ou 'export' (défaut : AZURE_COST_SOURCE)
+        azure_export_path: Emplacement des exports Azure (défaut : AZURE_EXPORT_PATH)
+    """
     
     USE_SIMULATION = False  # Changez selon vos besoins
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
     
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+    if ds is not None:
+        start_str, end_str = extraction_window(ds, lookback_days)
+    else:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=lookback_days)
+        start_str = start_date.strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d')
     
-    extractor = MultiCloudExtractor(use_simulation=USE_SIMULATION)
+    extractor = MultiCloudExtractor(
+        use_simulation=USE_SIMULATION, aws_source=aws_source, cur_path=cur_path,
+        azure_source=azure_source, azure_export_path=azure_export_path
+    )
     df = extractor.extract_all_clouds(start_str, end_str)
     
     if len(df) > 0:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'multicloud_costs_{timestamp}.csv'
-        extractor.save_to_csv(df, filename)
+        if ds is not None:
+            extractor.save_partition(df, ds)
+        else:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f'multicloud_costs_{timestamp}.csv'
+            extractor.save_to_csv(df, filename)
+        
+        # Fenêtres glissantes qui se chevauchent : les jours extraits remplacent ceux du magasin brut
+        if store_available():
+            stats = upsert(df)
+            logger.info(f"🗄️  Magasin brut : {stats['inserted']:,} insérées, {stats['updated']:,} mises à jour, "
+                        f"{stats['unchanged']:,} inchangées, {stats['removed']:,} supprimées "
+                        f"({stats['months_written']} mois réécrits)")
         print("\n✅ Extraction multi-cloud terminée avec succès !")
     else:
         print("\n❌ Aucune donnée extraite")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Extraction multi-cloud AWS + Azure")
+    parser.add_argument('--ds', help="Date logique de l'intervalle (YYYY-MM-DD)")
+    parser.add_argument('--lookback-days', type=int, default=30,
+                        help="Taille de la fenêtre d'extraction en jours")
+    parser.add_argument('--aws-source', choices=AWS_SOURCES,
+                        help="Source des coûts AWS (défaut : AWS_COST_SOURCE ou cost_explorer)")
+    parser.add_argument('--cur-path', help="Exports CUR : répertoire local ou s3://bucket/prefix")
+    parser.add_argument('--azure-source', choices=AZURE_SOURCES,
+                        help="Source des coûts Azure (défaut : AZURE_COST_SOURCE ou query)")
+    parser.add_argument('--azure-export-path', help="Exports Azure : répertoire local ou az://conteneur/prefix")
+    args = parser.parse_args()
+    main(ds=args.ds, lookback_days=args.lookback_days,
+         aws_source=args.aws_source, cur_path=args.cur_path,
+         azure_source=args.azure_source, azure_export_path=args.azure_export_path)
@@ -0,0 +1,397 @@
+"""
+Serveur local de substitution pour AWS Cost Explorer et Azure Cost Management
+Sert des réponses paginées réalistes (GetCostAndUsage, requête Cost Management) à partir
+du simulateur, avec latence, taille de page et limitation de débit configurables :
+permet de tester la charge des extracteurs sans appeler les API facturées
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from data_simulator import CloudCostSimulator
+
+
+# Opération Cost Explorer (protocole JSON 1.1, en-tête X-Amz-Target)
+AWS_TARGET = 'AWSInsightsIndexService.GetCostAndUsage'
+
+# Route de la requête Cost Management (précédée du scope)
+AZURE_QUERY_PATH = '/providers/Microsoft.CostManagement/query'
+
+# Dimensions de regroupement acceptées → colonnes des données simulées
+AWS_DIMENSIONS = {'SERVICE': 'Service', 'REGION': 'Region', 'LINKED_ACCOUNT': 'AccountId'}
+AZURE_DIMENSIONS = {
+    'ServiceName': 'Service',
+    'ResourceLocation': 'Region',
+    'SubscriptionName': 'AccountName',
+    'SubscriptionId': 'AccountId',
+}
+
+# Catalogue Azure substitué au catalogue AWS du simulateur
+AZURE_PROFILE = {
+    'service_base_costs': {
+        'Virtual Machines': 14.0,
+        'Storage': 4.0,
+        'Azure SQL Database': 9.0,
+        'Azure App Service': 6.0,
+        'Azure Kubernetes Service': 11.0,
+        'Bandwidth': 3.0,
+        'Azure Monitor': 1.5,
+    },
+    'regions': ['westeurope', 'northeurope', 'francecentral', 'eastus'],
+    'accounts': {
+        'azure-sub-1': 'Production',
+        'azure-sub-2': 'Development',
+    },
+}
+
+
+def simulate_cloud_costs(cloud, start_date, end_date, scale=1, seed=42):
+    """
+    Coûts journaliers simulés d'un cloud (une ligne par jour × service × compte)
+
+    Args:
+        cloud: 'AWS' ou 'Azure' (catalogue de services, régions et comptes)
+        start_date, end_date: Bornes incluses de la période simulée
+        scale: Multiplie le catalogue de services (volume et nombre de pages)
+        seed: Graine du générateur (données identiques d'un lancement à l'autre)
+    """
+    simulator = CloudCostSimulator(start_date, end_date)
+    if cloud == 'Azure':
+        simulator.service_base_costs = dict(AZURE_PROFILE['service_base_costs'])
+        simulator.regions = list(AZURE_PROFILE['regions'])
+        simulator.accounts = dict(AZURE_PROFILE['accounts'])
+    if scale > 1:
+        simulator.service_base_costs = {
+            (f'{name} #{i}' if i else name): cost
+            for i in range(scale) for name, cost in simulator.service_base_costs.items()
+        }
+    simulator.services = list(simulator.service_base_costs)
+
+    state = random.getstate()
+    random.seed(f'{cloud}-{seed}')
+    try:
+        return simulator.generate_daily_costs()
+    finally:
+        random.setstate(state)
+
+
+class TokenBucket:
+    """Limiteur de débit (requêtes par seconde, rafale égale au débit)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Consomme un jeton
+
+        Returns:
+            0 si la requête est acceptée, sinon le délai (s) avant le prochain jeton
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+def encode_token(offset):
+    """Jeton de pagination opaque (position dans le résultat)"""
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode()).decode()
+
+
+def decode_token(token):
+    """Position encodée dans un jeton de pagination"""
+    return int(json.loads(base64.urlsafe_b64decode(token.encode()))['offset'])
+
+
+class FakeCostApiServer(ThreadingHTTPServer):
+    """
+    Serveur HTTP local imitant Cost Explorer et Cost Management
+
+    Les deux jeux de données sont simulés une fois au démarrage sur `days` jours :
+    les pages d'une même requête restent cohérentes et une fenêtre découpée en
+    sous-fenêtres retourne exactement les mêmes lignes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), days=400, end_date=None, scale=1,
+                 page_size=1000, latency=0.0, jitter=0.0, rate_limit=None, verbose=False):
+        """
+        Args:
+            address: (hôte, port) d'écoute (port 0 : port libre choisi par le système)
+            days: Profondeur d'historique simulé (jours se terminant à end_date)
+            end_date: Dernier jour simulé (par défaut : aujourd'hui)
+            scale: Multiplicateur du catalogue de services
+            page_size: Nombre de groupes (AWS) ou de lignes (Azure) par page
+            latency: Latence fixe ajoutée à chaque réponse (s)
+            jitter: Latence aléatoire supplémentaire, uniforme sur [0, jitter] (s)
+            rate_limit: Requêtes acceptées par seconde au-delà desquelles
+                        l'API répond « throttled » (None : pas de limite)
+            verbose: Journalise chaque requête
+        """
+        super().__init__(address, FakeCostApiHandler)
+        end = pd.Timestamp(end_date or datetime.now().strftime('%Y-%m-%d'))
+        start = end - timedelta(days=days - 1)
+
+        self.datasets = {}
+        for cloud in ('AWS', 'Azure'):
+            df = simulate_cloud_costs(cloud, start, end, scale=scale)
+            self.datasets[cloud] = df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.verbose = verbose
+        self.random = random.Random(0)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def url(self):
+        """URL de base à passer aux extracteurs (endpoint_url)"""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def reset_stats(self):
+        """Remet à zéro les compteurs de requêtes"""
+        with self.stats_lock:
+            self.stats = {'requests': 0, 'pages': 0, 'throttled': 0, 'rows': 0}
+
+    def count(self, **increments):
+        """Incrémente les compteurs de requêtes"""
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def wait(self):
+        """Simule la latence du service"""
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def select(self, cloud, start, end):
+        """Lignes simulées d'un cloud dont la date est dans [start, end[ (YYYY-MM-DD)"""
+        df = self.datasets[cloud]
+        dates = df['Date'].to_numpy()
+        lo, hi = dates.searchsorted(start, 'left'), dates.searchsorted(end, 'left')
+        return df.iloc[lo:hi]
+
+    def grouped_costs(self, cloud, start, end, keys, monthly=False):
+        """Coûts sommés par période (jour ou mois) et dimensions de regroupement"""
+        rows = self.select(cloud, start, end)
+        periods = rows['Date'].str[:7] + '-01' if monthly else rows['Date']
+        result = rows.groupby([periods.rename('Date')] + keys, sort=True)['Cost'].sum()
+        return result.round(2).reset_index()
+
+    def serve_in_background(self):
+        """Démarre le serveur dans un thread (tests de charge dans le même processus)"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le serveur et libère le port"""
+        self.shutdown()
+        self.server_close()
+
+
+class FakeCostApiHandler(BaseHTTPRequestHandler):
+    """Routage des requêtes Cost Explorer et Cost Management"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, content_type='application/json', headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/_stats':
+            with self.server.stats_lock:
+                stats = dict(self.server.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {'error': {'code': 'NotFound', 'message': self.path}})
+
+    def do_POST(self):
+        request = self._read_json()
+        self.server.count(requests=1)
+        self.server.wait()
+
+        is_aws = self.headers.get('X-Amz-Target') == AWS_TARGET
+        if not is_aws and not urlsplit(self.path).path.endswith(AZURE_QUERY_PATH):
+            self._send_json(404, {'error': {'code': 'NotFound', 'message': self.path}})
+            return
+
+        retry_after = self.server.limiter.take() if self.server.limiter else 0
+        if retry_after:
+            self.server.count(throttled=1)
+            if is_aws:
+                self._send_json(400, {'__type': 'LimitExceededException', 'message': 'Rate exceeded'},
+                                content_type='application/x-amz-json-1.1')
+            else:
+                self._send_json(429, {'error': {'code': '429', 'message': 'Too many requests. Please retry.'}},
+                                headers={'Retry-After': str(math.ceil(retry_after))})
+            return
+
+        try:
+            if is_aws:
+                self._get_cost_and_usage(request)
+            else:
+                self._query_usage(request)
+        except (KeyError, ValueError) as e:
+            if is_aws:
+                self._send_json(400, {'__type': 'ValidationException', 'message': str(e)},
+                                content_type='application/x-amz-json-1.1')
+            else:
+                self._send_json(400, {'error': {'code': 'BadRequest', 'message': str(e)}})
+
+    def _get_cost_and_usage(self, request):
+        """GetCostAndUsage : ResultsByTime paginé par groupes (NextPageToken)"""
+        start, end = request['TimePeriod']['Start'], request['TimePeriod']['End']
+        granularity = request.get('Granularity', 'DAILY')
+        if granularity not in ('DAILY', 'MONTHLY'):
+            raise ValueError(f"Granularité non prise en charge : {granularity}")
+        keys = [AWS_DIMENSIONS[g['Key']] for g in request.get('GroupBy', [])]
+        metrics = request.get('Metrics') or ['UnblendedCost']
+
+        grouped = self.server.grouped_costs('AWS', start, end, keys, monthly=granularity == 'MONTHLY')
+
+        offset = decode_token(request['NextPageToken']) if request.get('NextPageToken') else 0
+        page = grouped.iloc[offset:offset + self.server.page_size]
+
+        results = []
+        for date, day in page.groupby('Date', sort=True):
+            if granularity == 'DAILY':
+                period_end = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            else:
+                month = datetime.strptime(date, '%Y-%m-%d')
+                period_end = min(end, (month + timedelta(days=32)).replace(day=1).strftime('%Y-%m-%d'))
+            groups = [
+                {
+                    'Keys': list(key_values),
+                    'Metrics': {m: {'Amount': f'{cost:.10f}', 'Unit': 'USD'} for m in metrics},
+                }
+                for *key_values, cost in day[keys + ['Cost']].itertuples(index=False)
+            ]
+            results.append({
+                'TimePeriod': {'Start': max(date, start), 'End': period_end},
+                'Total': {},
+                'Groups': groups,
+                'Estimated': False,
+            })
+
+        payload = {
+            'GroupDefinitions': request.get('GroupBy', []),
+            'ResultsByTime': results,
+            'DimensionValueAttributes': [],
+        }
+        if offset + len(page) < len(grouped):
+            payload['NextPageToken'] = encode_token(offset + len(page))
+        self.server.count(pages=1, rows=len(page))
+        self._send_json(200, payload, content_type='application/x-amz-json-1.1')
+
+    def _query_usage(self, request):
+        """Requête Cost Management : lignes paginées (properties.nextLink, $skiptoken)"""
+        period = request['timePeriod']
+        start = period['from'][:10]
+        end = (datetime.strptime(period['to'][:10], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        dataset = request.get('dataset', {})
+        grouping = [g['name'] for g in dataset.get('grouping', [])]
+        keys = [AZURE_DIMENSIONS[name] for name in grouping]
+
+        grouped = self.server.grouped_costs('Azure', start, end, keys)
+        query = parse_qs(urlsplit(self.path).query)
+        offset = decode_token(query['$skiptoken'][0]) if '$skiptoken' in query else 0
+        page = grouped.iloc[offset:offset + self.server.page_size]
+
+        usage_dates = page['Date'].str.replace('-', '', regex=False).astype('int64')
+        rows = [
+            [cost, usage_date, *key_values, 'USD']
+            for usage_date, (*key_values, cost) in zip(usage_dates, page[keys + ['Cost']].itertuples(index=False))
+        ]
+        columns = [{'name': 'Cost', 'type': 'Number'}, {'name': 'UsageDate', 'type': 'Number'}]
+        columns += [{'name': name, 'type': 'String'} for name in grouping]
+        columns.append({'name': 'Currency', 'type': 'String'})
+
+        next_link = None
+        if offset + len(page) < len(grouped):
+            base = urlsplit(self.path)
+            next_link = (f'{self.server.url}{base.path}?api-version='
+                         f"{query.get('api-version', [''])[0]}&$skiptoken={encode_token(offset + len(page))}")
+        self.server.count(pages=1, rows=len(page))
+        self._send_json(200, {
+            'id': urlsplit(self.path).path + '/query',
+            'name': 'fake-query',
+            'type': 'Microsoft.CostManagement/query',
+            'properties': {'nextLink': next_link, 'columns': columns, 'rows': rows},
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local Cost Explorer / Cost Management")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--days', type=int, default=400, help="Historique simulé (jours)")
+    parser.add_argument('--scale', type=int, default=1, help="Multiplicateur du catalogue de services")
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence par requête (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Latence aléatoire max (s)")
+    parser.add_argument('--rate-limit', type=float, help="Requêtes/s avant limitation")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeCostApiServer(
+        (args.host, args.port), days=args.days, scale=args.scale, page_size=args.page_size,
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, verbose=args.verbose
+    )
+    print("="*60)
+    print("🧪 API DE COÛTS SIMULÉES")
+    print("="*60)
+    print(f"   AWS   : AWS_CE_ENDPOINT_URL={server.url}")
+    print(f"   Azure : AZURE_COST_MANAGEMENT_ENDPOINT={server.url}")
+    print(f"   📊 {len(server.datasets['AWS']):,} lignes AWS, {len(server.datasets['Azure']):,} lignes Azure")
+    print(f"   📄 {args.page_size} lignes/page, latence {args.latency}s, "
+          f"limite {args.rate_limit or '∞'} req/s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Empreintes de contenu des étapes du pipeline
+Permet de court-circuiter transformation, upload et notification
+quand les entrées d'une partition n'ont pas changé depuis la dernière exécution
+"""
+
+import os
+import json
+import glob
+import hashlib
+from datetime import datetime
+
+from partitions import RAW_DIR, PROCESSED_DIR, partition_dir, write_json_atomic
+
+
+MANIFEST_NAME = '_manifest.json'
+
+# Code de sortie d'un script quand ses entrées sont inchangées (tâche Airflow "skipped")
+UNCHANGED_EXIT_CODE = 99
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Calcule le SHA-256 d'un fichier par blocs (mémoire constante)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_digest(config):
+    """Calcule le SHA-256 d'une configuration sérialisable en JSON"""
+    payload = json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def raw_partition_digests(ds):
+    """Retourne {nom_fichier: sha256} pour les fichiers bruts d'une partition"""
+    files = sorted(glob.glob(os.path.join(partition_dir(RAW_DIR, ds), '*.csv')))
+    return {os.path.basename(path): file_digest(path) for path in files}
+
+
+def compute_fingerprint(input_digests, config):
+    """
+    Combine les empreintes des entrées et de la configuration
+
+    Args:
+        input_digests: {nom: sha256} des fichiers d'entrée
+        config: Configuration de l'étape (dictionnaire sérialisable)
+    """
+    return config_digest({'inputs': input_digests, 'config': config_digest(config)})
+
+
+def manifest_path(ds):
+    """Chemin du manifeste de la partition transformée"""
+    return os.path.join(partition_dir(PROCESSED_DIR, ds), MANIFEST_NAME)
+
+
+def load_manifest(ds):
+    """Charge le manifeste d'une partition (dictionnaire vide si absent)"""
+    path = manifest_path(ds)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(ds, manifest):
+    """Écrit le manifeste d'une partition de manière atomique"""
+    return write_json_atomic(manifest, manifest_path(ds))
+
+
+def is_transform_current(ds, fingerprint):
+    """Vrai si la partition transformée correspond déjà à cette empreinte"""
+    manifest = load_manifest(ds)
+    if manifest.get('fingerprint') != fingerprint:
+        return False
+    directory = partition_dir(PROCESSED_DIR, ds)
+    return all(os.path.exists(os.path.join(directory, name))
+               for name in manifest.get('outputs', []))
+
+
+def record_transform(ds, fingerprint, inputs, outputs):
+    """Enregistre l'empreinte et les sorties d'une transformation réussie"""
+    manifest = load_manifest(ds)
+    manifest.update({
+        'ds': ds,
+        'fingerprint': fingerprint,
+        'inputs': inputs,
+        'outputs': sorted(outputs),
+        'transformed_at': datetime.now().isoformat(timespec='seconds'),
+    })
+    save_manifest(ds, manifest)
+    return manifest
+
+
+def is_upload_current(ds):
+    """Vrai si la version actuelle de la partition a déjà été uploadée"""
+    manifest = load_manifest(ds)
+    return bool(manifest.get('fingerprint')) and \
+        manifest.get('uploaded_fingerprint') == manifest.get('fingerprint')
+
+
+def record_upload(ds):
+    """Marque la version actuelle de la partition comme uploadée"""
+    manifest = load_manifest(ds)
+    manifest['uploaded_fingerprint'] = manifest.get('fingerprint')
+    manifest['uploaded_at'] = datetime.now().isoformat(timespec='seconds')
+    save_manifest(ds, manifest)
+    return manifest
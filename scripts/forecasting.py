@@ -0,0 +1,149 @@
+"""
+Prévision des dépenses de fin de mois par série (compte × service)
+Un modèle linéaire (tendance + saisonnalité hebdomadaire) est ajusté à toutes les séries
+en une seule résolution matricielle des moindres carrés
+"""
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection import build_series_matrix
+
+
+# Clés identifiant une série de prévision
+FORECAST_KEYS = ['Cloud', 'AccountName', 'Service']
+
+# Quantiles de la loi normale pour les intervalles de prévision
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+
+def design_matrix(dates, origin, weekly=True):
+    """
+    Matrice de régression commune à toutes les séries
+
+    Colonnes : constante, tendance (jours depuis origin) et, si weekly,
+    indicatrices des jours de semaine (lundi = référence).
+    """
+    t = ((dates - origin) // pd.Timedelta(days=1)).to_numpy(dtype=np.float64)
+    columns = [np.ones_like(t), t]
+    if weekly:
+        dow = dates.dayofweek.to_numpy()
+        columns += [(dow == d).astype(np.float64) for d in range(1, 7)]
+    return np.column_stack(columns)
+
+
+def fit_linear_models(matrix, dates, weekly=True):
+    """
+    Ajuste le modèle linéaire à toutes les séries à la fois
+
+    Args:
+        matrix: Coûts journaliers (séries × jours)
+        dates: DatetimeIndex des colonnes de matrix
+        weekly: Inclure la saisonnalité hebdomadaire
+
+    Returns:
+        (beta, sigma, xtx_inv) : coefficients (p × séries), écart-type des
+        résidus par série, et (XᵀX)⁻¹ commun utilisé pour les intervalles
+    """
+    X = design_matrix(dates, dates[0], weekly=weekly)
+    n_obs, n_params = X.shape
+
+    # Une seule factorisation pour toutes les séries : X partagé, Y = matrixᵀ
+    xtx_inv = np.linalg.pinv(X.T @ X)
+    beta = xtx_inv @ (X.T @ matrix.T)
+
+    residuals = matrix.T - X @ beta
+    dof = max(n_obs - n_params, 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+    return beta, sigma, xtx_inv
+
+
+def forecast_month_end(df, keys=None, confidence=0.9, min_days_weekly=21):
+    """
+    Projette la dépense de fin de mois de chaque série
+
+    La projection est la somme du mois en cours observé et de la prévision
+    des jours restants jusqu'à la fin du mois de la dernière date observée.
+    L'intervalle tient compte du bruit résiduel et de l'incertitude des
+    coefficients : Var = σ² (H + 1ᵀ X_f (XᵀX)⁻¹ X_fᵀ 1).
+
+    Args:
+        df: Données de coûts (Date, clés, Cost)
+        keys: Colonnes identifiant une série (défaut : FORECAST_KEYS présentes)
+        confidence: Niveau de l'intervalle (0.8, 0.9, 0.95 ou 0.99)
+        min_days_weekly: Historique minimal (jours) pour activer la saisonnalité hebdo
+
+    Returns:
+        (forecasts, total) : DataFrame par série (clés, Month, MonthToDate,
+        RemainingForecast, ProjectedMonthEnd, Lower, Upper, DailyTrend) et
+        dictionnaire de la projection totale avec son intervalle
+    """
+    if keys is None:
+        keys = [k for k in FORECAST_KEYS if k in df.columns]
+
+    columns = keys + ['Month', 'MonthToDate', 'RemainingForecast',
+                      'ProjectedMonthEnd', 'Lower', 'Upper', 'DailyTrend']
+    if len(df) == 0:
+        return pd.DataFrame(columns=columns), None
+
+    z = Z_SCORES[confidence]
+    matrix, series_keys, dates = build_series_matrix(df, keys)
+    n_days = len(dates)
+
+    last_date = dates[-1]
+    month_start = last_date.to_period('M').start_time
+    month_end = last_date.to_period('M').end_time.normalize()
+    future_dates = pd.date_range(last_date + pd.Timedelta(days=1), month_end, freq='D')
+    horizon = len(future_dates)
+
+    month_to_date = matrix[:, dates >= month_start].sum(axis=1)
+
+    if horizon == 0:
+        # Mois complet : la projection est la dépense observée
+        remaining = np.zeros(len(series_keys))
+        spread = np.zeros(len(series_keys))
+        trend = np.zeros(len(series_keys))
+    elif n_days < 3:
+        # Historique insuffisant pour une tendance : moyenne journalière
+        daily_mean = matrix.mean(axis=1)
+        remaining = daily_mean * horizon
+        sigma = matrix.std(axis=1)
+        spread = z * sigma * np.sqrt(horizon)
+        trend = np.zeros(len(series_keys))
+    else:
+        weekly = n_days >= min_days_weekly
+        beta, sigma, xtx_inv = fit_linear_models(matrix, dates, weekly=weekly)
+        X_future = design_matrix(future_dates, dates[0], weekly=weekly)
+        daily_forecast = np.clip(X_future @ beta, 0.0, None)
+        remaining = daily_forecast.sum(axis=0)
+
+        ones_xf = X_future.sum(axis=0)
+        variance_factor = horizon + ones_xf @ xtx_inv @ ones_xf
+        spread = z * sigma * np.sqrt(variance_factor)
+        trend = beta[1]
+
+    projected = month_to_date + remaining
+    forecasts = series_keys.copy()
+    forecasts['Month'] = str(last_date.to_period('M'))
+    forecasts['MonthToDate'] = month_to_date.round(2)
+    forecasts['RemainingForecast'] = remaining.round(2)
+    forecasts['ProjectedMonthEnd'] = projected.round(2)
+    forecasts['Lower'] = np.maximum(projected - spread, month_to_date).round(2)
+    forecasts['Upper'] = (projected + spread).round(2)
+    forecasts['DailyTrend'] = np.round(trend, 4)
+    forecasts = forecasts.sort_values(
+        'ProjectedMonthEnd', ascending=False, kind='mergesort'
+    ).reset_index(drop=True)
+
+    # Total : séries supposées indépendantes (variances additives)
+    total_projected = float(projected.sum())
+    total_spread = float(np.sqrt((spread ** 2).sum()))
+    total = {
+        'month': str(last_date.to_period('M')),
+        'as_of': last_date.strftime('%Y-%m-%d'),
+        'projected': round(total_projected, 2),
+        'lower': round(max(total_projected - total_spread, float(month_to_date.sum())), 2),
+        'upper': round(total_projected + total_spread, 2),
+        'confidence': confidence,
+    }
+    return forecasts[columns], total
@@ -0,0 +1,239 @@
+"""
+Taux de change journaliers pour normaliser les coûts dans une devise de référence
+Les taux de référence de la BCE sont mis en cache dans data/reference/ : une exécution
+qui trouve dans le cache tous les taux de sa fenêtre n'interroge rien. La conversion est
+vectorisée : merge_asof sur les couples (jour, devise) distincts, puis indexation par ligne
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import zipfile
+from datetime import datetime
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+
+from partitions import REFERENCE_DIR, extraction_window, write_csv_atomic
+
+
+# Historique complet des taux de référence BCE (1 EUR = x devise), un jour ouvré par ligne
+ECB_HISTORY_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.zip'
+
+# Rate : unités de devise de référence pour 1 unité de Currency
+FX_COLUMNS = ['Date', 'Currency', 'Rate']
+
+# Ancienneté maximale (jours) du dernier taux connu : week-ends, jours fériés, jour en cours
+DEFAULT_MAX_STALENESS_DAYS = 7
+
+
+def fx_rates_file(base='USD'):
+    """Fichier cache des taux vers une devise de référence"""
+    return os.path.join(REFERENCE_DIR, f'fx_rates_{base}.csv')
+
+
+def fetch_ecb_rates(currencies, base='USD', url=None, timeout=30):
+    """
+    Télécharge l'historique BCE et le convertit en taux vers la devise de référence
+
+    La BCE publie des taux contre l'euro ; le taux d'une devise vers la devise de
+    référence en est déduit (référence/EUR ÷ devise/EUR).
+
+    Args:
+        currencies: Devises demandées
+        base: Devise de référence
+        url: Archive à télécharger (défaut : FX_RATES_URL ou l'historique BCE)
+
+    Returns:
+        DataFrame (Date, Currency, Rate) des devises publiées par la BCE
+    """
+    url = url or os.getenv('FX_RATES_URL', ECB_HISTORY_URL)
+    with urlopen(url, timeout=timeout) as response:
+        payload = response.read()
+    with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+        with archive.open(archive.namelist()[0]) as f:
+            table = pd.read_csv(f, na_values=['N/A'])
+
+    table.columns = table.columns.str.strip()
+    table = table.loc[:, ~table.columns.str.startswith('Unnamed')]
+    table = table.set_index(pd.to_datetime(table.pop('Date')).rename('Date'))
+    table['EUR'] = 1.0
+    if base not in table.columns:
+        raise ValueError(f"Devise de référence absente des taux BCE : {base}")
+
+    wanted = [c for c in currencies if c in table.columns and c != base]
+    rates = table[wanted].rdiv(table[base], axis=0).round(8)
+    rates.columns.name = 'Currency'
+    return rates.stack().rename('Rate').reset_index()[FX_COLUMNS]
+
+
+def load_fx_rates(path):
+    """Charge le cache des taux (table vide s'il n'existe pas)"""
+    if not os.path.exists(path):
+        return pd.DataFrame({
+            'Date': pd.Series(dtype='datetime64[ns]'),
+            'Currency': pd.Series(dtype=object),
+            'Rate': pd.Series(dtype=np.float64),
+        })
+    return pd.read_csv(path, parse_dates=['Date'], dtype={'Currency': str, 'Rate': np.float64})
+
+
+class FxRates:
+    """Taux journaliers jour × devise et recherche vectorisée du taux de chaque ligne"""
+
+    def __init__(self, table, base='USD', max_staleness_days=DEFAULT_MAX_STALENESS_DAYS):
+        """
+        Args:
+            table: DataFrame (Date, Currency, Rate)
+            base: Devise de référence (taux 1)
+            max_staleness_days: Ancienneté maximale du dernier taux connu
+        """
+        self.table = table[FX_COLUMNS].sort_values(['Date', 'Currency'], ignore_index=True)
+        self.table['Date'] = self.table['Date'].astype('datetime64[ns]')
+        self.base = base
+        self.max_staleness_days = max_staleness_days
+
+    def _pair_rates(self, dates, currencies):
+        """Taux de couples (jour, devise) distincts : dernier taux publié au plus tard ce jour"""
+        rates = np.full(len(dates), np.nan)
+        rates[currencies == self.base] = 1.0
+        others = np.flatnonzero(currencies != self.base)
+        if len(others) == 0 or len(self.table) == 0:
+            return rates
+
+        keys = pd.DataFrame({
+            'Date': dates[others].astype('datetime64[ns]'),
+            'Currency': currencies[others],
+            'Position': others,
+        }).sort_values('Date', kind='stable')
+        matched = pd.merge_asof(
+            keys, self.table, on='Date', by='Currency', direction='backward',
+            tolerance=pd.Timedelta(days=self.max_staleness_days)
+        )
+        rates[matched['Position'].to_numpy()] = matched['Rate'].to_numpy()
+        return rates
+
+    def lookup(self, dates, currencies):
+        """
+        Taux de conversion de chaque ligne vers la devise de référence
+
+        Le merge_asof ne porte que sur les couples (jour, devise) distincts, quelques
+        centaines même pour des millions de lignes ; chaque ligne reçoit ensuite le
+        taux de son couple par simple indexation.
+
+        Args:
+            dates: Series datetime (NaT possibles)
+            currencies: Series des devises (valeurs manquantes possibles)
+
+        Returns:
+            Tableau float64 : 1 pour la devise de référence, NaN sans taux
+        """
+        date_codes, date_uniques = pd.factorize(dates)
+        currency_codes, currency_uniques = pd.factorize(currencies)
+        n_currencies = max(len(currency_uniques), 1)
+        known = (date_codes >= 0) & (currency_codes >= 0)
+        pairs = np.where(known, date_codes.astype(np.int64) * n_currencies + currency_codes, -1)
+
+        pair_codes, pair_uniques = pd.factorize(pairs)
+        valid_pairs = pair_uniques >= 0
+        pair_rates = np.full(len(pair_uniques), np.nan)
+        pair_rates[valid_pairs] = self._pair_rates(
+            np.asarray(date_uniques)[pair_uniques[valid_pairs] // n_currencies],
+            np.asarray(currency_uniques, dtype=object)[pair_uniques[valid_pairs] % n_currencies],
+        )
+        return pair_rates[pair_codes]
+
+    def digest(self):
+        """Empreinte des taux (entre dans l'empreinte de la transformation)"""
+        payload = self.table.to_csv(index=False, date_format='%Y-%m-%d').encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+
+def needs_refresh(table, path, currencies, end_date):
+    """
+    Vrai si le cache doit être complété pour une fenêtre se terminant à end_date (exclue)
+
+    Une devise absente impose un rafraîchissement ; un dernier taux antérieur au
+    dernier jour de la fenêtre aussi, sauf si le cache a été rafraîchi après ce
+    jour (jour sans publication : week-end, jour férié) — une seule tentative.
+    """
+    last_day = pd.Timestamp(end_date) - pd.Timedelta(days=1)
+    latest = table.groupby('Currency')['Date'].max()
+    if any(c not in latest.index for c in currencies):
+        return True
+    if (latest[list(currencies)] >= last_day).all():
+        return False
+    refreshed = pd.Timestamp(datetime.fromtimestamp(os.path.getmtime(path)).date())
+    return refreshed <= last_day
+
+
+def ensure_fx_rates(currencies, start_date, end_date, base='USD',
+                    max_staleness_days=DEFAULT_MAX_STALENESS_DAYS, path=None,
+                    fetch=fetch_ecb_rates, force=False):
+    """
+    Taux couvrant la fenêtre [start_date, end_date[, depuis le cache si possible
+
+    Le cache n'est complété (une requête pour tout l'historique) que s'il ne couvre
+    pas la fenêtre ; sans accès au réseau, il est utilisé tel quel et les lignes
+    sans taux seront mises en quarantaine.
+
+    Args:
+        currencies: Devises acceptées
+        start_date, end_date: Fenêtre des dates à convertir (fin exclue)
+        base: Devise de référence
+        path: Fichier cache (défaut : data/reference/fx_rates_<base>.csv)
+        fetch: Source des taux (défaut : BCE)
+        force: Rafraîchir le cache même s'il couvre la fenêtre
+
+    Returns:
+        FxRates limité aux taux utilisables dans la fenêtre
+    """
+    path = path or fx_rates_file(base)
+    table = load_fx_rates(path)
+    needed = sorted(set(currencies) - {base})
+
+    if needed and (force or needs_refresh(table, path, needed, end_date)):
+        try:
+            fetched = fetch(needed, base=base)
+            table = pd.concat([table, fetched], ignore_index=True) \
+                .drop_duplicates(['Date', 'Currency'], keep='last') \
+                .sort_values(['Date', 'Currency'], ignore_index=True)
+            write_csv_atomic(table, path, index=False, date_format='%Y-%m-%d')
+            print(f"💱 Taux de change mis à jour : {path} ({len(fetched):,} taux)")
+            unavailable = sorted(set(needed) - set(fetched['Currency']))
+            if unavailable:
+                print(f"⚠️  Devises sans taux publié : {', '.join(unavailable)}")
+        except Exception as e:
+            print(f"⚠️  Taux de change non rafraîchis ({e}) : cache utilisé tel quel")
+
+    # Seuls les taux utilisables dans la fenêtre sont gardés (empreinte, workers)
+    lower = pd.Timestamp(start_date) - pd.Timedelta(days=max_staleness_days)
+    window = (table['Date'] >= lower) & (table['Date'] < pd.Timestamp(end_date)) \
+        & table['Currency'].isin(needed)
+    return FxRates(table[window], base=base, max_staleness_days=max_staleness_days)
+
+
+def main():
+    """Rafraîchit le cache des taux des devises configurées et affiche les derniers taux"""
+    import transform_config
+
+    parser = argparse.ArgumentParser(description="Mise à jour du cache des taux de change")
+    parser.add_argument('--days', type=int, default=30, help="Fenêtre affichée (jours)")
+    args = parser.parse_args()
+
+    config = transform_config.FX
+    start_date, end_date = extraction_window(datetime.now().strftime('%Y-%m-%d'), args.days)
+    fx = ensure_fx_rates(
+        transform_config.DATA_QUALITY['currencies'], start_date, end_date,
+        base=config['base_currency'], max_staleness_days=config['max_staleness_days'], force=True
+    )
+    latest = fx.table.groupby('Currency').last()
+    print(f"\n💱 Derniers taux vers {fx.base} :")
+    for currency, row in latest.iterrows():
+        print(f"   {currency} : {row['Rate']:.6f} ({row['Date'].date()})")
+
+
+if __name__ == "__main__":
+    main()
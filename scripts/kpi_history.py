@@ -0,0 +1,286 @@
+"""
+Historique des KPIs (série temporelle en ajout seul, format colonnes)
+Chaque transformation ajoute une ligne (exécution, période couverte, KPIs, anomalies,
+top services, prévision de fin de mois) dans un petit fichier Parquet ; les fichiers sont
+périodiquement regroupés sans jamais modifier une ligne. Le dashboard et les alertes lisent
+les tendances en un seul parcours, au lieu d'ouvrir un kpis_*.json par exécution
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from partitions import HISTORY_DIR, PROCESSED_DIR, atomic_path, list_partitions, partition_dir
+
+
+# Jeu de données Parquet de l'historique (un fichier par ajout, puis regroupés)
+KPI_HISTORY_DIR = os.path.join(HISTORY_DIR, 'kpis')
+
+# Regroupement des fichiers d'ajout au-delà de ce nombre
+COMPACT_AFTER = 32
+
+# Nombre de services conservés par exécution
+TOP_SERVICES = 3
+
+# Colonnes d'identification d'une ligne : exécution (partition ou horodatage) et période
+KEY_COLUMNS = ['RunId', 'Partition', 'RecordedAt', 'DateMin', 'DateMax', 'TransformVersion']
+
+# KPIs historisés (clés de kpis.json) et leur type Arrow ; les autres clés sont ignorées
+KPI_TYPES = {
+    'total_cost': 'float64',
+    'avg_daily_cost': 'float64',
+    'trend_pct': 'float64',
+    'anomaly_count': 'int64',
+    'weekend_pct': 'float64',
+    'series_anomaly_count': 'int64',
+    'shared_cost': 'float64',
+    'unallocated_cost': 'float64',
+    'distinct_resources': 'int64',
+    'forecast_month': 'string',
+    'forecast_month_end': 'float64',
+    'forecast_lower': 'float64',
+    'forecast_upper': 'float64',
+    'budget_breaches': 'int64',
+}
+
+
+def history_available():
+    """Vrai si pyarrow est installé (écriture et lecture de l'historique Parquet)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def history_schema():
+    """Schéma fixe de l'historique : tous les fichiers se lisent ensemble"""
+    import pyarrow as pa
+
+    top_services = pa.list_(pa.struct([('Service', pa.string()), ('Cost', pa.float64())]))
+    return pa.schema(
+        [
+            ('RunId', pa.string()),
+            ('Partition', pa.string()),
+            ('RecordedAt', pa.timestamp('ms')),
+            ('DateMin', pa.timestamp('ms')),
+            ('DateMax', pa.timestamp('ms')),
+            ('TransformVersion', pa.int32()),
+        ]
+        + [(name, pa.type_for_alias(alias)) for name, alias in KPI_TYPES.items()]
+        + [('TopServices', top_services)]
+    )
+
+
+def kpi_record(run_id, kpis, date_min, date_max, top_services=None, partition=None,
+               transform_version=None, recorded_at=None):
+    """
+    Ligne d'historique d'une exécution
+
+    Args:
+        run_id: Identifiant de l'exécution (date de partition, ou horodatage des fichiers)
+        kpis: KPIs de l'exécution (contenu de kpis.json)
+        date_min, date_max: Premier et dernier jour des données couvertes
+        top_services: Series Service → coût (USD), triée par coût décroissant
+        partition: Date logique de la partition (None en mode historique)
+        transform_version: transform_config.TRANSFORM_VERSION de l'exécution
+        recorded_at: Date d'enregistrement (défaut : maintenant)
+
+    Returns:
+        Dictionnaire conforme à history_schema()
+    """
+    record = {
+        'RunId': str(run_id),
+        'Partition': partition,
+        'RecordedAt': pd.Timestamp(recorded_at or datetime.now()),
+        'DateMin': pd.Timestamp(date_min) if pd.notna(date_min) else None,
+        'DateMax': pd.Timestamp(date_max) if pd.notna(date_max) else None,
+        'TransformVersion': transform_version,
+    }
+    for name, alias in KPI_TYPES.items():
+        value = kpis.get(name)
+        if value is not None and alias != 'string' and pd.isna(value):
+            value = None
+        record[name] = value
+    services = top_services.head(TOP_SERVICES) if top_services is not None else pd.Series(dtype=float)
+    record['TopServices'] = [{'Service': s, 'Cost': float(c)} for s, c in services.items()]
+    return record
+
+
+def append_kpis(records, history_dir=KPI_HISTORY_DIR):
+    """
+    Ajoute des lignes à l'historique (nouveau fichier, écrit atomiquement)
+
+    Plusieurs transformations concurrentes (backfills) écrivent chacune leur
+    fichier : aucun verrou, aucune réécriture.
+
+    Returns:
+        Chemin du fichier ajouté
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if isinstance(records, dict):
+        records = [records]
+    table = pa.Table.from_pylist(records, schema=history_schema())
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    run = re.sub(r'[^0-9A-Za-z_-]', '', str(records[0]['RunId']))
+    path = os.path.join(history_dir, f'append-{stamp}-{run}.parquet')
+    with atomic_path(path) as tmp_path:
+        pq.write_table(table, tmp_path)
+
+    compact_history(history_dir)
+    return path
+
+
+def compact_history(history_dir=KPI_HISTORY_DIR, min_files=COMPACT_AFTER):
+    """
+    Regroupe les fichiers d'ajout en un seul (lignes inchangées, ordre conservé)
+
+    Sans verrou : si deux regroupements se chevauchent, des lignes peuvent être
+    écrites deux fois, et read_history les dédoublonne.
+
+    Returns:
+        Chemin du fichier regroupé, ou None si rien n'a été regroupé
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = sorted(glob.glob(os.path.join(history_dir, 'append-*.parquet')))
+    if len(parts) < min_files:
+        return None
+    try:
+        tables = [pq.read_table(part, schema=history_schema()) for part in parts]
+    except FileNotFoundError:
+        # Regroupement concurrent en cours : il s'en charge
+        return None
+
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(history_dir, f'compacted-{stamp}.parquet')
+    with atomic_path(path) as tmp_path:
+        pq.write_table(pa.concat_tables(tables), tmp_path)
+    for part in parts:
+        if os.path.exists(part):
+            os.remove(part)
+    return path
+
+
+def read_history(columns=None, latest=True, history_dir=KPI_HISTORY_DIR):
+    """
+    Historique des KPIs en un parcours
+
+    Args:
+        columns: Colonnes lues en plus des clés (None : toutes)
+        latest: Ne garder que le dernier enregistrement de chaque exécution
+                (une partition re-transformée remplace sa version précédente)
+
+    Returns:
+        DataFrame trié par période (DateMax) puis date d'enregistrement ;
+        vide (colonnes du schéma) si aucun historique
+    """
+    files = sorted(glob.glob(os.path.join(history_dir, '*.parquet')))
+    schema = history_schema() if history_available() else None
+    if columns is not None:
+        columns = KEY_COLUMNS + [c for c in columns if c not in KEY_COLUMNS]
+    if not files or schema is None:
+        names = columns or (schema.names if schema is not None else KEY_COLUMNS)
+        return pd.DataFrame(columns=names)
+
+    import pyarrow.dataset as ds
+
+    table = ds.dataset(files, schema=schema, format='parquet').to_table(columns=columns)
+    history = table.to_pandas()
+    history = history.sort_values('RecordedAt', kind='mergesort') \
+        .drop_duplicates(['RunId', 'RecordedAt'])
+    if latest:
+        history = history.drop_duplicates('RunId', keep='last')
+    history = history.sort_values(['DateMax', 'RecordedAt'], kind='mergesort')
+    return history.reset_index(drop=True)
+
+
+def _run_outputs(kpi_file):
+    """Fichiers frères d'un kpis.json / kpis_<horodatage>.json (reprise de l'existant)"""
+    directory = os.path.dirname(kpi_file)
+    suffix = os.path.basename(kpi_file)[len('kpis'):-len('.json')]
+    return (os.path.join(directory, f'daily_costs{suffix}.csv'),
+            os.path.join(directory, f'top10_services{suffix}.csv'))
+
+
+def backfill(base_dir=PROCESSED_DIR, history_dir=KPI_HISTORY_DIR):
+    """
+    Reprend dans l'historique les KPIs des exécutions déjà sur disque
+
+    Partitions dt=*/kpis.json et fichiers horodatés kpis_<horodatage>.json ; la
+    période vient des coûts journaliers de la même exécution. Les exécutions déjà
+    historisées sont ignorées.
+
+    Returns:
+        Nombre de lignes ajoutées
+    """
+    known = set(read_history(columns=[], history_dir=history_dir)['RunId'])
+    runs = [(ds, os.path.join(partition_dir(base_dir, ds), 'kpis.json'), ds)
+            for ds in list_partitions(base_dir)]
+    for kpi_file in sorted(glob.glob(os.path.join(base_dir, 'kpis_*.json'))):
+        runs.append((os.path.basename(kpi_file)[len('kpis_'):-len('.json')], kpi_file, None))
+
+    records = []
+    for run_id, kpi_file, ds in runs:
+        if run_id in known or not os.path.exists(kpi_file):
+            continue
+        with open(kpi_file, 'r') as f:
+            kpis = json.load(f)
+        daily_file, top_file = _run_outputs(kpi_file)
+        date_min = date_max = None
+        if os.path.exists(daily_file):
+            dates = pd.to_datetime(pd.read_csv(daily_file, usecols=['Date'])['Date'])
+            date_min, date_max = dates.min(), dates.max()
+        top_services = None
+        if os.path.exists(top_file):
+            top_services = pd.read_csv(top_file, index_col='Service')['Cost']
+        records.append(kpi_record(
+            run_id, kpis, date_min, date_max, top_services, partition=ds,
+            recorded_at=datetime.fromtimestamp(os.path.getmtime(kpi_file))
+        ))
+
+    if records:
+        append_kpis(records, history_dir)
+    return len(records)
+
+
+def main():
+    """Reprise de l'existant et aperçu de l'historique des KPIs"""
+    parser = argparse.ArgumentParser(description="Historique des KPIs")
+    parser.add_argument('--backfill', action='store_true',
+                        help="Reprendre les kpis.json / kpis_*.json déjà présents dans data/processed")
+    parser.add_argument('--compact', action='store_true',
+                        help="Regrouper tous les fichiers d'ajout en un seul")
+    parser.add_argument('--last', type=int, default=10, help="Nombre d'exécutions affichées")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("🕒 HISTORIQUE DES KPIs")
+    print("="*60)
+
+    if args.backfill:
+        print(f"   ➕ {backfill()} exécutions reprises")
+    if args.compact and compact_history(min_files=2):
+        print("   🗜️  Fichiers d'ajout regroupés")
+
+    history = read_history(columns=['total_cost', 'anomaly_count', 'forecast_month_end'])
+    print(f"   📚 {len(history)} exécutions historisées\n")
+    for _, row in history.tail(args.last).iterrows():
+        period = (f"{row['DateMin']:%Y-%m-%d} → {row['DateMax']:%Y-%m-%d}"
+                  if pd.notna(row['DateMax']) else "période inconnue")
+        forecast = f"  prévision ${row['forecast_month_end']:,.2f}" if pd.notna(row['forecast_month_end']) else ""
+        print(f"   {row['RunId']:17s} {period:25s} ${row['total_cost']:14,.2f}"
+              f"  ⚠️ {row['anomaly_count']}{forecast}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
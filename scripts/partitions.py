@@ -0,0 +1,144 @@
+"""
+Gestion des partitions datées du pipeline (data/raw/dt=YYYY-MM-DD/, data/processed/dt=YYYY-MM-DD/)
+Chaque exécution Airflow écrit dans la partition de son intervalle de données,
+avec des écritures atomiques pour que les re-exécutions et backfills soient idempotents
+"""
+
+import os
+import json
+import glob
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+RAW_DIR = os.path.join('data', 'raw')
+PROCESSED_DIR = os.path.join('data', 'processed')
+QUARANTINE_DIR = os.path.join('data', 'quarantine')
+
+# Tables de référence partagées entre partitions (taux de change...)
+REFERENCE_DIR = os.path.join('data', 'reference')
+
+# Historiques en ajout seul, communs à toutes les exécutions (KPIs...)
+HISTORY_DIR = os.path.join('data', 'history')
+
+# Fenêtre d'extraction glissante (jours) se terminant à la fin de l'intervalle
+DEFAULT_LOOKBACK_DAYS = 30
+
+
+def partition_dir(base_dir, ds):
+    """
+    Retourne le répertoire de la partition pour une date logique
+
+    Args:
+        base_dir: Répertoire racine (RAW_DIR ou PROCESSED_DIR)
+        ds: Date logique de l'exécution (YYYY-MM-DD)
+    """
+    return os.path.join(base_dir, f'dt={ds}')
+
+
+def list_partitions(base_dir):
+    """Liste les dates des partitions existantes, triées"""
+    dirs = glob.glob(os.path.join(base_dir, 'dt=*'))
+    return sorted(
+        os.path.basename(d)[len('dt='):] for d in dirs
+        if os.path.isdir(d) and '.tmp' not in os.path.basename(d)
+    )
+
+
+def latest_partition(base_dir):
+    """Retourne la date de la partition la plus récente (ou None)"""
+    partitions = list_partitions(base_dir)
+    return partitions[-1] if partitions else None
+
+
+def extraction_window(ds, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Calcule la fenêtre d'extraction associée à une date logique
+
+    La fenêtre se termine le lendemain de ds (borne exclusive, comme Cost Explorer)
+    et remonte de lookback_days jours, indépendamment de l'heure d'exécution.
+
+    Returns:
+        (start_date, end_date) au format YYYY-MM-DD
+    """
+    end = datetime.strptime(ds, '%Y-%m-%d') + timedelta(days=1)
+    start = end - timedelta(days=lookback_days)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def split_window(start_date, end_date, parts):
+    """
+    Découpe une fenêtre [start_date, end_date[ en sous-fenêtres contiguës
+
+    Permet d'interroger les API de coûts en parallèle sans recouvrement.
+
+    Returns:
+        Liste de (start_date, end_date) au format YYYY-MM-DD (au plus `parts`)
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    days = max((end - start).days, 1)
+    parts = max(1, min(parts, days))
+    bounds = [start + timedelta(days=days * i // parts) for i in range(parts)] + [end]
+    return [(a.strftime('%Y-%m-%d'), b.strftime('%Y-%m-%d')) for a, b in zip(bounds, bounds[1:])]
+
+
+@contextmanager
+def atomic_path(final_path):
+    """
+    Fournit un chemin temporaire puis le renomme atomiquement vers final_path
+
+    Le fichier temporaire est créé dans le même répertoire pour que os.replace
+    reste atomique ; en cas d'erreur, la version précédente est conservée intacte.
+    """
+    directory = os.path.dirname(final_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(final_path)}.', suffix='.tmp', dir=directory
+    )
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_csv_atomic(df, path, **kwargs):
+    """Écrit un DataFrame en CSV de manière atomique"""
+    with atomic_path(path) as tmp_path:
+        df.to_csv(tmp_path, **kwargs)
+    return path
+
+
+def write_json_atomic(obj, path):
+    """Écrit un objet JSON de manière atomique"""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f, indent=2)
+    return path
+
+
+def publish_dir(staging_dir, final_dir):
+    """
+    Remplace le répertoire final_dir par staging_dir (jeu de données multi-fichiers)
+
+    Les deux répertoires doivent être sur le même système de fichiers : le
+    nouveau contenu est publié par renommage, l'ancien n'est supprimé qu'ensuite.
+    """
+    previous = None
+    if os.path.exists(final_dir):
+        previous = tempfile.mkdtemp(
+            prefix=f'.{os.path.basename(final_dir)}.', suffix='.old.tmp',
+            dir=os.path.dirname(final_dir) or '.'
+        )
+        os.rmdir(previous)
+        os.replace(final_dir, previous)
+    os.replace(staging_dir, final_dir)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+    return final_dir
@@ -0,0 +1,392 @@
+"""
+Magasin brut des coûts, mis à jour par clé (upsert)
+Les extractions successives se recouvrent (fenêtres glissantes) et les fournisseurs
+réécrivent les derniers jours : chaque extraction est fusionnée dans un historique unique.
+Une extraction remplace, pour chaque tranche (Date, Cloud, AccountId) qu'elle contient,
+toutes les lignes stockées de cette tranche : une ligne dont les tags ou le coût sont
+révisés est remplacée, une clé disparue du jour réécrit est supprimée. La clé
+(Date, Cloud, AccountId, Service, Region[, ResourceId]) sert au tri et aux compteurs.
+Un fichier Parquet par mois, trié par jour puis empreinte de clé ; un mois dont aucune
+tranche ne change n'est pas réécrit
+"""
+
+import argparse
+import glob
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import transform_config
+from data_quality import EXPECTED_COLUMNS, parse_dates
+from fingerprints import file_digest
+from partitions import HISTORY_DIR, RAW_DIR, atomic_path, list_partitions, partition_dir
+
+
+# Magasin brut : un répertoire par mois (month=YYYY-MM/costs.parquet)
+RAW_STORE_DIR = os.path.join(HISTORY_DIR, 'raw')
+STORE_FILE = 'costs.parquet'
+
+# Services des lignes fictives de l'extracteur multi-cloud (Azure sans données, en erreur
+# ou non configuré) : état de l'extraction, jamais enregistrées dans le magasin
+NO_DATA = 'No Data'
+CONFIGURATION_ERROR = 'Configuration Error'
+NOT_CONFIGURED = 'Not Configured'
+PLACEHOLDER_SERVICES = (NO_DATA, CONFIGURATION_ERROR, NOT_CONFIGURED)
+
+# Tranche remplacée en bloc par une extraction qui la contient
+SLICE_COLUMNS = ['Date', 'Cloud', 'AccountId']
+
+# Colonnes techniques : empreintes de la tranche, de la clé et des autres valeurs (tags compris)
+SLICE_HASH = '_SliceHash'
+KEY_HASH = '_KeyHash'
+ROW_HASH = '_RowHash'
+HASH_COLUMNS = (SLICE_HASH, KEY_HASH, ROW_HASH)
+
+
+def store_available():
+    """Vrai si pyarrow est installé (lecture et écriture du magasin Parquet)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def store_keys():
+    """Clé d'une ligne : DATA_QUALITY['dedup_keys'] (les tags font partie des valeurs)"""
+    return list(transform_config.DATA_QUALITY['dedup_keys'])
+
+
+def row_hashes(df, columns):
+    """
+    Empreinte 64 bits par ligne d'un ensemble de colonnes texte
+
+    Chaque valeur non vide contribue selon sa colonne (OU exclusif des
+    contributions) : une colonne absente équivaut à une colonne vide, et
+    l'empreinte ne dépend ni de l'ordre des colonnes ni du schéma de l'extraction.
+    """
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for column in columns:
+        if column not in df.columns:
+            continue
+        # Empreinte de chaque valeur distincte, reportée sur les lignes (valeurs manquantes : code -1)
+        codes, uniques = pd.factorize(df[column])
+        uniques = np.asarray(uniques, dtype=object)
+        salt = np.uint64(pd.util.hash_array(np.array([column], dtype=object))[0] | np.uint64(1))
+        contribution = pd.util.hash_array(uniques, categorize=False) * salt
+        contribution[uniques == ''] = 0
+        hashes ^= np.append(contribution, np.uint64(0))[codes]
+    return hashes
+
+
+def _sort_key(dates, key_hash):
+    """Ordre de stockage dans un mois : jour (5 bits de poids fort), puis empreinte de clé"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    day = (dates - dates.astype('datetime64[M]')).astype(np.uint64)
+    return (day << np.uint64(59)) | (key_hash >> np.uint64(5))
+
+
+def month_path(month, store_dir=RAW_STORE_DIR):
+    """Fichier d'un mois (YYYY-MM) du magasin"""
+    return os.path.join(store_dir, f'month={month}', STORE_FILE)
+
+
+def list_months(store_dir=RAW_STORE_DIR):
+    """Mois présents dans le magasin, triés"""
+    return sorted(
+        os.path.basename(os.path.dirname(path))[len('month='):]
+        for path in glob.glob(os.path.join(store_dir, 'month=*', STORE_FILE))
+    )
+
+
+@contextmanager
+def _month_lock(month, store_dir=RAW_STORE_DIR):
+    """Verrou exclusif d'un mois : deux extractions (backfills) ne le fusionnent pas en même temps"""
+    # POSIX seulement : importé ici pour que la lecture du magasin reste possible ailleurs
+    import fcntl
+
+    directory = os.path.dirname(month_path(month, store_dir))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_month(path, columns=None):
+    """Lignes d'un mois (texte, avec empreintes), ou seulement certaines colonnes"""
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, columns=columns).to_pandas()
+
+
+def _write_month(df, path):
+    """Écrit un mois (colonnes texte + empreintes) atomiquement"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (c, pa.uint64() if c in HASH_COLUMNS else pa.string()) for c in df.columns
+    ])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    with atomic_path(path) as tmp_path:
+        pq.write_table(table, tmp_path)
+
+
+def prepare_rows(df):
+    """
+    Lignes d'une extraction prêtes à fusionner
+
+    Les lignes sans date lisible et les lignes fictives (PLACEHOLDER_SERVICES)
+    restent hors du magasin.
+
+    Returns:
+        (lignes texte avec Date canonique YYYY-MM-DD et empreintes ; mois (YYYY-MM)
+         de chaque ligne ; nombre de lignes sans date lisible ; nombre de lignes fictives)
+    """
+    placeholder = df['Service'].isin(PLACEHOLDER_SERVICES).to_numpy() if 'Service' in df.columns \
+        else np.zeros(len(df), dtype=bool)
+    dates = parse_dates(df['Date'])
+    undated = dates.isna().to_numpy() & ~placeholder
+    valid = ~undated & ~placeholder
+    rows = df[valid].copy()
+
+    # Tout en texte, comme une extraction relue en CSV (valeurs manquantes conservées)
+    for column in rows.columns:
+        if rows[column].dtype != object:
+            rows[column] = rows[column].astype(str).where(rows[column].notna(), None)
+
+    # Dates et mois canoniques, convertis une fois par jour distinct
+    codes, days = pd.factorize(dates[valid].to_numpy().astype('datetime64[D]'))
+    days = np.asarray(days, dtype='datetime64[D]')
+    rows['Date'] = days.astype(str).astype(object)[codes]
+    months = days.astype('datetime64[M]').astype(str).astype(object)[codes]
+
+    # Toutes les lignes sont conservées (une clé peut être répartie sur plusieurs valeurs
+    # de tags) ; les doublons sont traités par le contrôle qualité de la transformation
+    keys = store_keys()
+    values = [c for c in rows.columns if c not in keys]
+    rows[SLICE_HASH] = row_hashes(rows, SLICE_COLUMNS)
+    rows[KEY_HASH] = row_hashes(rows, keys)
+    rows[ROW_HASH] = row_hashes(rows, values)
+    return rows, months, int(undated.sum()), int(placeholder.sum())
+
+
+def _pair_hashes(keys, values):
+    """Empreinte combinée (clé, valeurs) d'une ligne"""
+    with np.errstate(over='ignore'):
+        return keys * np.uint64(0x9E3779B97F4A7C15) ^ values
+
+
+def merge_month(path, rows):
+    """
+    Fusionne les lignes d'un mois dans sa version stockée
+
+    Les lignes stockées des tranches présentes dans rows sont remplacées par
+    celles de rows. Seules les empreintes du mois sont lues pour comparer les
+    tranches ; le mois n'est relu en entier et réécrit que si une tranche change.
+
+    Returns:
+        (mois fusionné ou None s'il est inchangé,
+         compteurs {inserted, updated, unchanged, removed})
+    """
+    def storage_order(frame):
+        return frame.iloc[np.argsort(_sort_key(frame['Date'], frame[KEY_HASH].to_numpy()), kind='stable')]
+
+    keys = rows[KEY_HASH].to_numpy()
+    if not os.path.exists(path):
+        counts = {'inserted': len(rows), 'updated': 0, 'unchanged': 0, 'removed': 0}
+        return storage_order(rows).reset_index(drop=True), counts
+
+    hashes = _read_month(path, list(HASH_COLUMNS))
+    touched = np.isin(hashes[SLICE_HASH].to_numpy(), rows[SLICE_HASH].unique())
+    stored_keys = hashes[KEY_HASH].to_numpy()[touched]
+    stored_pairs = _pair_hashes(stored_keys, hashes[ROW_HASH].to_numpy()[touched])
+    pairs = _pair_hashes(keys, rows[ROW_HASH].to_numpy())
+
+    same = np.isin(pairs, stored_pairs)
+    known = np.isin(keys, stored_keys)
+    counts = {
+        'inserted': int((~known).sum()),
+        'updated': int((known & ~same).sum()),
+        'unchanged': int(same.sum()),
+        'removed': int((~np.isin(stored_keys, keys)).sum()),
+    }
+    if len(pairs) == len(stored_pairs) and np.array_equal(np.sort(pairs), np.sort(stored_pairs)):
+        return None, counts
+
+    existing = _read_month(path)
+    # Colonnes apparues ou disparues d'une extraction à l'autre
+    columns = list(existing.columns) + [c for c in rows.columns if c not in existing.columns]
+    merged = pd.concat([existing[~touched].reindex(columns=columns), rows.reindex(columns=columns)],
+                       ignore_index=True)
+    return storage_order(merged).reset_index(drop=True), counts
+
+
+def upsert(df, store_dir=RAW_STORE_DIR):
+    """
+    Fusionne une extraction dans le magasin (remplacement des tranches qu'elle contient)
+
+    Args:
+        df: Extraction brute (colonnes du schéma unifié, Tag_* et ResourceId facultatifs)
+
+    Returns:
+        Compteurs {rows, inserted, updated, unchanged, removed, undated, placeholders,
+                   months_written}
+    """
+    rows, months, undated, placeholders = prepare_rows(df)
+    stats = {'rows': len(df), 'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0,
+             'undated': undated, 'placeholders': placeholders, 'months_written': 0}
+
+    for month, month_rows in rows.groupby(months, sort=True):
+        path = month_path(month, store_dir)
+        with _month_lock(month, store_dir):
+            merged, counts = merge_month(path, month_rows)
+            if merged is not None:
+                _write_month(merged, path)
+                stats['months_written'] += 1
+        for name, value in counts.items():
+            stats[name] += value
+    return stats
+
+
+def store_columns(months, store_dir=RAW_STORE_DIR):
+    """Colonnes communes à tous les mois lus (schéma unifié d'abord, empreintes exclues)"""
+    import pyarrow.parquet as pq
+
+    columns = []
+    for month in months:
+        for name in pq.read_schema(month_path(month, store_dir)).names:
+            if name not in columns and name not in HASH_COLUMNS:
+                columns.append(name)
+    return [c for c in EXPECTED_COLUMNS if c in columns] + [c for c in columns if c not in EXPECTED_COLUMNS]
+
+
+def _window_months(window, store_dir=RAW_STORE_DIR):
+    """Mois du magasin recouvrant une fenêtre (début inclus, fin exclue), tous si None"""
+    months = list_months(store_dir)
+    if window is None:
+        return months
+    start, end = window
+    last = (pd.Timestamp(end) - pd.Timedelta(days=1)).strftime('%Y-%m')
+    return [m for m in months if start[:7] <= m <= last]
+
+
+def read_store(store_dir=RAW_STORE_DIR, window=None, chunksize=None, columns=None):
+    """
+    Lit le magasin comme un fichier brut (toutes colonnes en texte, mêmes colonnes par bloc)
+
+    Args:
+        window: (début inclus, fin exclue) des dates lues (None : tout l'historique)
+        chunksize: Si fourni, itérateur de blocs d'au plus chunksize lignes
+        columns: Si fourni, seules ces colonnes du magasin sont lues
+
+    Returns:
+        DataFrame, ou itérateur de DataFrame si chunksize
+    """
+    months = _window_months(window, store_dir)
+    stored = store_columns(months, store_dir) if months else list(EXPECTED_COLUMNS)
+    columns = stored if columns is None else [c for c in columns if c in stored]
+
+    def blocks():
+        import pyarrow.parquet as pq
+
+        for month in months:
+            parquet = pq.ParquetFile(month_path(month, store_dir))
+            # La date est toujours lue : elle sert au filtrage sur la fenêtre
+            read = [c for c in dict.fromkeys(columns + ['Date']) if c in parquet.schema_arrow.names]
+            for batch in parquet.iter_batches(batch_size=chunksize or 1_000_000, columns=read):
+                block = batch.to_pandas()
+                if window is not None:
+                    block = block[(block['Date'] >= window[0]) & (block['Date'] < window[1])]
+                # Colonnes absentes de ce mois : texte vide, comme une colonne CSV lue en str
+                missing = [c for c in columns if c not in block.columns]
+                block = block.reindex(columns=columns)
+                if missing:
+                    block[missing] = block[missing].astype(object)
+                if len(block):
+                    yield block.reset_index(drop=True)
+
+    if chunksize is not None:
+        return blocks()
+    frames = list(blocks())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def store_window(store_dir=RAW_STORE_DIR):
+    """Fenêtre (début inclus, fin exclue) couvrant tous les mois du magasin, None s'il est vide"""
+    months = list_months(store_dir)
+    if not months:
+        return None
+    end = pd.Period(months[-1], freq='M') + 1
+    return f'{months[0]}-01', end.start_time.strftime('%Y-%m-%d')
+
+
+def store_digests(window=None, store_dir=RAW_STORE_DIR):
+    """{mois: sha256} des fichiers lus pour une fenêtre (empreinte de la transformation)"""
+    return {f'raw_store/month={month}': file_digest(month_path(month, store_dir))
+            for month in _window_months(window, store_dir)}
+
+
+def read_extraction(path):
+    """Lit une extraction CSV en texte (comme transform_costs.read_raw_csv)"""
+    return pd.read_csv(path, dtype=str)
+
+
+def backfill(base_dir=RAW_DIR, store_dir=RAW_STORE_DIR):
+    """
+    Fusionne dans le magasin les extractions déjà sur disque, de la plus ancienne
+    à la plus récente (les réécritures récentes l'emportent)
+
+    Returns:
+        Compteurs cumulés (voir upsert)
+    """
+    files = [os.path.join(partition_dir(base_dir, ds), 'multicloud_costs.csv') for ds in list_partitions(base_dir)]
+    files += sorted(glob.glob(os.path.join(base_dir, 'multicloud_costs_*.csv')))
+    files = sorted((f for f in files if os.path.exists(f)), key=os.path.getmtime)
+
+    totals = {}
+    for path in files:
+        stats = upsert(read_extraction(path), store_dir)
+        print(f"   ➕ {path} : {stats['inserted']:,} ajoutées, {stats['updated']:,} modifiées, "
+              f"{stats['unchanged']:,} inchangées, {stats['removed']:,} supprimées")
+        for name, value in stats.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def main():
+    """Alimentation et aperçu du magasin brut"""
+    parser = argparse.ArgumentParser(description="Magasin brut des coûts (upsert par clé)")
+    parser.add_argument('files', nargs='*', help="Extractions CSV à fusionner, dans l'ordre")
+    parser.add_argument('--backfill', action='store_true',
+                        help="Fusionner toutes les extractions présentes dans data/raw")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("🗄️  MAGASIN BRUT DES COÛTS")
+    print("="*60)
+
+    if args.backfill:
+        backfill()
+    if args.files:
+        for path in args.files:
+            stats = upsert(read_extraction(path))
+            print(f"   ➕ {path} : {stats['inserted']:,} ajoutées, {stats['updated']:,} modifiées, "
+                  f"{stats['unchanged']:,} inchangées, {stats['removed']:,} supprimées")
+
+    import pyarrow.parquet as pq
+
+    months = list_months()
+    print(f"\n   📚 {len(months)} mois\n")
+    for month in months:
+        print(f"   {month} : {pq.ParquetFile(month_path(month)).metadata.num_rows:12,} lignes")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Profilage du rendu du dashboard
+Mesure, à chaque réexécution du script Streamlit, la durée de chaque section de
+main(), des requêtes, de la construction des figures et de leur envoi au navigateur
+(avec la taille de la charge utile), pour savoir où part le temps quand c'est lent
+"""
+
+import functools
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+
+# Types d'étapes mesurées
+SECTION = 'section'
+QUERY = 'requête'
+FIGURE = 'figure'
+SEND = 'envoi'
+
+# Colonnes du tableau de profilage (et du journal CSV)
+PROFILE_COLUMNS = ['Section', 'Étape', 'Type', 'Durée (ms)', 'Octets']
+
+# Profileur de la réexécution en cours, propre au thread de la session Streamlit
+_local = threading.local()
+
+
+def profiling_requested():
+    """Mode profilage activé par défaut via FINOPS_PROFILE=1"""
+    return os.getenv('FINOPS_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def payload_size(obj):
+    """
+    Taille approximative (octets) de ce que Streamlit envoie au navigateur
+
+    Args:
+        obj: Figure plotly (JSON), DataFrame (flux Arrow IPC) ou octets
+
+    Returns:
+        Nombre d'octets, ou None si le type n'est pas mesurable
+    """
+    if isinstance(obj, (bytes, str)):
+        return len(obj)
+    if hasattr(obj, 'to_plotly_json'):
+        return len(obj.to_json())
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        frame = obj.to_frame() if isinstance(obj, pd.Series) else obj
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(frame)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue().size
+        except Exception:
+            return int(frame.memory_usage(deep=True).sum())
+    return None
+
+
+class RenderProfiler:
+    """Mesures d'une réexécution du dashboard (inactif : aucune mesure, coût nul)"""
+
+    def __init__(self, enabled=False, log_path=None):
+        """
+        Args:
+            enabled: Mesurer cette réexécution
+            log_path: Journal CSV où ajouter les mesures (défaut : FINOPS_PROFILE_LOG, sinon aucun)
+        """
+        self.enabled = enabled
+        self.log_path = log_path or os.getenv('FINOPS_PROFILE_LOG') or None
+        self.records = []
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._section = None
+
+    def activate(self):
+        """Profileur courant du thread (utilisé par le décorateur timed)"""
+        _local.profiler = self
+        return self
+
+    def deactivate(self):
+        """Fin de la réexécution : un fragment réexécuté seul ouvrira son propre profileur"""
+        if getattr(_local, 'profiler', None) is self:
+            _local.profiler = None
+
+    def record(self, step, kind, seconds, size=None):
+        """Ajoute une mesure"""
+        self.records.append({
+            'Section': self._section or '',
+            'Étape': step,
+            'Type': kind,
+            'Durée (ms)': round(seconds * 1000, 1),
+            'Octets': size,
+        })
+
+    @contextmanager
+    def section(self, name):
+        """Mesure une section de main() ; les mesures imbriquées lui sont rattachées"""
+        if not self.enabled:
+            yield
+            return
+        previous, self._section = self._section, name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._section = previous
+            self.record(name, SECTION, time.perf_counter() - started)
+
+    @contextmanager
+    def send(self, step, payload):
+        """Mesure l'envoi d'un élément au navigateur (sérialisation comprise) et sa taille"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.record(step, SEND, elapsed, payload_size(payload))
+
+    def measure(self, step, kind, function, *args, **kwargs):
+        """Appelle function en mesurant sa durée"""
+        if not self.enabled:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(step, kind, time.perf_counter() - started)
+
+    def queries(self, queries):
+        """Moteur de requêtes dont chaque appel est mesuré (inchangé si inactif)"""
+        return ProfiledQueries(queries) if self.enabled else queries
+
+    def total_ms(self):
+        """Durée écoulée depuis le début de la réexécution (ms)"""
+        return round((time.perf_counter() - self._started) * 1000, 1)
+
+    def table(self):
+        """
+        Tableau des mesures de la réexécution
+
+        Returns:
+            DataFrame (PROFILE_COLUMNS), dans l'ordre des mesures, plus une ligne Total
+        """
+        table = pd.DataFrame(self.records, columns=PROFILE_COLUMNS)
+        total = pd.DataFrame([{
+            'Section': '', 'Étape': 'Total', 'Type': SECTION,
+            'Durée (ms)': self.total_ms(), 'Octets': table['Octets'].sum(min_count=1),
+        }], columns=PROFILE_COLUMNS)
+        return pd.concat([table, total], ignore_index=True)
+
+    def summary(self):
+        """Durées par type d'étape et octets envoyés (historique des réexécutions)"""
+        table = pd.DataFrame(self.records, columns=PROFILE_COLUMNS)
+        nested = table[table['Type'] != SECTION]
+        summary = {'Heure': self.started_at.strftime('%H:%M:%S'), 'Total (ms)': self.total_ms()}
+        for kind in (QUERY, FIGURE, SEND):
+            summary[f"{kind.capitalize()}s (ms)"] = round(nested.loc[nested['Type'] == kind, 'Durée (ms)'].sum(), 1)
+        summary['Octets envoyés'] = int(nested['Octets'].sum())
+        return summary
+
+    def save(self, run_label=None):
+        """
+        Ajoute les mesures au journal CSV (une ligne par étape), si configuré
+
+        Args:
+            run_label: Version des données affichées (voir run_watcher.version_label)
+        """
+        if not (self.enabled and self.log_path):
+            return
+        log = self.table()
+        log.insert(0, 'Rerun', self.started_at.isoformat(timespec='milliseconds'))
+        log.insert(1, 'Run', run_label)
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        buffer = io.StringIO()
+        log.to_csv(buffer, index=False, header=not os.path.exists(self.log_path))
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+
+
+class ProfiledQueries:
+    """
+    Enveloppe d'un moteur de requêtes (cost_queries) qui mesure chaque appel
+
+    Les mesures vont au profileur courant : un fragment Streamlit réexécuté seul
+    reçoit la même enveloppe que lors du rendu complet qui l'a créé.
+    """
+
+    def __init__(self, queries):
+        self._queries = queries
+
+    def __getattr__(self, name):
+        attribute = getattr(self._queries, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def measured(*args, **kwargs):
+            # Clés de regroupement dans le libellé : aggregate(Date, AccountName)
+            detail = ', '.join(args[0]) if args and isinstance(args[0], (list, tuple)) else ''
+            return current().measure(f"{name}({detail})", QUERY, attribute, *args, **kwargs)
+        return measured
+
+
+def active():
+    """Profileur de la réexécution en cours dans ce thread, ou None"""
+    return getattr(_local, 'profiler', None)
+
+
+def current():
+    """Profileur de la réexécution en cours dans ce thread (inactif par défaut)"""
+    profiler = active()
+    return profiler if profiler is not None else RenderProfiler()
+
+
+def timed(kind=FIGURE):
+    """Décorateur : mesure la fonction (par son nom) si le profilage est actif"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return current().measure(function.__name__, kind, function, *args, **kwargs)
+        return wrapper
+    return decorator
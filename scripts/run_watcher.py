@@ -0,0 +1,184 @@
+"""
+Surveillance des exécutions du pipeline pour le dashboard
+Un thread d'arrière-plan détecte une nouvelle exécution (manifeste de la dernière
+partition, ou dernier fichier horodaté), la charge hors du chemin des requêtes et
+la substitue d'un bloc à la version affichée : aucun utilisateur n'attend un rechargement
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from arrow_snapshot import SNAPSHOT_EXT
+from fingerprints import MANIFEST_NAME
+from partitions import PROCESSED_DIR, partition_dir, latest_partition
+
+
+# Intervalle (secondes) entre deux vérifications d'une nouvelle exécution
+DEFAULT_RELOAD_INTERVAL = 30
+
+
+def find_latest_run():
+    """
+    Localise les fichiers de la dernière transformation
+
+    Returns:
+        Dictionnaire des chemins (enriched, parquet, snapshot, rollups, kpis, budgets, manifest) ou None
+    """
+
+    # Partition datée la plus récente (pipeline Airflow)
+    ds = latest_partition(PROCESSED_DIR)
+    if ds is not None:
+        directory = partition_dir(PROCESSED_DIR, ds)
+        paths = {
+            'ds': ds,
+            'enriched': os.path.join(directory, 'costs_enriched.csv'),
+            'parquet': os.path.join(directory, 'costs_enriched.parquet'),
+            'snapshot': os.path.join(directory, f'costs_enriched.{SNAPSHOT_EXT}'),
+            'rollups': os.path.join(directory, 'rollups.json'),
+            'kpis': os.path.join(directory, 'kpis.json'),
+            'budgets': os.path.join(directory, 'budget_status.csv'),
+            'manifest': os.path.join(directory, MANIFEST_NAME),
+        }
+    else:
+        # Sinon : fichiers horodatés (exécutions manuelles historiques)
+        enriched_files = glob.glob(os.path.join(PROCESSED_DIR, 'costs_enriched_*.csv'))
+        if not enriched_files:
+            return None
+        latest_file = max(enriched_files, key=os.path.getctime)
+        kpi_files = glob.glob(os.path.join(PROCESSED_DIR, 'kpis_*.json'))
+        paths = {
+            'ds': None,
+            'enriched': latest_file,
+            'parquet': latest_file[:-len('.csv')] + '.parquet',
+            'snapshot': latest_file[:-len('.csv')] + f'.{SNAPSHOT_EXT}',
+            'rollups': latest_file.replace('costs_enriched_', 'rollups_')[:-len('.csv')] + '.json',
+            'kpis': max(kpi_files, key=os.path.getctime) if kpi_files else None,
+            'budgets': latest_file.replace('costs_enriched_', 'budget_status_'),
+            'manifest': None,
+        }
+
+    for key in ('parquet', 'snapshot', 'rollups', 'kpis', 'budgets', 'manifest'):
+        if paths[key] is not None and not os.path.exists(paths[key]):
+            paths[key] = None
+    return paths
+
+
+def run_version(paths):
+    """
+    Version d'une exécution : empreinte du manifeste (écrit en dernier par la
+    transformation), sinon fichier enrichi et date de modification
+
+    Returns:
+        Dictionnaire (ds, fingerprint, transformed_at) comparable entre deux vérifications
+    """
+    if paths['manifest'] is not None:
+        with open(paths['manifest'], 'r') as f:
+            manifest = json.load(f)
+        return {
+            'ds': paths['ds'],
+            'fingerprint': manifest.get('fingerprint'),
+            'transformed_at': manifest.get('transformed_at'),
+        }
+    modified = datetime.fromtimestamp(os.path.getmtime(paths['enriched']))
+    return {
+        'ds': paths['ds'] or os.path.basename(paths['enriched']),
+        'fingerprint': None,
+        'transformed_at': modified.isoformat(timespec='seconds'),
+    }
+
+
+def version_label(version):
+    """Libellé court d'une version (badge du dashboard)"""
+    label = f"dt={version['ds']}" if version['fingerprint'] else str(version['ds'])
+    if version['fingerprint']:
+        label += f" · {version['fingerprint'][:8]}"
+    if version['transformed_at']:
+        label += f" · {version['transformed_at'].replace('T', ' ')}"
+    return label
+
+
+class LoadedRun:
+    """Exécution chargée et prête à être affichée (immuable une fois publiée)"""
+
+    def __init__(self, version, paths, data):
+        """
+        Args:
+            version: Résultat de run_version
+            paths: Résultat de find_latest_run
+            data: Ce que renvoie la fonction de chargement du watcher
+        """
+        self.version = version
+        self.label = version_label(version)
+        self.paths = paths
+        self.data = data
+        self.loaded_at = datetime.now()
+
+
+class RunWatcher:
+    """Charge la dernière exécution et la remplace en arrière-plan quand une nouvelle arrive"""
+
+    def __init__(self, load, interval=None):
+        """
+        Args:
+            load: Fonction (paths) → données prêtes à l'emploi, appelée hors des requêtes
+            interval: Secondes entre deux vérifications (défaut : FINOPS_RELOAD_INTERVAL ou 30)
+        """
+        self.load = load
+        self.interval = interval or float(os.getenv('FINOPS_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
+        self._current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def current(self):
+        """Exécution affichée (ou None) ; ne bloque jamais sur un chargement en cours"""
+        return self._current
+
+    def check(self):
+        """
+        Charge la dernière exécution si sa version a changé, puis la publie
+
+        Returns:
+            True si une nouvelle version a été publiée
+        """
+        with self._lock:
+            try:
+                paths = find_latest_run()
+                if paths is None:
+                    return False
+                version = run_version(paths)
+                if self._current is not None and self._current.version == version:
+                    return False
+                started = time.perf_counter()
+                run = LoadedRun(version, paths, self.load(paths))
+            except Exception as e:
+                # Exécution en cours d'écriture ou illisible : la version affichée reste en place
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️  Rechargement du dashboard reporté ({self.last_error})")
+                return False
+            self._current = run
+            self.last_error = None
+            print(f"🔄 Exécution chargée : {run.label} ({time.perf_counter() - started:.1f}s)")
+            return True
+
+    def _watch(self):
+        """Boucle du thread de surveillance"""
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Premier chargement (bloquant une seule fois par processus), puis surveillance"""
+        self.check()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='run-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrête la surveillance"""
+        self._stop.set()
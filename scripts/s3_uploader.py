@@ -2,12 +2,12 @@
 Module pour uploader les données vers S3
 """
 
-import boto3
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 import glob
 import logging
+from partitions import PROCESSED_DIR, partition_dir
 
 load_dotenv()
 
@@ -18,6 +18,8 @@ class S3Uploader:
     """Classe pour gérer les uploads vers S3"""
     
     def __init__(self):
+        import boto3
+        
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
@@ -75,6 +77,44 @@ class S3Uploader:
         
         logger.info(f"✅ Upload terminé : {uploaded_count} fichiers uploadés")
         return uploaded_count
+    
+    def upload_partition(self, ds):
+        """
+        Upload la partition transformée d'une date logique vers S3
+        
+        Les clés S3 ne dépendent que de ds et du nom de fichier : une
+        re-exécution écrase les mêmes objets au lieu d'en créer de nouveaux.
+        
+        Args:
+            ds: Date logique de la partition (YYYY-MM-DD)
+        """
+        
+        logger.info(f"📤 Upload de la partition {ds} vers S3...")
+        
+        local_dir = partition_dir(PROCESSED_DIR, ds)
+        uploaded_count = 0
+        
+        # Fichiers à uploader (noms fixes dans la partition)
+        file_targets = [
+            ('costs_enriched.csv', 'processed/daily/'),
+            ('daily_costs.csv', 'processed/daily/'),
+            ('top10_services.csv', 'reports/'),
+            ('monthly_evolution.csv', 'reports/'),
+            ('series_anomalies.csv', 'reports/'),
+            ('forecasts.csv', 'reports/'),
+            ('budget_breaches.csv', 'reports/'),
+            ('kpis.json', 'kpis/')
+        ]
+        
+        for filename, s3_folder in file_targets:
+            local_path = os.path.join(local_dir, filename)
+            if os.path.exists(local_path):
+                s3_key = f"{s3_folder}dt={ds}/{filename}"
+                if self.upload_file(local_path, s3_key):
+                    uploaded_count += 1
+        
+        logger.info(f"✅ Upload terminé : {uploaded_count} fichiers uploadés")
+        return uploaded_count
 
 
 def main():
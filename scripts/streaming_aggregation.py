@@ -0,0 +1,96 @@
+"""
+Agrégation en flux des coûts lus bloc par bloc (exports CUR, exports Azure)
+Chaque bloc est réduit à la somme des coûts par groupe ; les agrégats intermédiaires,
+à clés catégorielles, sont recompactés au-delà d'un seuil : la mémoire reste bornée
+par le nombre de groupes distincts, pas par la taille des fichiers lus
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Nombre de lignes agrégées en attente au-delà duquel elles sont recompactées
+MAX_PARTIAL_ROWS = 1_000_000
+
+
+class StreamingAggregator:
+    """Somme des coûts par groupe, alimentée bloc par bloc"""
+
+    def __init__(self, keys, max_partial_rows=MAX_PARTIAL_ROWS):
+        """
+        Args:
+            keys: Colonnes de regroupement
+            max_partial_rows: Seuil de recompactage des agrégats intermédiaires
+        """
+        self.keys = list(keys)
+        self.max_partial_rows = max_partial_rows
+        # Seuil courant : relevé après chaque recompactage (voir add)
+        self.threshold = max_partial_rows
+        self.partials = []
+        self.pending_rows = 0
+        self.compactions = 0
+
+    def _aggregate(self, frame):
+        """
+        Somme des coûts par groupe
+
+        Les clés du résultat sont catégorielles : les agrégats intermédiaires gardés
+        en mémoire ne stockent chaque chaîne distincte qu'une fois.
+        """
+        result = frame.groupby(self.keys, sort=False, observed=True)['Cost'].sum().reset_index()
+        for key in self.keys:
+            if not isinstance(result[key].dtype, pd.CategoricalDtype):
+                result[key] = result[key].astype('category')
+        return result
+
+    def _concat(self, partials):
+        """Concatène des agrégats intermédiaires (union des catégories de chaque clé)"""
+        if len(partials) == 1:
+            return partials[0]
+        frame = pd.DataFrame({
+            key: union_categoricals([p[key] for p in partials], ignore_order=True)
+            for key in self.keys
+        })
+        frame['Cost'] = np.concatenate([p['Cost'].to_numpy() for p in partials])
+        return frame
+
+    def add(self, frame):
+        """
+        Agrège un bloc (clés + Cost) et recompacte si le seuil est dépassé
+
+        Après un recompactage, le seuil passe au double de l'agrégat obtenu : au-delà
+        de max_partial_rows groupes distincts, chaque recompactage est précédé d'au
+        moins autant de lignes nouvelles que l'agrégat en contient (coût total linéaire
+        au lieu de réagréger tout l'état à chaque bloc).
+        """
+        if len(frame) == 0:
+            return self
+        partial = self._aggregate(frame)
+        self.partials.append(partial)
+        self.pending_rows += len(partial)
+
+        if self.pending_rows > self.threshold and len(self.partials) > 1:
+            self.partials = [self._aggregate(self._concat(self.partials))]
+            self.pending_rows = len(self.partials[0])
+            self.threshold = max(self.max_partial_rows, 2 * self.pending_rows)
+            self.compactions += 1
+        return self
+
+    def result(self):
+        """
+        Agrégat final, clés en texte, trié par clés (ordre stable, indépendant
+        de l'ordre de lecture des fichiers), coûts arrondis à 8 décimales
+
+        Returns:
+            DataFrame (keys, Cost), vide si aucun bloc n'a été ajouté
+        """
+        if not self.partials:
+            return pd.DataFrame(columns=self.keys + ['Cost'])
+
+        result = self._aggregate(self._concat(self.partials))
+        for key in self.keys:
+            result[key] = result[key].astype(object)
+        result = result.sort_values(self.keys, kind='stable', ignore_index=True)
+        result['Cost'] = result['Cost'].round(8)
+        return result
@@ -0,0 +1,110 @@
+"""
+Configuration de la transformation des coûts
+Centralisée ici pour être versionnée et prise en compte dans l'empreinte des entrées
+"""
+
+# Incrémenter à chaque changement de logique qui modifie les sorties
+TRANSFORM_VERSION = 18
+
+# Catégories de services (mots-clés recherchés dans le nom du service)
+SERVICE_CATEGORIES = {
+    'Compute': ['EC2', 'Lambda', 'ECS', 'Fargate', 'Batch'],
+    'Storage': ['S3', 'EBS', 'EFS', 'Glacier'],
+    'Database': ['RDS', 'DynamoDB', 'ElastiCache', 'Redshift'],
+    'Networking': ['VPC', 'CloudFront', 'Route53', 'Data Transfer', 'NAT Gateway'],
+    'Analytics': ['Athena', 'EMR', 'Kinesis', 'QuickSight'],
+    'Security': ['IAM', 'KMS', 'Secrets Manager', 'GuardDuty'],
+    'Management': ['CloudWatch', 'Config', 'Systems Manager']
+}
+
+# Contrôle qualité des données brutes (voir data_quality.validate_frame)
+DATA_QUALITY = {
+    # Clé d'une ligne de coût : une seule ligne par jour, compte, service et région
+    # (et ressource pour les sources détaillées) ; les colonnes absentes sont ignorées
+    'dedup_keys': ['Date', 'Cloud', 'AccountId', 'Service', 'Region', 'ResourceId'],
+    # Devises acceptées : converties en devise de référence (voir FX), taux BCE disponibles
+    'currencies': ['USD', 'EUR', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD', 'INR', 'BRL', 'SEK', 'NOK', 'DKK'],
+    # Ancienneté maximale (jours) d'une date par rapport à la partition traitée
+    'max_lookback_days': 400,
+}
+
+# Normalisation des coûts en devise de référence (voir fx_rates.ensure_fx_rates)
+FX = {
+    'base_currency': 'USD',
+    'max_staleness_days': 7,        # ancienneté maximale du dernier taux publié
+}
+
+# Répartition des coûts partagés entre équipes (voir cost_allocation.AllocationRules) ;
+# le contenu du fichier de règles entre dans l'empreinte de la transformation
+ALLOCATION = {
+    'rules_file': 'data/config/allocation_rules.json',
+}
+
+# Budgets par compte, service, catégorie ou tag (voir budgets.Budgets) ; le contenu
+# du fichier entre dans l'empreinte de la transformation
+BUDGETS = {
+    'budgets_file': 'data/config/budgets.json',
+    'lookback_days': 28,            # historique de la prévision de fin de période
+}
+
+# Résumés en flux des dimensions à forte cardinalité (voir cost_sketches.CostSketches)
+SKETCHES = {
+    'top_k_dimensions': ['Service', 'ResourceId'],  # Space-Saving pondéré par le coût
+    'top_k_capacity': 500,                          # compteurs par jour et dimension
+    'distinct': {'ResourceId': 'AccountId'},        # HyperLogLog : valeurs distinctes par groupe
+    'hll_precision': 12,                            # 4096 registres, erreur type ≈ 1.6 %
+}
+
+# Rollups matérialisés (voir cost_cube.build_rollups) : (grain, niveau service, niveau compte)
+# grain 'day' / 'week' / 'month' ; service 'Service' / 'ServiceCategory' / None ;
+# compte 'AccountName' / 'Cloud' / None (None : tous confondus)
+ROLLUPS = [
+    ('day', 'Service', 'AccountName'),
+    ('day', 'Service', 'Cloud'),
+    ('day', 'ServiceCategory', 'AccountName'),
+    ('day', None, 'Cloud'),
+    ('week', 'Service', 'AccountName'),
+    ('month', 'Service', 'AccountName'),
+    ('month', 'ServiceCategory', 'AccountName'),
+    ('month', None, 'Cloud'),
+]
+
+# Dimension calendrier (voir calendar_dimension.build_calendar)
+CALENDAR = {
+    'fiscal_year_start_month': 1,   # 1 = exercice calé sur l'année civile
+    'holidays': 'FR',               # 'FR', 'US' ou None
+    'extra_holidays': {},           # {'YYYY-MM-DD': 'Libellé'} (ponts, fermetures...)
+}
+
+# Détection d'anomalies par série (voir anomaly_detection.detect_anomalies)
+ANOMALY_DETECTION = {
+    'method': 'rolling',
+    'window': 14,
+    'z_threshold': 3.5,
+    'min_history': 7,
+    'min_excess': 1.0,
+    'zero_fill': {},                # Séries dont un jour sans donnée vaut $0 ({'Service': [...]})
+}
+
+# Prévision de fin de mois (voir forecasting.forecast_month_end)
+FORECAST = {
+    'confidence': 0.9,
+    'min_days_weekly': 21,
+}
+
+
+def as_dict():
+    """Retourne la configuration sous forme sérialisable (pour l'empreinte)"""
+    return {
+        'transform_version': TRANSFORM_VERSION,
+        'service_categories': SERVICE_CATEGORIES,
+        'data_quality': DATA_QUALITY,
+        'fx': FX,
+        'allocation': ALLOCATION,
+        'budgets': BUDGETS,
+        'sketches': SKETCHES,
+        'rollups': ROLLUPS,
+        'calendar': CALENDAR,
+        'anomaly_detection': ANOMALY_DETECTION,
+        'forecast': FORECAST,
+    }
@@ -6,18 +6,383 @@ Nettoie, enrichit et agrège les données pour l'analyse
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import argparse
 import os
 import glob
+import sys
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from partitions import (
+    RAW_DIR, PROCESSED_DIR, QUARANTINE_DIR, partition_dir, extraction_window, publish_dir,
+    write_csv_atomic, write_json_atomic
+)
+import transform_config
+from calendar_dimension import add_calendar_columns, build_calendar
+from data_quality import RULES, SeenRows, check_schema, parse_dates, validate_frame
+from fx_rates import ensure_fx_rates
+from cost_allocation import ALLOCATION_KEYS, UNALLOCATED, AllocationRules, allocation_columns
+from budgets import Budgets, breaches, incomplete, unmeasured
+from cost_sketches import DISTINCT_FILE, TOP_K_FILE, CostSketches
+from cost_cube import ROLLUP_INDEX, ROLLUP_KEYS, CostCube, build_rollups
+from kpi_history import append_kpis, history_available, kpi_record
+from arrow_snapshot import SNAPSHOT_EXT, snapshot_available, write_dataset_snapshot, write_frame_snapshot
+from anomaly_detection import SERIES_KEYS, detect_anomalies
+from forecasting import FORECAST_KEYS, forecast_month_end
+from raw_store import RAW_STORE_DIR, read_store, store_digests, store_window
+from fingerprints import (
+    UNCHANGED_EXIT_CODE, raw_partition_digests, compute_fingerprint,
+    is_transform_current, record_transform
+)
+
+
+# Types des colonnes brutes : tout est lu comme texte (y compris ResourceId et les
+# colonnes Tag_* facultatives) pour que chaque bloc (mode par morceaux) ait le même
+# schéma et pour conserver les zéros initiaux des identifiants ; Date et Cost sont
+# convertis par le contrôle qualité (valeurs illisibles en quarantaine)
+RAW_DTYPE = str
+
+# Agrégats partiels fusionnables : nom → clés de regroupement
+AGGREGATE_KEYS = {
+    'daily': ['Date'],
+    'daily_service': ['Date', 'Service'],
+    'monthly_account': ['YearMonth', 'AccountName'],
+    'category': ['Date', 'ServiceCategory'],
+    'region': ['Date', 'Region'],
+    'series_daily': ['Date'] + SERIES_KEYS,
+    # Base de la répartition des coûts partagés (+ colonnes Tag_*, voir cost_allocation)
+    'allocation': ALLOCATION_KEYS,
+    # Base des rollups du cube (+ nombre de lignes, voir cost_cube)
+    'rollup': ROLLUP_KEYS,
+}
+
+
+def read_raw_csv(path, chunksize=None, window=None):
+    """
+    Lit un fichier brut avec un schéma fixe (itérateur de blocs si chunksize)
+    
+    Un répertoire est lu comme le magasin brut (raw_store), limité aux mois de window
+    """
+    if os.path.isdir(path):
+        return read_store(path, window=window, chunksize=chunksize)
+    return pd.read_csv(path, dtype=RAW_DTYPE, chunksize=chunksize)
+
+
+def scan_currencies(path, window=None):
+    """
+    Devises présentes dans un fichier brut ou le magasin brut (seules les colonnes
+    Currency et Date sont lues) et période des lignes à convertir
+    
+    Args:
+        path: Fichier CSV brut ou répertoire du magasin brut
+        window: (début, fin exclue) des dates lues dans le magasin, ou None
+    
+    Returns:
+        (devises présentes, (début, fin exclue) des lignes hors devise de référence,
+         None s'il n'y en a pas)
+    """
+    if not os.path.exists(path):
+        return set(), None
+    if os.path.isdir(path):
+        blocks = read_store(path, window=window, chunksize=1_000_000, columns=['Currency', 'Date'])
+    else:
+        blocks = pd.read_csv(path, dtype=RAW_DTYPE, chunksize=1_000_000,
+                             usecols=lambda column: column in ('Currency', 'Date'))
+    base = transform_config.FX['base_currency']
+    currencies, first, last = set(), None, None
+    for block in blocks:
+        if 'Currency' not in block.columns:
+            continue
+        currencies.update(block['Currency'].dropna().unique())
+        if 'Date' in block.columns:
+            dates = parse_dates(block.loc[block['Currency'].notna() & (block['Currency'] != base), 'Date']).dropna()
+            if len(dates):
+                first = dates.min() if first is None else min(first, dates.min())
+                last = dates.max() if last is None else max(last, dates.max())
+    if first is None:
+        return currencies, None
+    end = last.normalize() + pd.Timedelta(days=1)
+    return currencies, (first.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+
+
+def load_fx_rates(window=None, currencies=None):
+    """
+    Taux de change de la fenêtre traitée (cache data/reference/, complété si besoin)
+    
+    Args:
+        window: (début, fin exclue) ; par défaut les max_lookback_days derniers jours
+                (mode historique : période des données, voir scan_currencies)
+        currencies: Devises présentes dans les données (voir scan_currencies) ;
+                    par défaut toutes les devises acceptées. Seuls leurs taux sont
+                    chargés : des données toutes en devise de référence ne
+                    déclenchent aucun téléchargement
+    """
+    if window is None:
+        window = extraction_window(datetime.now().strftime('%Y-%m-%d'),
+                                   transform_config.DATA_QUALITY['max_lookback_days'])
+    accepted = transform_config.DATA_QUALITY['currencies']
+    if currencies is not None:
+        accepted = [currency for currency in accepted if currency in currencies]
+    config = transform_config.FX
+    return ensure_fx_rates(
+        accepted, *window,
+        base=config['base_currency'], max_staleness_days=config['max_staleness_days']
+    )
+
+
+def clean_frame(df, seen=None, window=None, fx=None):
+    """
+    Valide, nettoie et convertit en devise de référence un bloc de données
+    (voir data_quality.validate_frame)
+    
+    Args:
+        df: Données brutes
+        seen: SeenRows des blocs précédents (mode par morceaux), ou None
+        window: (début, fin exclue) des dates acceptées, ou None
+        fx: FxRates des devises acceptées, ou None (pas de conversion)
+    
+    Returns:
+        (df nettoyé, lignes rejetées avec leurs motifs, compteurs par règle)
+    """
+    quality = transform_config.DATA_QUALITY
+    return validate_frame(
+        df, seen=seen,
+        dedup_keys=quality['dedup_keys'],
+        currencies=quality['currencies'],
+        window=window,
+        fx=fx
+    )
+
+
+def add_time_columns(df):
+    """Ajoute les dimensions temporelles à un bloc de données (jointure sur la dimension calendrier)"""
+    return add_calendar_columns(df, 'Date', transform_config.CALENDAR)
+
+
+def get_category(service, categories=None):
+    """Détermine la catégorie d'un service"""
+    if categories is None:
+        categories = transform_config.SERVICE_CATEGORIES
+    for category, keywords in categories.items():
+        if any(keyword.lower() in service.lower() for keyword in keywords):
+            return category
+    return 'Other'
+
+
+def categorize_frame(df):
+    """Ajoute la catégorie de service (calculée une fois par service distinct)"""
+    services = df['Service'].unique()
+    mapping = {service: get_category(service) for service in services}
+    df['ServiceCategory'] = df['Service'].map(mapping)
+    return df
+
+
+def aggregate_frame(df):
+    """
+    Calcule les agrégats partiels d'un bloc enrichi
+    
+    Les coûts sont sommés en centimes entiers (CostCents) : la fusion de
+    partiels est exacte et ne dépend pas de l'ordre ni du découpage en blocs.
+    Le partiel des rollups compte aussi les lignes (Count, coût moyen par ligne).
+    """
+    cents = np.rint(df['Cost'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+    frame = df.assign(CostCents=cents, Count=np.int64(1))
+    
+    partials = {}
+    for name, keys in AGGREGATE_KEYS.items():
+        if name == 'allocation':
+            keys = allocation_columns(frame.columns)
+        else:
+            keys = [k for k in keys if k in frame.columns]
+        values = {'CostCents': 'sum', 'Count': 'sum'} if name == 'rollup' else {'CostCents': 'sum'}
+        partials[name] = frame.groupby(keys, dropna=False, sort=False).agg(values).reset_index()
+    return partials
+
+
+def merge_aggregates(partials_list):
+    """Fusionne des agrégats partiels (somme par clé, ordre de clés trié)"""
+    merged = {}
+    for name in partials_list[0]:
+        frames = [p[name] for p in partials_list]
+        values = [c for c in ('CostCents', 'Count') if c in frames[0].columns]
+        keys = [c for c in frames[0].columns if c not in values]
+        combined = pd.concat(frames, ignore_index=True)
+        merged[name] = combined.groupby(keys, dropna=False, sort=True).agg(
+            {c: 'sum' for c in values}
+        ).reset_index()
+    return merged
+
+
+def sketch_frame(df):
+    """Résumés top-K et distincts d'un bloc enrichi (fusionnables, voir cost_sketches)"""
+    return CostSketches.from_frame(df, transform_config.SKETCHES)
+
+
+def cents_to_cost(table, column='Cost'):
+    """Convertit un agrégat en centimes vers un coût en USD"""
+    table = table.copy()
+    table[column] = table.pop('CostCents') / 100
+    return table
+
+
+def merge_clean_stats(stats_list):
+    """Additionne les statistiques de nettoyage de plusieurs blocs"""
+    return {key: sum(s[key] for s in stats_list) for key in stats_list[0]}
+
+
+# Libellés affichés des règles de qualité (voir data_quality.RULES)
+RULE_LABELS = {
+    'duplicate': '♻️  Doublons de clé',
+    'negative_cost': '⛔ Coûts négatifs',
+    'missing_cost': '❓ Coûts manquants',
+    'unknown_currency': '💱 Devises non prises en charge ou sans taux',
+    'out_of_window': '📅 Dates manquantes ou hors fenêtre',
+    'schema_drift': '🧬 Valeurs illisibles (dérive de schéma)',
+}
+
+
+def parquet_available():
+    """Vrai si pyarrow est installé (copie Parquet des données enrichies)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def new_parquet_staging():
+    """Crée un répertoire temporaire pour le jeu de données Parquet en cours d'écriture"""
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix='.costs_enriched.', suffix='.tmp', dir=PROCESSED_DIR)
+
+
+def parquet_table(df):
+    """
+    Table Arrow d'un bloc enrichi
+    
+    Les colonnes entièrement vides d'un bloc sont typées en texte pour que
+    tous les blocs partagent le même schéma.
+    """
+    import pyarrow as pa
+    
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    schema = pa.schema([
+        field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+        for field in schema
+    ])
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_parquet_part(df, directory, part):
+    """
+    Écrit un bloc enrichi dans un jeu de données Parquet (un fichier par bloc)
+    
+    Un bloc sans ligne (tout en quarantaine) n'est pas écrit, ses types étant indéterminés.
+    """
+    if len(df) == 0:
+        return
+    import pyarrow.parquet as pq
+    
+    pq.write_table(parquet_table(df), os.path.join(directory, f'part-{part:05d}.parquet'))
+
+
+# Séparateur de lignes interne au mode parallèle : ne peut pas apparaître dans
+# un champ CSV, contrairement à un saut de ligne entre guillemets
+ROW_SEPARATOR = '\n\x00'
+
+# Données brutes partagées avec les workers (héritées par fork, sans copie ni pickling)
+_SHARED_FRAME = None
+
+
+def shard_positions(df, n_shards_min, keys=None):
+    """
+    Découpe les lignes en partitions indépendantes (cloud × mois × tranche de comptes)
+    
+    Seules des colonnes de la clé de dédoublonnage servent au découpage : deux
+    lignes de même clé tombent toujours dans la même partition, le dédoublonnage
+    local reste donc global.
+    
+    Args:
+        keys: Clé de dédoublonnage (défaut : transform_config.DATA_QUALITY)
+    
+    Returns:
+        Liste de tableaux de positions (ordre d'origine conservé dans chaque partition)
+    """
+    if keys is None:
+        keys = transform_config.DATA_QUALITY['dedup_keys']
+    dates = parse_dates(df['Date'])
+    months = (dates.dt.year * 12 + dates.dt.month).fillna(0).to_numpy(dtype=np.int64)
+    if 'Cloud' in df.columns and 'Cloud' in keys:
+        cloud_codes, _ = pd.factorize(df['Cloud'], sort=True, use_na_sentinel=False)
+    else:
+        cloud_codes = np.zeros(len(df), dtype=np.int64)
+    base_codes, base_uniques = pd.factorize(
+        cloud_codes.astype(np.int64) * 100_000 + months, sort=True
+    )
+    
+    # Tranches de comptes pour obtenir au moins n_shards_min partitions
+    n_slices = max(1, -(-n_shards_min // max(len(base_uniques), 1)))
+    account_col = next((c for c in ('AccountId', 'AccountName')
+                        if c in df.columns and c in keys), None)
+    if n_slices > 1 and account_col is not None:
+        account_hash = pd.util.hash_array(df[account_col].astype(str).to_numpy())
+        slices = (account_hash % np.uint64(n_slices)).astype(np.int64)
+    else:
+        slices = np.zeros(len(df), dtype=np.int64)
+    
+    shard_ids = base_codes.astype(np.int64) * n_slices + slices
+    order = np.argsort(shard_ids, kind='stable')
+    boundaries = np.flatnonzero(np.diff(shard_ids[order])) + 1
+    return [part for part in np.split(order, boundaries) if len(part)]
+
+
+def transform_shard(positions, frame=None, with_table=False, window=None, fx=None):
+    """
+    Nettoie, enrichit, agrège et formate une partition (exécuté dans un worker)
+    
+    Args:
+        positions: Positions des lignes de la partition dans les données brutes
+        frame: Données de la partition (si les workers n'héritent pas de _SHARED_FRAME)
+        with_table: Si True, la partition est aussi renvoyée en table Arrow (copie
+                    Parquet, écrite par le parent dans l'ordre d'origine)
+        window: Fenêtre de dates acceptées (voir clean_frame)
+        fx: Taux de change (voir clean_frame)
+    
+    Returns:
+        (positions conservées, lignes CSV formatées, en-tête, agrégats partiels,
+        statistiques, lignes rejetées, résumés, table Arrow ou None)
+    """
+    shard = frame if frame is not None else _SHARED_FRAME.iloc[positions]
+    shard, rejected, stats = clean_frame(shard, window=window, fx=fx)
+    shard = categorize_frame(add_time_columns(shard))
+    partials = aggregate_frame(shard)
+    sketches = sketch_frame(shard)
+    table = parquet_table(shard) if with_table and len(shard) else None
+    
+    text = shard.to_csv(index=False, header=False, lineterminator=ROW_SEPARATOR)
+    rows = text.split(ROW_SEPARATOR)[:-1]
+    header = shard.head(0).to_csv(index=False, lineterminator=os.linesep)
+    return shard.index.to_numpy(), rows, header, partials, stats, rejected, sketches, table
 
 
 class CostTransformer:
     """Classe pour transformer et enrichir les données de coûts"""
     
-    def __init__(self, input_file=None):
+    def __init__(self, input_file=None, chunksize=None, window=None, fx=None, allocation_rules=None,
+                 budgets=None):
         """
         Args:
             input_file: Chemin vers le fichier CSV à transformer
                        Si None, prend le dernier fichier dans data/raw/
+            chunksize: Si fourni, le fichier n'est pas chargé en mémoire :
+                       transform_in_chunks() le traite par blocs de chunksize lignes
+            window: (début, fin exclue) des dates acceptées ; les autres lignes
+                    sont mises en quarantaine (None : pas de contrôle de fenêtre)
+            fx: Taux de change (FxRates) ; par défaut chargés pour la fenêtre
+            allocation_rules: Règles de répartition des coûts partagés (AllocationRules) ;
+                              par défaut le fichier de transform_config.ALLOCATION
+            budgets: Budgets à évaluer (Budgets) ; par défaut le fichier de transform_config.BUDGETS
         """
         if input_file is None:
             # Trouver le dernier fichier
@@ -26,44 +391,69 @@ class CostTransformer:
                 raise FileNotFoundError("Aucun fichier de données trouvé dans data/raw/")
             input_file = max(csv_files, key=os.path.getctime)
         
-        print(f"📂 Chargement : {input_file}")
-        self.df = pd.read_csv(input_file)
-        self.df['Date'] = pd.to_datetime(self.df['Date'])
+        self.input_file = input_file
+        self.chunksize = chunksize
+        self.df = None
+        self.partials = None
+        self.sketches = None
+        self.window = window
+        if fx is None:
+            # Sans fenêtre (mode historique), taux sur la période des lignes à convertir
+            currencies, fx_window = scan_currencies(input_file, window)
+            fx = load_fx_rates(window or fx_window, currencies)
+        self.fx = fx
+        if allocation_rules is None:
+            allocation_rules = AllocationRules.load(transform_config.ALLOCATION['rules_file'])
+        self.allocation_rules = allocation_rules
+        if budgets is None:
+            budgets = Budgets.load(transform_config.BUDGETS['budgets_file'])
+        self.budgets = budgets
+        self.enriched_tmp = None
+        self.parquet_tmp = None
+        self.rejected = None
+        self.quarantine_tmp = None
         
-        print(f"✅ {len(self.df):,} lignes chargées\n")
+        if chunksize is None:
+            print(f"📂 Chargement : {input_file}")
+            self.df = read_raw_csv(input_file, window=window)
+            print(f"✅ {len(self.df):,} lignes chargées\n")
+        else:
+            print(f"📂 Source (par blocs de {chunksize:,} lignes) : {input_file}\n")
+    
+    def _print_clean_stats(self, stats):
+        """Affiche les statistiques du contrôle qualité"""
+        if self.schema_report['missing'] or self.schema_report['unexpected']:
+            print(f"   🧬 Dérive de schéma : colonnes absentes {self.schema_report['missing']}, "
+                  f"inattendues {self.schema_report['unexpected']}")
+        for name in RULES.values():
+            print(f"   {RULE_LABELS[name]} : {stats[name]:,}")
+        print(f"   🔧 Valeurs manquantes remplacées : {stats['missing_values']:,}")
+        print(f"   💱 Coûts convertis en {self.fx.base} : {stats['converted_rows']:,}")
+        print(f"   🚧 Lignes en quarantaine : {stats['quarantined']:,}")
+        print(f"   📊 Lignes conservées : {stats['final_rows']:,} / {stats['initial_rows']:,}")
+    
+    def _start_parquet(self):
+        """Prépare le jeu de données Parquet si pyarrow est disponible"""
+        if parquet_available():
+            self.parquet_tmp = new_parquet_staging()
+        else:
+            print("   ⚠️  pyarrow absent : pas de copie Parquet des données enrichies")
+    
+    def _discard_parquet(self):
+        """Supprime un jeu de données Parquet inachevé"""
+        if self.parquet_tmp is not None:
+            shutil.rmtree(self.parquet_tmp, ignore_errors=True)
+            self.parquet_tmp = None
     
     def clean_data(self):
-        """Nettoie les données (valeurs manquantes, doublons, etc.)"""
+        """Valide et nettoie les données (doublons, coûts, devises, dates, schéma)"""
         
         print("🧹 NETTOYAGE DES DONNÉES")
         print("-" * 60)
         
-        initial_rows = len(self.df)
-        
-        # 1. Supprimer les doublons
-        duplicates = self.df.duplicated().sum()
-        self.df = self.df.drop_duplicates()
-        print(f"   ♻️  Doublons supprimés : {duplicates}")
-        
-        # 2. Supprimer les lignes avec coûts négatifs
-        negative_costs = (self.df['Cost'] < 0).sum()
-        self.df = self.df[self.df['Cost'] >= 0]
-        print(f"   ⛔ Coûts négatifs supprimés : {negative_costs}")
-        
-        # 3. Gérer les valeurs manquantes
-        missing_values = self.df.isnull().sum().sum()
-        self.df = self.df.fillna({
-            'Service': 'Unknown',
-            'Region': 'Unknown',
-            'AccountName': 'Unknown'
-        })
-        print(f"   🔧 Valeurs manquantes traitées : {missing_values}")
-        
-        # 4. Arrondir les coûts à 2 décimales
-        self.df['Cost'] = self.df['Cost'].round(2)
-        
-        final_rows = len(self.df)
-        print(f"   📊 Lignes conservées : {final_rows:,} / {initial_rows:,}")
+        self.schema_report = check_schema(self.df.columns)
+        self.df, self.rejected, self.clean_stats = clean_frame(self.df, window=self.window, fx=self.fx)
+        self._print_clean_stats(self.clean_stats)
         print()
         
         return self
@@ -74,19 +464,9 @@ class CostTransformer:
         print("📅 AJOUT DE DIMENSIONS TEMPORELLES")
         print("-" * 60)
         
-        # Extraire les composantes de date
-        self.df['Year'] = self.df['Date'].dt.year
-        self.df['Month'] = self.df['Date'].dt.month
-        self.df['MonthName'] = self.df['Date'].dt.strftime('%B')
-        self.df['Week'] = self.df['Date'].dt.isocalendar().week
-        self.df['DayOfWeek'] = self.df['Date'].dt.dayofweek
-        self.df['DayName'] = self.df['Date'].dt.strftime('%A')
-        self.df['IsWeekend'] = self.df['DayOfWeek'].isin([5, 6])
+        self.df = add_time_columns(self.df)
         
-        # Période Year-Month pour agrégations
-        self.df['YearMonth'] = self.df['Date'].dt.to_period('M').astype(str)
-        
-        print(f"   ✅ Colonnes ajoutées : Year, Month, Week, DayOfWeek, etc.")
+        print(f"   ✅ Colonnes ajoutées : Year, Month, Week, DayOfWeek, FiscalYear, IsHoliday, etc.")
         print(f"   📆 Période couverte : {self.df['Date'].min().date()} → {self.df['Date'].max().date()}")
         print()
         
@@ -98,25 +478,7 @@ class CostTransformer:
         print("🏷️  CATÉGORISATION DES SERVICES")
         print("-" * 60)
         
-        # Définir les catégories
-        categories = {
-            'Compute': ['EC2', 'Lambda', 'ECS', 'Fargate', 'Batch'],
-            'Storage': ['S3', 'EBS', 'EFS', 'Glacier'],
-            'Database': ['RDS', 'DynamoDB', 'ElastiCache', 'Redshift'],
-            'Networking': ['VPC', 'CloudFront', 'Route53', 'Data Transfer', 'NAT Gateway'],
-            'Analytics': ['Athena', 'EMR', 'Kinesis', 'QuickSight'],
-            'Security': ['IAM', 'KMS', 'Secrets Manager', 'GuardDuty'],
-            'Management': ['CloudWatch', 'Config', 'Systems Manager']
-        }
-        
-        def get_category(service):
-            """Détermine la catégorie d'un service"""
-            for category, keywords in categories.items():
-                if any(keyword.lower() in service.lower() for keyword in keywords):
-                    return category
-            return 'Other'
-        
-        self.df['ServiceCategory'] = self.df['Service'].apply(get_category)
+        self.df = categorize_frame(self.df)
         
         # Statistiques
         category_counts = self.df['ServiceCategory'].value_counts()
@@ -127,46 +489,334 @@ class CostTransformer:
         
         return self
     
+    def transform_in_chunks(self):
+        """
+        Nettoie, enrichit et agrège le fichier source bloc par bloc
+        
+        Remplace clean_data → add_time_dimensions → categorize_services pour
+        les fichiers plus gros que la mémoire : chaque bloc enrichi est ajouté
+        à un fichier temporaire (publié par save_transformed_data) et seuls
+        les agrégats partiels, fusionnés au fil de l'eau, restent en mémoire.
+        """
+        
+        print("🧱 TRANSFORMATION PAR BLOCS (clean → temps → catégories)")
+        print("-" * 60)
+        
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        fd, self.enriched_tmp = tempfile.mkstemp(
+            prefix='.costs_enriched.', suffix='.tmp', dir=PROCESSED_DIR
+        )
+        os.close(fd)
+        os.makedirs(QUARANTINE_DIR, exist_ok=True)
+        fd, self.quarantine_tmp = tempfile.mkstemp(
+            prefix='.rejected_rows.', suffix='.tmp', dir=QUARANTINE_DIR
+        )
+        os.close(fd)
+        self._start_parquet()
+        
+        seen = SeenRows()
+        stats_list = []
+        partials = None
+        sketches = None
+        n_chunks = 0
+        
+        try:
+            for chunk in read_raw_csv(self.input_file, chunksize=self.chunksize, window=self.window):
+                if n_chunks == 0:
+                    self.schema_report = check_schema(chunk.columns)
+                chunk, rejected, stats = clean_frame(chunk, seen=seen, window=self.window, fx=self.fx)
+                chunk = categorize_frame(add_time_columns(chunk))
+                stats_list.append(stats)
+                rejected.to_csv(self.quarantine_tmp, mode='a', index=False,
+                                header=(n_chunks == 0))
+                
+                chunk.to_csv(self.enriched_tmp, mode='a', index=False, header=(n_chunks == 0))
+                if self.parquet_tmp is not None:
+                    write_parquet_part(chunk, self.parquet_tmp, n_chunks)
+                
+                chunk_partials = aggregate_frame(chunk)
+                partials = chunk_partials if partials is None else \
+                    merge_aggregates([partials, chunk_partials])
+                chunk_sketches = sketch_frame(chunk)
+                sketches = chunk_sketches if sketches is None else sketches.merge(chunk_sketches)
+                n_chunks += 1
+        except BaseException:
+            for tmp in (self.enriched_tmp, self.quarantine_tmp):
+                os.remove(tmp)
+            self.enriched_tmp = self.quarantine_tmp = None
+            self._discard_parquet()
+            raise
+        
+        if n_chunks == 0:
+            raise ValueError(f"Fichier vide : {self.input_file}")
+        
+        self.partials = partials
+        self.sketches = sketches
+        self.clean_stats = merge_clean_stats(stats_list)
+        print(f"   🧱 Blocs traités : {n_chunks}")
+        self._print_clean_stats(self.clean_stats)
+        print()
+        
+        return self
+    
+    def transform_parallel(self, workers=None):
+        """
+        Nettoie, enrichit et agrège les données en parallèle (pool de processus)
+        
+        Les données sont découpées en partitions cloud × mois (× tranche de
+        comptes) traitées par les workers ; les lignes enrichies sont remises
+        dans l'ordre d'origine et les agrégats fusionnés en centimes, pour des
+        sorties identiques octet pour octet au mode séquentiel.
+        
+        Args:
+            workers: Nombre de processus (défaut : nombre de cœurs)
+        """
+        global _SHARED_FRAME
+        
+        workers = workers or os.cpu_count() or 1
+        print(f"⚡ TRANSFORMATION PARALLÈLE ({workers} processus)")
+        print("-" * 60)
+        
+        if self.df is None:
+            self.df = read_raw_csv(self.input_file, window=self.window)
+        raw = self.df.reset_index(drop=True)
+        self.schema_report = check_schema(raw.columns)
+        shards = shard_positions(raw, n_shards_min=2 * workers)
+        print(f"   🧩 Partitions : {len(shards)}")
+        
+        # fork : les workers lisent les données du parent sans copie
+        methods = multiprocessing.get_all_start_methods()
+        use_fork = 'fork' in methods
+        context = multiprocessing.get_context('fork' if use_fork else None)
+        
+        self._start_parquet()
+        _SHARED_FRAME = raw
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(transform_shard, positions,
+                                None if use_fork else raw.iloc[positions],
+                                self.parquet_tmp is not None, self.window, self.fx)
+                    for positions in shards
+                ]
+                results = [future.result() for future in futures]
+        except BaseException:
+            self._discard_parquet()
+            raise
+        finally:
+            _SHARED_FRAME = None
+        
+        # Réassemblage déterministe : lignes dans l'ordre d'origine
+        positions = np.concatenate([r[0] for r in results])
+        order = np.argsort(positions, kind='stable')
+        rows = np.concatenate([np.array(r[1], dtype=object) for r in results])
+        rows = rows[order]
+        
+        # Copie Parquet : un seul fichier dans l'ordre d'origine, comme le mode séquentiel
+        # (relu en DataFrame, types pandas restaurés, pour des métadonnées identiques)
+        tables = [r[7] for r in results if r[7] is not None]
+        if self.parquet_tmp is not None and tables:
+            import pyarrow as pa
+            
+            try:
+                table = pa.concat_tables(tables).take(order)
+                write_parquet_part(table.to_pandas(), self.parquet_tmp, 0)
+            except BaseException:
+                self._discard_parquet()
+                raise
+        
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        fd, self.enriched_tmp = tempfile.mkstemp(
+            prefix='.costs_enriched.', suffix='.tmp', dir=PROCESSED_DIR
+        )
+        with os.fdopen(fd, 'w', newline='') as f:
+            f.write(results[0][2])
+            for start in range(0, len(rows), 100_000):
+                f.write(os.linesep.join(rows[start:start + 100_000]) + os.linesep)
+        
+        self.partials = merge_aggregates([r[3] for r in results])
+        self.clean_stats = merge_clean_stats([r[4] for r in results])
+        self.rejected = pd.concat([r[5] for r in results]).sort_index(kind='stable')
+        self.sketches = results[0][6]
+        for result in results[1:]:
+            self.sketches = self.sketches.merge(result[6])
+        self.df = None
+        self._print_clean_stats(self.clean_stats)
+        print()
+        
+        return self
+    
     def calculate_aggregations(self):
         """Calcule différentes agrégations des coûts"""
         
         print("🔢 CALCUL DES AGRÉGATIONS")
         print("-" * 60)
         
+        # Agrégats partiels (déjà fusionnés en mode par blocs)
+        if self.partials is None:
+            self.partials = merge_aggregates([aggregate_frame(self.df)])
+        if self.sketches is None:
+            self.sketches = sketch_frame(self.df)
+        partials = self.partials
+        
         # 1. Coûts journaliers totaux
-        self.daily_costs = self.df.groupby('Date').agg({
-            'Cost': 'sum'
-        }).reset_index()
-        self.daily_costs.columns = ['Date', 'TotalCost']
+        self.daily_costs = cents_to_cost(partials['daily'], 'TotalCost')
         print(f"   ✅ Agrégation journalière : {len(self.daily_costs)} jours")
         
         # 2. Coûts par service et par jour
-        self.daily_service_costs = self.df.groupby(['Date', 'Service']).agg({
-            'Cost': 'sum'
-        }).reset_index()
+        self.daily_service_costs = cents_to_cost(partials['daily_service'])
         print(f"   ✅ Coûts par service/jour : {len(self.daily_service_costs)} lignes")
         
         # 3. Coûts mensuels par compte
-        if 'AccountName' in self.df.columns:
-            self.monthly_account_costs = self.df.groupby(['YearMonth', 'AccountName']).agg({
-                'Cost': 'sum'
-            }).reset_index()
+        if 'AccountName' in partials['monthly_account'].columns:
+            self.monthly_account_costs = cents_to_cost(partials['monthly_account'])
             print(f"   ✅ Coûts mensuels par compte : {len(self.monthly_account_costs)} lignes")
         
         # 4. Coûts par catégorie de service
-        self.category_costs = self.df.groupby(['Date', 'ServiceCategory']).agg({
-            'Cost': 'sum'
-        }).reset_index()
+        self.category_costs = cents_to_cost(partials['category'])
         print(f"   ✅ Coûts par catégorie : {len(self.category_costs)} lignes")
         
         # 5. Coûts par région
-        if 'Region' in self.df.columns:
-            self.region_costs = self.df.groupby(['Date', 'Region']).agg({
-                'Cost': 'sum'
-            }).reset_index()
+        if 'Region' in partials['region'].columns:
+            self.region_costs = cents_to_cost(partials['region'])
             print(f"   ✅ Coûts par région : {len(self.region_costs)} lignes")
         
+        # 6. Coûts journaliers par série (compte × service × région)
+        self.series_daily_costs = cents_to_cost(partials['series_daily'])
+        self.series_keys = [k for k in SERIES_KEYS if k in self.series_daily_costs.columns]
+        print(f"   ✅ Coûts journaliers par série : {len(self.series_daily_costs)} lignes")
+        
+        # 7. Rollups du cube (jour → semaine → mois, service → catégorie, compte → cloud)
+        self.cube = CostCube.from_rollups(build_rollups(partials['rollup'], transform_config.ROLLUPS))
+        rollup_rows = sum(spec['rows'] for spec in self.cube.specs.values())
+        print(f"   ✅ Rollups du cube : {len(self.cube.specs)} tables, {rollup_rows:,} lignes")
+        
+        print()
+        return self
+    
+    def allocate_shared_costs(self):
+        """Répartit les coûts partagés (réseau, sécurité...) entre équipes selon les règles"""
+        
+        print("🤝 RÉPARTITION DES COÛTS PARTAGÉS")
+        print("-" * 60)
+        
+        team_costs, by_rule = self.allocation_rules.allocate(self.partials['allocation'])
+        
+        self.team_costs = team_costs[['Date', 'Team']].assign(
+            DirectCost=team_costs['DirectCents'] / 100,
+            AllocatedCost=team_costs['AllocatedCents'] / 100,
+            TotalCost=(team_costs['DirectCents'] + team_costs['AllocatedCents']) / 100
+        )
+        self.allocation_summary = cents_to_cost(
+            by_rule.rename(columns={'AllocatedCents': 'CostCents'}), 'AllocatedCost'
+        )
+        
+        shared_cents = int(by_rule['AllocatedCents'].sum())
+        unallocated_cents = int(
+            (team_costs['DirectCents'] + team_costs['AllocatedCents'])[team_costs['Team'] == UNALLOCATED].sum()
+        )
+        self.allocation_totals = {
+            'shared_cost': shared_cents / 100,
+            'unallocated_cost': unallocated_cents / 100,
+        }
+        
+        print(f"   📜 Règles : {len(self.allocation_rules)}")
+        print(f"   🔀 Coûts partagés répartis : ${shared_cents / 100:,.2f}")
+        print(f"   ❔ Coûts sans équipe : ${unallocated_cents / 100:,.2f}")
+        by_team = self.team_costs.groupby('Team')['TotalCost'].sum().sort_values(ascending=False)
+        for team, cost in by_team.head(5).items():
+            print(f"      • {team:20s} : ${cost:,.2f}")
+        print()
+        
+        return self
+    
+    def _totals_by(self, name, by):
+        """Total (USD) d'un agrégat partiel regroupé par `by`, calculé en centimes"""
+        table = self.partials[name]
+        if callable(by):
+            by = by(table)
+        return table.groupby(by)['CostCents'].sum().sort_index() / 100
+    
+    def _cube_totals(self, column):
+        """Total (USD) par valeur d'une colonne, servi par le rollup le plus compact du cube"""
+        table = self.cube.aggregate([column]).dropna(subset=[column])
+        return table.set_index(column)['Cost']
+    
+    def detect_series_anomalies(self):
+        """Détecte les pics de coûts sur chaque série compte × service × région"""
+        
+        print("🔎 DÉTECTION D'ANOMALIES PAR SÉRIE")
+        print("-" * 60)
+        
+        self.series_anomalies = detect_anomalies(
+            self.series_daily_costs,
+            keys=self.series_keys,
+            **transform_config.ANOMALY_DETECTION
+        )
+        
+        n_series = len(self.series_daily_costs[self.series_keys].drop_duplicates())
+        print(f"   📈 Séries analysées : {n_series:,}")
+        print(f"   ⚠️  Anomalies détectées : {len(self.series_anomalies)}")
+        for _, row in self.series_anomalies.head(5).iterrows():
+            label = ' / '.join(str(row[k]) for k in self.series_keys)
+            print(f"      #{row['Rank']} {row['Date'].date()} {label} : "
+                  f"${row['Cost']:,.2f} (base ${row['Baseline']:,.2f}, z={row['ZScore']:.1f})")
+        print()
+        
+        return self
+    
+    def forecast_spend(self):
+        """Projette la dépense de fin de mois pour chaque compte × service"""
+        
+        print("🔮 PRÉVISION DE FIN DE MOIS")
+        print("-" * 60)
+        
+        keys = [k for k in FORECAST_KEYS if k in self.series_keys]
+        self.forecasts, self.forecast_total = forecast_month_end(
+            self.series_daily_costs,
+            keys=keys,
+            **transform_config.FORECAST
+        )
+        
+        if self.forecast_total is not None:
+            total = self.forecast_total
+            print(f"   📈 Séries prévues : {len(self.forecasts):,}")
+            print(f"   🗓️  Mois {total['month']} (données au {total['as_of']})")
+            print(f"   💰 Projection fin de mois : ${total['projected']:,.2f} "
+                  f"[{total['lower']:,.2f} – {total['upper']:,.2f}] "
+                  f"({total['confidence']:.0%})")
         print()
+        
+        return self
+    
+    def evaluate_budgets(self):
+        """Évalue tous les budgets (dépense de la période et dépassement prévu) en une passe"""
+        
+        print("🎯 ÉVALUATION DES BUDGETS")
+        print("-" * 60)
+        
+        self.budget_status = self.budgets.evaluate(
+            self.partials['allocation'],
+            lookback_days=transform_config.BUDGETS['lookback_days'],
+            min_days_weekly=transform_config.FORECAST['min_days_weekly']
+        )
+        self.budget_breaches = breaches(self.budget_status)
+        
+        print(f"   📜 Budgets : {len(self.budgets)}")
+        print(f"   🚨 Alertes : {len(self.budget_breaches)}")
+        for _, row in self.budget_breaches.head(5).iterrows():
+            print(f"      • {row['BudgetId']} ({row['Period']}) : {row['Status']}, "
+                  f"${row['Actual']:,.2f} / ${row['Amount']:,.2f} "
+                  f"(prévu ${row['Projected']:,.2f}, {row['ProjectedPct']:.0f}%)")
+        partial = incomplete(self.budget_status)
+        if len(partial):
+            print(f"   🧩 Données incomplètes : {len(partial)} budget(s) "
+                  f"({', '.join(partial['BudgetId'].head(5))}) ; période entière : --from-store")
+        for _, row in unmeasured(self.budget_status).iterrows():
+            print(f"   ⚠️  {row['BudgetId']} non mesurable : colonnes absentes des données "
+                  f"({row['MissingColumns']})")
+        print()
+        
         return self
     
     def calculate_kpis(self):
@@ -176,7 +826,7 @@ class CostTransformer:
         print("-" * 60)
         
         # KPI 1 : Coût total
-        total_cost = self.df['Cost'].sum()
+        total_cost = int(self.partials['daily']['CostCents'].sum()) / 100
         print(f"   💰 Coût total : ${total_cost:,.2f}")
         
         # KPI 2 : Coût moyen journalier
@@ -184,18 +834,19 @@ class CostTransformer:
         print(f"   📈 Coût moyen/jour : ${avg_daily_cost:,.2f}")
         
         # KPI 3 : Tendance (variation entre premier et dernier mois)
-        monthly_totals = self.df.groupby('YearMonth')['Cost'].sum().sort_index()
-        if len(monthly_totals) >= 2:
+        monthly_totals = self._totals_by('monthly_account', 'YearMonth')
+        trend = 0.0
+        if len(monthly_totals) >= 2 and monthly_totals.iloc[0] > 0:
             first_month = monthly_totals.iloc[0]
             last_month = monthly_totals.iloc[-1]
             trend = ((last_month - first_month) / first_month) * 100
             print(f"   📉 Tendance : {trend:+.1f}% (vs premier mois)")
         
         # KPI 4 : Top 3 services les plus coûteux
-        top_services = self.df.groupby('Service')['Cost'].sum().sort_values(ascending=False).head(3)
+        top_services = self._totals_by('daily_service', 'Service').sort_values(ascending=False).head(3)
         print(f"   🏆 Top 3 services :")
         for i, (service, cost) in enumerate(top_services.items(), 1):
-            pct = (cost / total_cost) * 100
+            pct = (cost / total_cost) * 100 if total_cost > 0 else 0.0
             print(f"      {i}. {service:25s} : ${cost:10,.2f} ({pct:.1f}%)")
         
         # KPI 5 : Détection d'anomalies (jours avec coûts > 2x la moyenne)
@@ -211,20 +862,36 @@ class CostTransformer:
             print(f"      (coûts > ${threshold:,.2f})")
         
         # KPI 6 : Répartition weekend vs semaine
-        weekend_costs = self.df[self.df['IsWeekend'] == True]['Cost'].sum()
-        weekday_costs = self.df[self.df['IsWeekend'] == False]['Cost'].sum()
+        by_weekend = self._totals_by('daily', lambda t: t['Date'].dt.dayofweek.isin([5, 6]))
+        weekend_costs = by_weekend.get(True, 0.0)
+        weekday_costs = by_weekend.get(False, 0.0)
+        weekend_pct = (weekend_costs / total_cost) * 100 if total_cost > 0 else 0.0
         print(f"   📅 Répartition :")
-        print(f"      Semaine : ${weekday_costs:,.2f} ({weekday_costs/total_cost*100:.1f}%)")
-        print(f"      Weekend : ${weekend_costs:,.2f} ({weekend_costs/total_cost*100:.1f}%)")
+        print(f"      Semaine : ${weekday_costs:,.2f} ({100 - weekend_pct if total_cost > 0 else 0:.1f}%)")
+        print(f"      Weekend : ${weekend_costs:,.2f} ({weekend_pct:.1f}%)")
         
         # Stocker les KPIs dans un dictionnaire
         self.kpis = {
             'total_cost': total_cost,
             'avg_daily_cost': avg_daily_cost,
-            'trend_pct': trend if len(monthly_totals) >= 2 else 0,
+            'trend_pct': trend,
             'anomaly_count': len(anomalies),
-            'weekend_pct': (weekend_costs / total_cost) * 100
+            'weekend_pct': weekend_pct
         }
+        if hasattr(self, 'series_anomalies'):
+            self.kpis['series_anomaly_count'] = len(self.series_anomalies)
+        if hasattr(self, 'allocation_totals'):
+            self.kpis.update(self.allocation_totals)
+        if hasattr(self, 'budget_breaches') and len(self.budgets):
+            self.kpis['budget_breaches'] = len(self.budget_breaches)
+        _, distinct_resources = self.sketches.distinct.count('ResourceId')
+        if distinct_resources:
+            self.kpis['distinct_resources'] = distinct_resources
+        if getattr(self, 'forecast_total', None) is not None:
+            self.kpis['forecast_month'] = self.forecast_total['month']
+            self.kpis['forecast_month_end'] = self.forecast_total['projected']
+            self.kpis['forecast_lower'] = self.forecast_total['lower']
+            self.kpis['forecast_upper'] = self.forecast_total['upper']
         
         print()
         return self
@@ -235,39 +902,46 @@ class CostTransformer:
         print("📋 CRÉATION DU RAPPORT RÉCAPITULATIF")
         print("-" * 60)
         
+        total_cost = int(self.partials['daily']['CostCents'].sum()) / 100
+        
         # Top 10 services
-        top10_services = self.df.groupby('Service').agg({
-            'Cost': 'sum'
-        }).sort_values('Cost', ascending=False).head(10)
-        top10_services['Percentage'] = (top10_services['Cost'] / self.df['Cost'].sum()) * 100
+        top10_services = self._cube_totals('Service').to_frame('Cost') \
+            .sort_values('Cost', ascending=False).head(10)
+        top10_services['Percentage'] = (top10_services['Cost'] / total_cost) * 100
         top10_services = top10_services.round(2)
         
         # Évolution mensuelle
-        monthly_evolution = self.df.groupby('YearMonth').agg({
-            'Cost': 'sum'
-        }).reset_index()
+        monthly_evolution = self._cube_totals('YearMonth').reset_index()
         monthly_evolution.columns = ['Month', 'TotalCost']
         monthly_evolution['TotalCost'] = monthly_evolution['TotalCost'].round(2)
         
         # Par compte
-        if 'AccountName' in self.df.columns:
-            account_summary = self.df.groupby('AccountName').agg({
-                'Cost': 'sum'
-            }).sort_values('Cost', ascending=False)
-            account_summary['Percentage'] = (account_summary['Cost'] / self.df['Cost'].sum()) * 100
+        if 'AccountName' in self.partials['monthly_account'].columns:
+            account_summary = self._cube_totals('AccountName').to_frame('Cost') \
+                .sort_values('Cost', ascending=False)
+            account_summary['Percentage'] = (account_summary['Cost'] / total_cost) * 100
             account_summary = account_summary.round(2)
         else:
             account_summary = None
         
         # Par catégorie
-        category_summary = self.df.groupby('ServiceCategory').agg({
-            'Cost': 'sum'
-        }).sort_values('Cost', ascending=False)
-        category_summary['Percentage'] = (category_summary['Cost'] / self.df['Cost'].sum()) * 100
+        category_summary = self._cube_totals('ServiceCategory').to_frame('Cost') \
+            .sort_values('Cost', ascending=False)
+        category_summary['Percentage'] = (category_summary['Cost'] / total_cost) * 100
         category_summary = category_summary.round(2)
         
+        # Top 10 ressources (résumé Space-Saving : coût réel entre MinCost et Cost)
+        top10_resources = self.sketches.top_k.top('ResourceId', 10)
+        if len(top10_resources):
+            top10_resources = top10_resources.rename(columns={'Item': 'ResourceId'})
+            top10_resources['Percentage'] = (top10_resources['Cost'] / total_cost) * 100
+            top10_resources = top10_resources.round(2)
+        else:
+            top10_resources = None
+        
         self.summary = {
             'top10_services': top10_services,
+            'top10_resources': top10_resources,
             'monthly_evolution': monthly_evolution,
             'account_summary': account_summary,
             'category_summary': category_summary
@@ -278,70 +952,277 @@ class CostTransformer:
         
         return self
     
-    def save_transformed_data(self):
-        """Sauvegarde toutes les données transformées"""
+    def save_transformed_data(self, ds=None):
+        """
+        Sauvegarde toutes les données transformées
+        
+        Args:
+            ds: Date logique de la partition. Si fournie, les fichiers sont écrits
+                sous data/processed/dt=<ds>/ avec des noms fixes et remplacés
+                atomiquement (re-exécution idempotente). Sinon, fichiers horodatés.
+        """
         
         print("💾 SAUVEGARDE DES DONNÉES TRANSFORMÉES")
         print("-" * 60)
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if ds is not None:
+            output_dir = partition_dir(PROCESSED_DIR, ds)
+            suffix = ''
+        else:
+            output_dir = PROCESSED_DIR
+            suffix = '_' + datetime.now().strftime('%Y%m%d_%H%M%S')
+        
+        self.outputs = []
+        
+        def output_path(name, ext='csv'):
+            filename = f'{name}{suffix}.{ext}'
+            self.outputs.append(filename)
+            return os.path.join(output_dir, filename)
         
-        # 1. Données principales enrichies
-        main_file = f'data/processed/costs_enriched_{timestamp}.csv'
-        self.df.to_csv(main_file, index=False)
+        # 1. Données principales enrichies (déjà écrites bloc par bloc en mode par morceaux)
+        main_file = output_path('costs_enriched')
+        if self.enriched_tmp is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            os.replace(self.enriched_tmp, main_file)
+            self.enriched_tmp = None
+        else:
+            write_csv_atomic(self.df, main_file, index=False)
         print(f"   ✅ Données enrichies : {main_file}")
         
+        # 1 bis. Copie Parquet (une partie par bloc en mode par morceaux, pour les requêtes SQL)
+        if self.parquet_tmp is None and self.df is not None:
+            self._start_parquet()
+            if self.parquet_tmp is not None:
+                try:
+                    write_parquet_part(self.df, self.parquet_tmp, 0)
+                except BaseException:
+                    self._discard_parquet()
+                    raise
+        if self.parquet_tmp is not None:
+            parquet_dir = output_path('costs_enriched', 'parquet')
+            os.makedirs(output_dir, exist_ok=True)
+            publish_dir(self.parquet_tmp, parquet_dir)
+            self.parquet_tmp = None
+            print(f"   ✅ Données enrichies (Parquet) : {parquet_dir}")
+            
+            # 1 ter. Instantané Arrow (projeté en mémoire par le dashboard au démarrage)
+            snapshot_file = os.path.join(output_dir, f'costs_enriched{suffix}.{SNAPSHOT_EXT}')
+            if write_dataset_snapshot(parquet_dir, snapshot_file) is None:
+                # Aucune ligne valide : un instantané d'une exécution précédente ne doit pas être servi
+                if os.path.exists(snapshot_file):
+                    os.remove(snapshot_file)
+                print("   ⏭️  Instantané Arrow non écrit (aucune ligne valide) : requêtes sur le CSV")
+            else:
+                self.outputs.append(os.path.basename(snapshot_file))
+                print(f"   ✅ Instantané Arrow : {snapshot_file}")
+        
         # 2. Coûts journaliers
-        daily_file = f'data/processed/daily_costs_{timestamp}.csv'
-        self.daily_costs.to_csv(daily_file, index=False)
+        daily_file = output_path('daily_costs')
+        write_csv_atomic(self.daily_costs, daily_file, index=False)
         print(f"   ✅ Coûts journaliers : {daily_file}")
         
+        # 2 bis. Rollups du cube et leur index (requêtes du dashboard sans les données détaillées)
+        for name, spec in self.cube.specs.items():
+            rollup_file = output_path(f'rollup_{name}')
+            write_csv_atomic(self.cube.tables[name], rollup_file, index=False)
+            spec['file'] = os.path.basename(rollup_file)
+            if snapshot_available():
+                rollup_snapshot = output_path(f'rollup_{name}', SNAPSHOT_EXT)
+                write_frame_snapshot(self.cube.tables[name], rollup_snapshot)
+                spec['snapshot'] = os.path.basename(rollup_snapshot)
+        index_file = output_path(ROLLUP_INDEX, 'json')
+        write_json_atomic(self.cube.index(), index_file)
+        print(f"   ✅ Rollups du cube ({len(self.cube.specs)} tables) : {index_file}")
+        
         # 3. Top 10 services
-        top10_file = f'data/processed/top10_services_{timestamp}.csv'
-        self.summary['top10_services'].to_csv(top10_file)
+        top10_file = output_path('top10_services')
+        write_csv_atomic(self.summary['top10_services'], top10_file)
         print(f"   ✅ Top 10 services : {top10_file}")
         
+        # 3 bis. Top 10 ressources (approché, si les données sont détaillées par ressource)
+        if self.summary['top10_resources'] is not None:
+            top10_resources_file = output_path('top10_resources')
+            write_csv_atomic(self.summary['top10_resources'], top10_resources_file, index=False)
+            print(f"   ✅ Top 10 ressources : {top10_resources_file}")
+        
         # 4. Évolution mensuelle
-        monthly_file = f'data/processed/monthly_evolution_{timestamp}.csv'
-        self.summary['monthly_evolution'].to_csv(monthly_file, index=False)
+        monthly_file = output_path('monthly_evolution')
+        write_csv_atomic(self.summary['monthly_evolution'], monthly_file, index=False)
         print(f"   ✅ Évolution mensuelle : {monthly_file}")
         
         # 5. Résumé par catégorie
-        category_file = f'data/processed/category_summary_{timestamp}.csv'
-        self.summary['category_summary'].to_csv(category_file)
+        category_file = output_path('category_summary')
+        write_csv_atomic(self.summary['category_summary'], category_file)
         print(f"   ✅ Résumé par catégorie : {category_file}")
         
-        # 6. KPIs en JSON
-        import json
-        kpi_file = f'data/processed/kpis_{timestamp}.json'
-        with open(kpi_file, 'w') as f:
-            json.dump(self.kpis, f, indent=2)
+        # 6. Anomalies par série (classées)
+        if hasattr(self, 'series_anomalies'):
+            anomalies_file = output_path('series_anomalies')
+            write_csv_atomic(self.series_anomalies, anomalies_file, index=False)
+            print(f"   ✅ Anomalies par série : {anomalies_file}")
+        
+        # 7. Prévisions de fin de mois par série
+        if hasattr(self, 'forecasts'):
+            forecast_file = output_path('forecasts')
+            write_csv_atomic(self.forecasts, forecast_file, index=False)
+            print(f"   ✅ Prévisions fin de mois : {forecast_file}")
+        
+        # 7 bis. Coûts par équipe après répartition des coûts partagés
+        if hasattr(self, 'team_costs'):
+            team_file = output_path('team_costs')
+            write_csv_atomic(self.team_costs, team_file, index=False)
+            print(f"   ✅ Coûts par équipe : {team_file}")
+            allocation_file = output_path('allocation_summary')
+            write_csv_atomic(self.allocation_summary, allocation_file, index=False)
+            print(f"   ✅ Répartition par règle : {allocation_file}")
+        
+        # 7 ter. État des budgets et alertes (notification, dashboard)
+        if hasattr(self, 'budget_status') and len(self.budgets):
+            budget_file = output_path('budget_status')
+            write_csv_atomic(self.budget_status, budget_file, index=False)
+            breaches_file = output_path('budget_breaches')
+            write_csv_atomic(self.budget_breaches, breaches_file, index=False)
+            print(f"   ✅ Budgets : {budget_file} ({len(self.budget_breaches)} alertes : {breaches_file})")
+        
+        # 7 quater. Résumés top-K et distincts par jour (combinables entre partitions)
+        top_k_file = output_path(os.path.splitext(TOP_K_FILE)[0])
+        distinct_file = output_path(os.path.splitext(DISTINCT_FILE)[0])
+        self.sketches.save(top_k_file, distinct_file, write_csv_atomic)
+        print(f"   ✅ Résumés top-K / distincts : {top_k_file}, {distinct_file}")
+        
+        # 8. Dimension calendrier de la période (une ligne par jour)
+        dates = self.partials['daily']['Date'].dropna()
+        if len(dates):
+            calendar = build_calendar(dates.min(), dates.max(), **transform_config.CALENDAR)
+            calendar_file = output_path('calendar')
+            write_csv_atomic(calendar, calendar_file)
+            print(f"   ✅ Dimension calendrier : {calendar_file}")
+        
+        # 9. KPIs en JSON
+        kpi_file = output_path('kpis', 'json')
+        write_json_atomic(self.kpis, kpi_file)
         print(f"   ✅ KPIs : {kpi_file}")
         
+        # 9 bis. Historique des KPIs (ajout seul, commun à toutes les exécutions)
+        if history_available():
+            record = kpi_record(
+                ds or suffix.lstrip('_'), self.kpis, dates.min(), dates.max(),
+                self.summary['top10_services']['Cost'], partition=ds,
+                transform_version=transform_config.TRANSFORM_VERSION
+            )
+            history_file = append_kpis(record)
+            print(f"   ✅ Historique des KPIs : {history_file}")
+        
+        # 10. Rapport qualité (compteurs par règle) et lignes en quarantaine
+        quality_file = output_path('quality_report', 'json')
+        write_json_atomic(self.quality_report(), quality_file)
+        print(f"   ✅ Rapport qualité : {quality_file}")
+        
+        if ds is not None:
+            quarantine_file = os.path.join(partition_dir(QUARANTINE_DIR, ds), 'rejected_rows.csv')
+        else:
+            quarantine_file = os.path.join(QUARANTINE_DIR, f'rejected_rows{suffix}.csv')
+        if self.quarantine_tmp is not None:
+            os.makedirs(os.path.dirname(quarantine_file), exist_ok=True)
+            os.replace(self.quarantine_tmp, quarantine_file)
+            self.quarantine_tmp = None
+        else:
+            write_csv_atomic(self.rejected, quarantine_file, index=False)
+        print(f"   🚧 Quarantaine ({self.clean_stats['quarantined']:,} lignes) : {quarantine_file}")
+        
         print()
         return self
+    
+    def quality_report(self):
+        """Compteurs du contrôle qualité par règle, dérive de schéma et fenêtre appliquée"""
+        stats = self.clean_stats
+        return {
+            'initial_rows': stats['initial_rows'],
+            'final_rows': stats['final_rows'],
+            'quarantined': stats['quarantined'],
+            'rules': {name: stats[name] for name in RULES.values()},
+            'missing_values': stats['missing_values'],
+            'converted_rows': stats['converted_rows'],
+            'base_currency': self.fx.base,
+            'schema': self.schema_report,
+            'window': list(self.window) if self.window is not None else None,
+        }
 
 
-def main():
-    """Pipeline de transformation complet"""
+def main(ds=None, force=False, chunksize=None, workers=None, from_store=False):
+    """
+    Pipeline de transformation complet
+    
+    Args:
+        ds: Date logique de la partition à transformer (YYYY-MM-DD).
+            Si None, transforme le dernier fichier brut (mode historique).
+        force: Si True, transforme même si les entrées sont inchangées
+        chunksize: Si fourni, traite le fichier par blocs de chunksize lignes
+                   (mémoire bornée, pour les fichiers plus gros que la RAM)
+        workers: Si fourni, traite les partitions cloud × mois en parallèle
+                 sur workers processus (sorties identiques au mode séquentiel)
+        from_store: Si True, lit le magasin brut dédoublonné (raw_store) au lieu des
+                    fichiers d'extraction : mois de la fenêtre avec ds, tout l'historique sinon
+    """
     
     print("="*60)
     print("🔄 TRANSFORMATION DES DONNÉES DE COÛTS CLOUD")
     print("="*60 + "\n")
     
+    if ds is not None:
+        # Empreinte des entrées : fichiers bruts de la partition + configuration
+        window = extraction_window(ds, transform_config.DATA_QUALITY['max_lookback_days'])
+        input_file = RAW_STORE_DIR if from_store else \
+            os.path.join(partition_dir(RAW_DIR, ds), 'multicloud_costs.csv')
+        fx = load_fx_rates(window, scan_currencies(input_file, window)[0])
+        input_digests = store_digests(window) if from_store else raw_partition_digests(ds)
+        input_digests['fx_rates'] = fx.digest()
+        allocation_rules = AllocationRules.load(transform_config.ALLOCATION['rules_file'])
+        input_digests['allocation_rules'] = allocation_rules.digest()
+        budgets = Budgets.load(transform_config.BUDGETS['budgets_file'])
+        input_digests['budgets'] = budgets.digest()
+        fingerprint = compute_fingerprint(input_digests, transform_config.as_dict())
+        if not force and is_transform_current(ds, fingerprint):
+            print(f"⏭️  Entrées inchangées pour la partition {ds} (empreinte {fingerprint[:12]})")
+            print("   Transformation ignorée\n")
+            sys.exit(UNCHANGED_EXIT_CODE)
+    
     try:
         # Créer le transformateur
-        transformer = CostTransformer()
+        if ds is not None:
+            transformer = CostTransformer(input_file, chunksize=chunksize, window=window, fx=fx,
+                                          allocation_rules=allocation_rules, budgets=budgets)
+        elif from_store:
+            # Tout l'historique du magasin : taux de change sur la même période
+            window = store_window()
+            transformer = CostTransformer(RAW_STORE_DIR, chunksize=chunksize, window=window)
+        else:
+            transformer = CostTransformer(chunksize=chunksize)
         
-        # Exécuter le pipeline de transformation
+        # Nettoyage et enrichissement (en mémoire, par blocs ou en parallèle)
+        if chunksize is not None:
+            transformer.transform_in_chunks()
+        elif workers is not None:
+            transformer.transform_parallel(workers)
+        else:
+            transformer \
+                .clean_data() \
+                .add_time_dimensions() \
+                .categorize_services()
+        
+        # Agrégations, analyses et sauvegarde
         transformer \
-            .clean_data() \
-            .add_time_dimensions() \
-            .categorize_services() \
             .calculate_aggregations() \
+            .allocate_shared_costs() \
+            .detect_series_anomalies() \
+            .forecast_spend() \
+            .evaluate_budgets() \
             .calculate_kpis() \
             .create_summary_report() \
-            .save_transformed_data()
+            .save_transformed_data(ds=ds)
+        
+        if ds is not None:
+            record_transform(ds, fingerprint, input_digests, transformer.outputs)
         
         print("="*60)
         print("✅ TRANSFORMATION TERMINÉE AVEC SUCCÈS")
@@ -353,7 +1234,22 @@ def main():
         print(f"\n❌ Erreur lors de la transformation : {e}")
         import traceback
         traceback.print_exc()
+        if ds is not None:
+            # En mode partitionné (Airflow), l'échec doit faire échouer la tâche
+            raise SystemExit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Transformation des coûts cloud")
+    parser.add_argument('--ds', help="Date logique de la partition (YYYY-MM-DD)")
+    parser.add_argument('--force', action='store_true',
+                        help="Transformer même si les entrées sont inchangées")
+    parser.add_argument('--chunksize', type=int,
+                        help="Traiter le fichier par blocs de N lignes (mémoire bornée)")
+    parser.add_argument('--workers', type=int,
+                        help="Traiter les partitions cloud × mois sur N processus")
+    parser.add_argument('--from-store', action='store_true',
+                        help="Lire le magasin brut dédoublonné (data/history/raw) au lieu des extractions")
+    args = parser.parse_args()
+    main(ds=args.ds, force=args.force, chunksize=args.chunksize, workers=args.workers,
+         from_store=args.from_store)